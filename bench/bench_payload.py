@@ -0,0 +1,98 @@
+# bench/bench_payload.py
+"""
+/scan payload size and serialization time on the synthetic shapes (see bench/synth.py).
+
+    python -m bench.bench_payload                             # all shapes, JSON to stdout
+    python -m bench.bench_payload --shapes monorepo_10k --repeat 50 --page 10000
+
+For every shape it scans the tree once, builds the /scan response (with a
+first page of --page files) and reports:
+  - bytes of the flat and the directory-grouped (files_format=grouped)
+    response, raw, gzip and zstd (when zstandard is installed);
+  - time to serialize it the old way (ScanResponse validation +
+    model_dump_json), with stdlib json, and with service.encoding.dumps;
+  - time to compress it.
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from bench.synth import SHAPES, make_repo
+from service import encoding, scanner
+from service.pathtrie import group_paths
+from service.pipeline import build_scan_response
+from service.schemas import ScanResponse
+
+
+def _timed(fn, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return result, {"min": round(min(samples), 3), "median": round(statistics.median(samples), 3)}
+
+
+def _sizes(body: bytes) -> dict:
+    sizes = {"raw": len(body), "gzip": len(gzip.compress(body, compresslevel=encoding.GZIP_LEVEL))}
+    if encoding.zstandard is not None:
+        sizes["zstd"] = len(encoding.compress(body, "zstd"))
+    return sizes
+
+
+def bench_shape(shape: str, repeat: int, page: int) -> dict:
+    base = tempfile.mkdtemp(prefix=f"bench_{shape}_")
+    try:
+        make_repo(base, shape)
+        scanner.DISCOVERED_FILES_PAGE = page
+        summary = scanner.scan_repo(base)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+    summary.update(repo_url=f"https://github.com/bench/{shape}", branch="main", commit_sha="0" * 40)
+    flat = build_scan_response(summary, "bench")
+    grouped = {**flat, "discovered_files": group_paths(flat["discovered_files"])}
+
+    body, pydantic_ms = _timed(lambda: ScanResponse.model_validate(flat).model_dump_json().encode(), repeat)
+    _, stdlib_ms = _timed(lambda: json.dumps(flat).encode(), repeat)
+    _, dumps_ms = _timed(lambda: encoding.dumps(flat), repeat)
+    _, grouped_ms = _timed(lambda: encoding.dumps({**flat, "discovered_files": group_paths(flat["discovered_files"])}),
+                           repeat)
+    compress_ms = {"gzip": _timed(lambda: encoding.compress(body, "gzip"), repeat)[1]}
+    if encoding.zstandard is not None:
+        compress_ms["zstd"] = _timed(lambda: encoding.compress(body, "zstd"), repeat)[1]
+
+    return {
+        "files_total": flat["files_total"],
+        "discovered_files": len(flat["discovered_files"]),
+        "bytes": {"flat": _sizes(encoding.dumps(flat)), "grouped": _sizes(encoding.dumps(grouped))},
+        "serialize_ms": {"pydantic": pydantic_ms, "stdlib_json": stdlib_ms, "dumps": dumps_ms,
+                         "dumps_grouped": grouped_ms},
+        "compress_ms": compress_ms,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=list(SHAPES))
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--page", type=int, default=scanner.DISCOVERED_FILES_PAGE,
+                    help="files in discovered_files (the /scan first page)")
+    args = ap.parse_args()
+
+    report = {
+        "encoder": "orjson" if encoding.orjson is not None else "json",
+        "zstd": encoding.zstandard is not None,
+        "cpus": os.cpu_count(),
+        "shapes": {shape: bench_shape(shape, args.repeat, args.page) for shape in args.shapes},
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# bench/bench_reports.py
+"""
+Markdown plan report: the old build-it-in-a-string handler vs the streamed renderer (ui/reports.py).
+
+    python -m bench.bench_reports                      # 2000 steps of ~4 KB content (~8 MB plan)
+    python -m bench.bench_reports --steps 5000 --content-kb 8
+
+Both start from the plan_data form string. Reports time to the first chunk,
+total time and the peak of Python allocations (tracemalloc) while
+producing the whole report, for the Markdown download and the zip bundle.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from service.workspace import iter_archive
+from ui import reports
+
+
+def make_plan(steps: int, content_kb: int) -> str:
+    line = "RUN echo 'a line of generated content for the benchmark plan'\n"
+    content = line * (content_kb * 1024 // len(line))
+    plan = [{"tool": "create_dockerfile", "args": {"file_path": f"svc{i}/Dockerfile", "content": content},
+             "success_check": "docker build succeeds", "on_fail": "check the Dockerfile"} for i in range(steps)]
+    return json.dumps(plan)
+
+
+def concat_report(plan_data: str, scan: dict) -> str:
+    """The pre-streaming download_plan body: json.loads, then markdown_content += ..."""
+    plan = json.loads(plan_data)
+    markdown_content = "# Execution Plan Report\n\nGenerated on: now\n\n## Project Information\n\n"
+    markdown_content += f"**Repository:** {scan.get('repo_url', 'Unknown')}\n\n"
+    markdown_content += "## Execution Plan Steps\n\n"
+    for i, step in enumerate(plan, 1):
+        markdown_content += f"### Step {i}: {step.get('tool', 'Unknown Tool')}\n\n"
+        markdown_content += f"**File Path:** `{step.get('args', {}).get('file_path', 'N/A')}`\n\n"
+        if step.get('args', {}).get('content'):
+            markdown_content += "**Generated Content:**\n\n"
+            markdown_content += f"```\n{step.get('args', {}).get('content', '')}\n```\n\n"
+        if step.get('success_check'):
+            markdown_content += f"**Success Check:** {step.get('success_check')}\n\n"
+        if step.get('on_fail'):
+            markdown_content += f"**On Failure:** {step.get('on_fail')}\n\n"
+        markdown_content += "---\n\n"
+    return markdown_content.encode()
+
+
+def measure(produce) -> dict:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in produce():
+        if first is None:
+            first = time.perf_counter() - t0
+        size += len(chunk)
+    total = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"first_byte_ms": round(first * 1000, 2), "total_ms": round(total * 1000, 2),
+            "peak_mb": round(peak / 2 ** 20, 2), "bytes": size}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--steps", type=int, default=2000)
+    ap.add_argument("--content-kb", type=int, default=4)
+    args = ap.parse_args()
+
+    plan_data = make_plan(args.steps, args.content_kb)
+    scan = {"repo_url": "https://github.com/bench/plan"}
+
+    def streamed():
+        report = reports.plan_report(reports.iter_json_array(plan_data), scan, "now")
+        return (chunk.encode() for chunk in reports.batched(report))
+
+    def bundle():
+        report = reports.plan_report(reports.iter_json_array(plan_data), scan, "now")
+        files = reports.plan_files(reports.iter_json_array(plan_data))
+        return iter_archive(reports.bundle_entries(report, "report.md", files), "zip", root="plan")
+
+    print(json.dumps({
+        "plan_mb": round(len(plan_data) / 2 ** 20, 2),
+        "concat": measure(lambda: [concat_report(plan_data, scan)]),
+        "streamed": measure(streamed),
+        "zip_bundle": measure(bundle),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
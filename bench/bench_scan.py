@@ -0,0 +1,159 @@
+# bench/bench_scan.py
+"""
+Scanner benchmark suite over deterministic synthetic repos (see bench/synth.py).
+
+    python -m bench.bench_scan                                 # all shapes, JSON to stdout
+    python -m bench.bench_scan --shapes small_service deep_nesting --repeat 5
+    python -m bench.bench_scan --out results.json --baseline bench/baseline.json
+
+For every shape it times list_files, each detector function, scan_repo and
+the full /scan pipeline (clone from a local file:// bare repo + detection).
+Every shape runs in its own process so peak RSS is per shape. With --baseline
+the medians are compared against a stored run and the exit status is 1 if
+any got slower than --threshold times the baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.synth import SHAPES, make_bare_repo, make_repo
+
+
+def _timed(fn, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return result, {"min": round(min(samples), 3), "median": round(statistics.median(samples), 3)}
+
+
+def run_shape(shape: str, repeat: int, seed: int, strategy: str) -> dict:
+    # measure real scans, not cache hits
+    os.environ["AGENT_RESULT_CACHE_BACKEND"] = "off"
+    from service import scanner
+    from service.pipeline import run_scan
+    from service.schemas import ScanRequest
+
+    tmp = tempfile.mkdtemp(prefix=f"bench_{shape}_")
+    try:
+        src = make_repo(os.path.join(tmp, "src"), shape, seed)
+        files_on_disk = sum(len(fns) for _, _, fns in os.walk(src))
+        bare = make_bare_repo(src, os.path.join(tmp, "repo.git"))
+        timings = {}
+        files, timings["list_files"] = _timed(lambda: list(scanner.list_files(src)), repeat)
+        _, timings["detect_languages"] = _timed(lambda: scanner.detect_languages(files), repeat)
+        _, timings["detect_frameworks"] = _timed(lambda: scanner.detect_frameworks(src, files), repeat)
+        _, timings["detect_database"] = _timed(lambda: scanner.detect_database(src, files), repeat)
+        _, timings["find_entrypoints"] = _timed(lambda: scanner.find_entrypoints(src, files), repeat)
+        _, timings["detect_infra"] = _timed(lambda: scanner.detect_infra(files), repeat)
+        summary, timings["scan_repo"] = _timed(lambda: scanner.scan_repo(src), repeat)
+        # ScanRequest only accepts http(s) urls; build it unvalidated for the local bare repo
+        req = ScanRequest.model_construct(repo_url=f"file://{bare}", branch="main", github_token=None,
+                                          clone_strategy=strategy)
+        response, timings["full_scan"] = _timed(lambda: asyncio.run(run_scan(req)), repeat)
+        return {
+            "files_on_disk": files_on_disk,
+            "files_scanned": len(files),
+            "walk_stats": summary["walk_stats"],
+            "frameworks": response["frameworks"],
+            "timings_ms": timings,
+            # ru_maxrss is KiB on Linux; children covers the git processes of the clones
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "peak_rss_children_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """
+    (shape, op, baseline_ms, current_ms, ratio) for every op slower than
+    threshold x baseline and by more than min_delta_ms (small timings are mostly noise).
+    """
+    regressions = []
+    for shape, current in results["shapes"].items():
+        base = baseline.get("shapes", {}).get(shape)
+        if base is None:
+            continue
+        for op, t in current["timings_ms"].items():
+            if op not in base["timings_ms"]:
+                continue
+            before, now = base["timings_ms"][op]["median"], t["median"]
+            ratio = now / before if before > 0 else 1.0
+            if ratio > threshold and now - before > min_delta_ms:
+                regressions.append((shape, op, before, now, round(ratio, 2)))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shapes", nargs="+", choices=sorted(SHAPES), default=list(SHAPES))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--strategy", default="shallow", help="clone strategy of the full /scan runs")
+    ap.add_argument("--out", help="write the results JSON here (default: stdout)")
+    ap.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    ap.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    ap.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(run_shape(args.child, args.repeat, args.seed, args.strategy)))
+        return
+
+    from service.scanner import SCANNER_VERSION
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "scanner_version": SCANNER_VERSION,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "strategy": args.strategy,
+        },
+        "shapes": {},
+    }
+    for shape in args.shapes:
+        print(f"running {shape} ...", file=sys.stderr)
+        out = subprocess.run([sys.executable, "-m", "bench.bench_scan", "--child", shape, "--repeat", str(args.repeat),
+                              "--seed", str(args.seed), "--strategy", args.strategy],
+                             check=True, stdout=subprocess.PIPE, text=True).stdout
+        results["shapes"][shape] = json.loads(out.strip().splitlines()[-1])
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        base_version = baseline.get("meta", {}).get("scanner_version")
+        if base_version != SCANNER_VERSION:
+            print(f"warning: baseline is from scanner version {base_version}, this is {SCANNER_VERSION}; "
+                  "regenerate it with --out", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for shape, op, before, now, ratio in regressions:
+            print(f"REGRESSION {shape}/{op}: {before} ms -> {now} ms ({ratio}x)", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions over {args.threshold}x baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
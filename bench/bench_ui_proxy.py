@@ -0,0 +1,105 @@
+# bench/bench_ui_proxy.py
+"""
+Load test of the UI -> backend proxy hop against a local stub backend.
+
+    python -m bench.bench_ui_proxy                           # 50 concurrent /scan posts, stub answers in 0.5 s
+    python -m bench.bench_ui_proxy --requests 200 --delay 1
+
+Starts a stub backend (its /scan sleeps --delay seconds and returns a fixed
+scan) and the UI app, each under uvicorn on a free local port, then posts
+--requests UI /scan forms at once. A proxy that blocks the event loop
+serializes them (wall time ~ requests x delay); the pooled async client
+should finish in about one delay. Also reports how many TCP connections the
+stub saw, i.e. how well keep-alive reuses them across rounds.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+SCAN = {"project_name": "stub", "repo_url": "https://github.com/bench/stub", "branch": "main",
+        "languages": ["python"], "frameworks": ["fastapi"], "database": None, "has_tests": True,
+        "entrypoints": ["app/main.py"], "infrastructure": {}, "dependencies": {},
+        "discovered_files": {"app": ["main.py"]}, "files_total": 1}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def stub_backend(delay: float):
+    app = FastAPI()
+    app.state.peers = set()
+
+    @app.post("/scan")
+    async def scan(request: Request):
+        app.state.peers.add(request.client.port)
+        await asyncio.sleep(delay)
+        return SCAN
+
+    return app
+
+
+def _serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def _round(url: str, n: int) -> dict:
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=n)) as client:
+        async def one():
+            t0 = time.perf_counter()
+            r = await client.post(f"{url}/scan", data={"repo_url": SCAN["repo_url"], "branch": "main"})
+            r.raise_for_status()
+            return time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(n)))
+        wall = time.perf_counter() - t0
+    return {"wall_seconds": round(wall, 3), "median_latency_seconds": round(statistics.median(latencies), 3),
+            "max_latency_seconds": round(max(latencies), 3)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=50)
+    ap.add_argument("--delay", type=float, default=0.5, help="stub backend /scan latency, seconds")
+    ap.add_argument("--rounds", type=int, default=3)
+    args = ap.parse_args()
+
+    stub_port, ui_port = _free_port(), _free_port()
+    stub = stub_backend(args.delay)
+    os.environ["AGENT_BACKEND_URL"] = f"http://127.0.0.1:{stub_port}"
+    from ui.main import app as ui_app  # reads AGENT_BACKEND_URL at import
+
+    servers = [_serve(stub, stub_port), _serve(ui_app, ui_port)]
+    try:
+        rounds = [asyncio.run(_round(f"http://127.0.0.1:{ui_port}", args.requests)) for _ in range(args.rounds)]
+    finally:
+        for server in servers:
+            server.should_exit = True
+
+    print(json.dumps({
+        "requests": args.requests,
+        "stub_delay_seconds": args.delay,
+        "serialized_seconds": round(args.requests * args.delay, 3),
+        "rounds": rounds,
+        "backend_connections": len(stub.state.peers),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
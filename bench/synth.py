@@ -0,0 +1,127 @@
+# bench/synth.py
+"""
+Deterministic synthetic repositories for the scanner benchmarks.
+
+The same shape and seed always produce byte-identical trees (and, via
+make_bare_repo, the same commit), so timings are comparable across runs and
+machines.
+"""
+import os
+import random
+import subprocess
+from typing import Callable, Dict
+
+PY_HEADS = (
+    "from fastapi import FastAPI\n\napp = FastAPI()\n",
+    "import os\nimport sys\n\n\ndef main():\n    return 0\n",
+    "from sqlalchemy import Column, Integer\nfrom sqlalchemy.orm import declarative_base\n",
+    "import logging\n\nlog = logging.getLogger(__name__)\n",
+    "import uvicorn\n\nif __name__ == '__main__':\n    uvicorn.run('app:app')\n",
+)
+JS_HEADS = (
+    "import React from 'react';\nexport default function App() { return null; }\n",
+    "const express = require('express');\nmodule.exports = express.Router();\n",
+    "export const add = (a, b) => a + b;\n",
+)
+FILLER = "# padding line to give files a realistic size\n"
+
+
+def _write(base: str, rel: str, text: str) -> None:
+    path = os.path.join(base, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(text)
+
+
+def _py(rng: random.Random) -> str:
+    return rng.choice(PY_HEADS) + FILLER * rng.randint(5, 80)
+
+
+def _js(rng: random.Random) -> str:
+    return rng.choice(JS_HEADS) + "// " + FILLER * rng.randint(5, 80)
+
+
+def _service_files(base: str, prefix: str, rng: random.Random, modules: int) -> None:
+    _write(base, f"{prefix}requirements.txt", "fastapi==0.110.0\nuvicorn\nsqlalchemy>=2.0\npsycopg2-binary\n")
+    _write(base, f"{prefix}Dockerfile", "FROM python:3.11-slim\nCOPY . /app\nCMD [\"uvicorn\", \"app.main:app\"]\n")
+    _write(base, f"{prefix}app/main.py", PY_HEADS[0] + FILLER * 20)
+    for i in range(modules):
+        _write(base, f"{prefix}app/module_{i}.py", _py(rng))
+    for i in range(max(1, modules // 4)):
+        _write(base, f"{prefix}tests/test_module_{i}.py", "import pytest\n" + FILLER * 10)
+
+
+def small_service(base: str, rng: random.Random) -> None:
+    """A single FastAPI service: ~50 files."""
+    _service_files(base, "", rng, modules=30)
+    _write(base, "docker-compose.yml", "services:\n  api:\n    build: .\n  db:\n    image: postgres:16\n")
+    _write(base, ".github/workflows/ci.yml", "on: push\njobs: {}\n")
+    _write(base, "README.md", "# small service\n")
+
+
+def monorepo_10k(base: str, rng: random.Random) -> None:
+    """~10k files: 40 python services, 20 node packages and shared docs."""
+    for s in range(40):
+        _service_files(base, f"services/svc{s:02d}/", rng, modules=150)
+        _write(base, f"deploy/k8s/svc{s:02d}.yaml", "apiVersion: apps/v1\nkind: Deployment\n")
+    for p in range(20):
+        _write(base, f"packages/pkg{p:02d}/package.json", '{"dependencies": {"react": "^18.2.0"}}\n')
+        for i in range(100):
+            _write(base, f"packages/pkg{p:02d}/src/c{i}.js", _js(rng))
+    for i in range(500):
+        _write(base, f"docs/page{i}.md", "# doc\n" + FILLER * rng.randint(1, 30))
+
+
+def frontend_node_modules(base: str, rng: random.Random) -> None:
+    """A React app with a checked-in node_modules of ~20k files."""
+    _write(base, "package.json", '{"dependencies": {"react": "^18.2.0", "express": "^4.18.0"}}\n')
+    for i in range(200):
+        _write(base, f"src/components/C{i}.jsx", _js(rng))
+    for p in range(400):
+        _write(base, f"node_modules/dep{p}/package.json", '{"name": "dep%d"}\n' % p)
+        for i in range(50):
+            _write(base, f"node_modules/dep{p}/lib/f{i}.js", _js(rng))
+
+
+def deep_nesting(base: str, rng: random.Random) -> None:
+    """Chains of 150 nested directories with a couple of files per level."""
+    for chain in range(8):
+        rel = f"chain{chain}"
+        for depth in range(150):
+            rel += f"/d{depth}"
+            _write(base, f"{rel}/mod.py", _py(rng))
+            if depth % 10 == 0:
+                _write(base, f"{rel}/notes.md", "# level\n")
+    _write(base, "pyproject.toml", "[project]\nname = \"deep\"\ndependencies = [\"flask\", \"pymysql\"]\n")
+
+
+SHAPES: Dict[str, Callable[[str, random.Random], None]] = {
+    "small_service": small_service,
+    "monorepo_10k": monorepo_10k,
+    "frontend_node_modules": frontend_node_modules,
+    "deep_nesting": deep_nesting,
+}
+
+
+def make_repo(base: str, shape: str, seed: int = 0) -> str:
+    os.makedirs(base, exist_ok=True)
+    SHAPES[shape](base, random.Random(f"{shape}:{seed}"))
+    return base
+
+
+def make_bare_repo(src: str, dest: str) -> str:
+    """Commit src (with fixed identity and dates) and clone it into a bare repo at dest."""
+    env = dict(os.environ, GIT_AUTHOR_NAME="bench", GIT_AUTHOR_EMAIL="bench@example.com",
+               GIT_COMMITTER_NAME="bench", GIT_COMMITTER_EMAIL="bench@example.com",
+               GIT_AUTHOR_DATE="2024-01-01T00:00:00Z", GIT_COMMITTER_DATE="2024-01-01T00:00:00Z")
+
+    def git(*args, cwd=src):
+        subprocess.run(["git", *args], cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    git("init", "-q", "-b", "main")
+    git("add", "-A", "-f")
+    git("commit", "-q", "-m", "synthetic repo")
+    git("clone", "-q", "--bare", src, dest, cwd=None)
+    # let partial (sparse/blobless) clones work against the local repo
+    git("config", "uploadpack.allowFilter", "true", cwd=dest)
+    return dest
@@ -53,6 +53,23 @@ export default function Execution() {
       ) : (
         <div>No generated files to display.</div>
       )}
+
+      {exec.execution_id && (
+        <div className="flex gap-4 mt-6">
+          <a
+            href={`http://127.0.0.1:8080/executions/${exec.execution_id}/artifact?format=zip`}
+            className="bg-green-600 text-white px-6 py-3 rounded hover:bg-green-700 font-medium"
+          >
+            📦 Download files (.zip)
+          </a>
+          <a
+            href={`http://127.0.0.1:8080/executions/${exec.execution_id}/artifact?format=tar.gz`}
+            className="bg-green-600 text-white px-6 py-3 rounded hover:bg-green-700 font-medium"
+          >
+            📦 Download files (.tar.gz)
+          </a>
+        </div>
+      )}
     </div>
   );
 }
\ No newline at end of file
@@ -5,6 +5,8 @@ import { useRouter } from "next/navigation";
 
 export default function Plan() {
   const [scan, setScan] = useState<any>(null);
+  const [steps, setSteps] = useState<any[]>([]);
+  const [status, setStatus] = useState<string | null>(null);
   const router = useRouter();
 
   useEffect(() => {
@@ -17,15 +19,45 @@ export default function Plan() {
   const handleGeneratePlan = async () => {
     if (!scan) return;
 
-    const res = await fetch("http://127.0.0.1:8080/plan", {
+    // Stream the plan: each NDJSON line is a step, then "done" (or "error")
+    const res = await fetch("http://127.0.0.1:8080/plan/stream", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(scan),
     });
+    if (!res.ok || !res.body) {
+      setStatus(`❌ Planner failed (${res.status})`);
+      return;
+    }
 
-    const plan = await res.json();
-    localStorage.setItem("plan", JSON.stringify(plan));
-    router.push("/results");
+    const plan: any[] = [];
+    setSteps([]);
+    setStatus("⏳ Generating plan...");
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split("\n");
+      buffered = lines.pop() ?? "";
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event = JSON.parse(line);
+        if (event.event === "step") {
+          plan.push(event.step);
+          setSteps([...plan]);
+        } else if (event.event === "done") {
+          localStorage.setItem("plan", JSON.stringify(plan));
+          router.push("/results");
+          return;
+        } else {
+          setStatus(`❌ ${event.detail || "Planner failed"}`);
+          return;
+        }
+      }
+    }
   };
 
   if (!scan) {
@@ -44,6 +76,21 @@ export default function Plan() {
       >
         Generate Plan
       </button>
+
+      {status && <p className="mt-4">{status}</p>}
+      {steps.map((step: any, i: number) => (
+        <div key={i} className="border p-4 mt-4 rounded bg-gray-50">
+          <h2 className="font-semibold">{step.tool}</h2>
+          {step.args?.file_path && (
+            <p className="text-sm text-gray-600">{step.args.file_path}</p>
+          )}
+          {step.args?.content && (
+            <pre className="bg-white p-2 mt-2 rounded border">
+              {step.args.content}
+            </pre>
+          )}
+        </div>
+      ))}
     </div>
   );
 }
@@ -0,0 +1,72 @@
+# service/artifacts.py
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from service.cache import Cache, cache_from_env
+from service.encoding import dumps
+
+ARTIFACT_KINDS = ("scan", "plan")
+# bigger artifacts aren't stored (the caller then gets no id and keeps passing the JSON)
+MAX_ARTIFACT_BYTES = int(os.getenv("AGENT_ARTIFACT_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+class ArtifactStore:
+    """
+    Scan summaries and plans kept server side, so the UI and API clients can
+    pass a summary_id / plan_id between steps instead of the whole JSON.
+    Values are stored as their JSON text under the first 32 hex digits of
+    its sha256: storing the same artifact twice gives the same id, and
+    get_text() serves it without re-encoding.
+    """
+
+    def __init__(self, backend: Cache):
+        self.backend = backend
+
+    def _key(self, kind: str, artifact_id: str) -> str:
+        if kind not in ARTIFACT_KINDS:
+            raise ValueError(f"Unknown artifact kind: {kind} (expected one of {', '.join(ARTIFACT_KINDS)})")
+        return f"{kind}:{artifact_id}"
+
+    def put(self, kind: str, value: Any) -> Optional[str]:
+        """Store value, returning its id; None if it is over MAX_ARTIFACT_BYTES."""
+        body = dumps(value)
+        if len(body) > MAX_ARTIFACT_BYTES:
+            return None
+        artifact_id = hashlib.sha256(body).hexdigest()[:32]
+        self.backend.set(self._key(kind, artifact_id), body.decode())
+        return artifact_id
+
+    def get_text(self, kind: str, artifact_id: str) -> Optional[str]:
+        return self.backend.get(self._key(kind, artifact_id))
+
+    def get(self, kind: str, artifact_id: str) -> Optional[Any]:
+        text = self.get_text(kind, artifact_id)
+        return json.loads(text) if text is not None else None
+
+    def stats(self) -> Dict:
+        return self.backend.stats()
+
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+_configured = False
+
+def get_artifact_store() -> Optional[ArtifactStore]:
+    """
+    Process-wide artifact store, configured from AGENT_ARTIFACT_CACHE_BACKEND
+    (memory | sqlite | off), AGENT_ARTIFACT_CACHE_PATH,
+    AGENT_ARTIFACT_CACHE_MAX_ENTRIES (default 256),
+    AGENT_ARTIFACT_CACHE_MAX_BYTES (default 256 MiB of JSON) and
+    AGENT_ARTIFACT_CACHE_TTL (seconds, default six hours).
+    """
+    global _store, _configured
+    with _store_lock:
+        if not _configured:
+            backend = cache_from_env("AGENT_ARTIFACT_CACHE", table="artifacts", max_entries=256,
+                                     ttl=6 * 3600, max_bytes=256 * 1024 * 1024)
+            _store = ArtifactStore(backend) if backend is not None else None
+            _configured = True
+        return _store
@@ -0,0 +1,208 @@
+# service/cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from service import telemetry
+
+
+class Cache:
+    """
+    Minimal key/value cache interface shared by the service caches.
+    Values must be JSON-serializable so every backend can store them.
+    Backends count hits and misses; stats() reports them.
+    """
+
+    # label of the agent_cache_requests_total metric (cache_from_env uses the table name)
+    name = "cache"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        telemetry.count("agent_cache_requests_total", cache=self.name, result="hit" if hit else "miss")
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def value_size(value: Any) -> int:
+    """Bytes a value takes as stored: its length for text/bytes, else its JSON length."""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(json.dumps(value))
+
+
+class MemoryCache(Cache):
+    """
+    In-process LRU cache with an optional TTL (seconds) and an optional
+    max_bytes budget (value_size of the entries), evicting least recently
+    used entries past either limit.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl is not None and time.time() - item[1] > self.ttl:
+                self._pop(key)
+                item = None
+            if item is not None:
+                self._data.move_to_end(key)
+        self._count(item is not None)
+        return item[0] if item is not None else None
+
+    def _pop(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.bytes -= item[2]
+
+    def set(self, key: str, value: Any) -> None:
+        size = value_size(value) if self.max_bytes is not None else 0
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (value, time.time(), size)
+            self.bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class SQLiteCache(Cache):
+    """
+    On-disk cache in a SQLite table (JSON values), LRU by last access with an
+    optional TTL and an optional max_bytes budget for the stored values.
+    Safe to share between threads and worker processes.
+    """
+
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 10000, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        super().__init__()
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                self._conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+        self._count(row is not None)
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            if self.max_bytes is not None:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM ("
+                    f"SELECT key, SUM(LENGTH(value)) OVER (ORDER BY accessed DESC, key) AS running FROM {self.table}"
+                    ") WHERE running > ?)",
+                    (self.max_bytes,),
+                )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+def cache_from_env(prefix: str, table: str, max_entries: int, ttl: Optional[float] = None,
+                   max_bytes: Optional[int] = None) -> Optional[Cache]:
+    """
+    Build a cache from <prefix>_BACKEND (memory | sqlite | off), <prefix>_PATH,
+    <prefix>_MAX_ENTRIES, <prefix>_MAX_BYTES and <prefix>_TTL. Returns None
+    when the cache is off.
+    """
+    backend = os.getenv(f"{prefix}_BACKEND", "memory").lower()
+    max_entries = int(os.getenv(f"{prefix}_MAX_ENTRIES", str(max_entries)))
+    bytes_env = os.getenv(f"{prefix}_MAX_BYTES")
+    if bytes_env:
+        max_bytes = int(bytes_env) or None
+    ttl_env = os.getenv(f"{prefix}_TTL")
+    if ttl_env:
+        ttl = float(ttl_env) or None
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        path = os.getenv(f"{prefix}_PATH", os.path.join(".cache", "agent_cache.sqlite3"))
+        cache: Cache = SQLiteCache(path, table=table, max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+    else:
+        cache = MemoryCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes)
+    cache.name = table
+    return cache
@@ -0,0 +1,127 @@
+# service/encoding.py
+import gzip
+import json
+import os
+from typing import Any, Dict
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback, a few times slower on large payloads
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # zstd is only offered when the zstandard package is installed
+    zstandard = None
+
+# responses smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = int(os.getenv("AGENT_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("AGENT_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("AGENT_ZSTD_LEVEL", "3"))
+# AGENT_COMPRESSION=0 turns response compression off
+COMPRESSION_ENABLED = os.getenv("AGENT_COMPRESSION", "1") == "1"
+
+# bodies that are compressed already, or must not be held back (text/event-stream)
+SKIP_CONTENT_TYPES = ("application/zip", "application/gzip", "application/x-gzip", "image/", "text/event-stream")
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON bytes, through orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+class FastJSONResponse(Response):
+    """JSONResponse rendered with dumps() (orjson when available)."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _accepted(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.lower()] = q
+    return accepted
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """The coding to use for an Accept-Encoding header: "zstd", "gzip" or None."""
+    accepted = _accepted(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in ("zstd", "gzip"):
+        if coding == "zstd" and zstandard is None:
+            continue
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Compresses whole (non-streaming) responses with zstd or gzip, whichever
+    the client prefers. Streamed responses (NDJSON, SSE) pass through as they
+    are, so their chunks still go out as soon as they are produced. Every
+    whole response that could be compressed carries Vary: Accept-Encoding,
+    compressed or not, so shared caches key it by the client's encodings.
+    """
+
+    def __init__(self, app, min_bytes: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.min_bytes = min_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            return await self.app(scope, receive, send)
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+
+        start = None
+        passthrough = False
+
+        async def wrapped(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            if (message.get("more_body") or "content-encoding" in headers
+                    or headers.get("content-type", "").startswith(SKIP_CONTENT_TYPES)):
+                passthrough = True
+                await send(start)
+                return await send(message)
+            headers.add_vary_header("Accept-Encoding")
+            if coding is None or len(body) < self.min_bytes:
+                await send(start)
+                return await send(message)
+            body = compress(body, coding)
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, wrapped)
@@ -1,12 +1,14 @@
 # service/executor.py
 import os
 import yaml
-from typing import List, Dict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
-BASE_DIR = os.getcwd()
-K8S_DIR = os.path.join(BASE_DIR, "k8s")
+from service import telemetry
+from service.workspace import Workspace, clean_path, new_workspace
 
-os.makedirs(K8S_DIR, exist_ok=True)
+# default location of k8s manifests, relative to the execution's workspace
+K8S_DIR = "k8s"
 
 
 def normalize_args(tool: str, args: dict) -> dict:
@@ -63,121 +65,280 @@ def normalize_args(tool: str, args: dict) -> dict:
         })
 
     return normalized
+
+
+# ---------------- Tool registry ----------------
+
+class Tool(NamedTuple):
+    name: str
+    fn: Callable[[dict, Workspace], str]
+    after: Tuple[str, ...]                  # tools whose steps must finish first
+    outputs: Callable[[dict], List[str]]    # files a step writes, from its normalized args
+
+
+TOOLS: Dict[str, Tool] = {}
+
+
+def register_tool(name: str, default_path: Optional[str] = None, after: Tuple[str, ...] = (),
+                  outputs: Optional[Callable[[dict], List[str]]] = None):
+    """
+    Decorator adding fn(args, workspace) -> details to the tools plans can
+    call. Unless outputs is given, a step writes args["file_path"] (or
+    default_path).
+    """
+    def decorate(fn: Callable[[dict, Workspace], str]) -> Callable[[dict, Workspace], str]:
+        def written(args: dict) -> List[str]:
+            path = args.get("file_path") or default_path
+            return [path] if path else []
+        TOOLS[name] = Tool(name, fn, tuple(after), outputs or written)
+        return fn
+    return decorate
+
+
+def _k8s_outputs(args: dict) -> List[str]:
+    file_path = args.get("file_path") or K8S_DIR
+    content = args.get("content")
+    if isinstance(content, dict):
+        return [os.path.join(file_path, name) for name in content]
+    # a path without an extension is a directory for the manifest
+    if file_path.endswith("/") or not os.path.splitext(file_path)[1]:
+        return [os.path.join(file_path, "deployment.yml")]
+    return [file_path]
+
+
 # ---------------- Tool implementations ----------------
 # Replace the implementations with the following:
 
-def create_dockerfile(args: dict) -> str:
+@register_tool("create_dockerfile", default_path="Dockerfile")
+def create_dockerfile(args: dict, ws: Workspace) -> str:
     """
     Write out the Dockerfile using the tailored content provided by Gemini.
     """
-    file_path = args.get("file_path", "Dockerfile")
+    file_path = args.get("file_path") or "Dockerfile"
     content = args.get("content")
     if not content:
         raise ValueError("No Dockerfile content provided in plan JSON.")
-    with open(file_path, "w") as f:
-        f.write(content)
+    ws.write(file_path, content)
     return f"Dockerfile created successfully at {file_path}."
 
 
-def write_docker_compose(args: dict) -> str:
+@register_tool("write_docker_compose", default_path="docker-compose.yml")
+def write_docker_compose(args: dict, ws: Workspace) -> str:
     """
     Write out the docker-compose file using the provided content.
     """
-    file_path = args.get("file_path", "docker-compose.yml")
+    file_path = args.get("file_path") or "docker-compose.yml"
     content = args.get("content")
     if not content:
         raise ValueError("No docker-compose content provided in plan JSON.")
-    with open(file_path, "w") as f:
-        f.write(content)
+    ws.write(file_path, content)
     return f"docker-compose.yml created successfully at {file_path}."
 
 
-def setup_ci_pipeline(args: dict) -> str:
+@register_tool("setup_ci_pipeline", default_path=os.path.join(".github", "workflows", "ci.yml"))
+def setup_ci_pipeline(args: dict, ws: Workspace) -> str:
     """
     Write out the CI/CD pipeline file using the provided content.
     """
-    file_path = args.get("file_path", os.path.join(".github", "workflows", "ci.yml"))
+    file_path = args.get("file_path") or os.path.join(".github", "workflows", "ci.yml")
     content = args.get("content")
     if not content:
         raise ValueError("No CI pipeline content provided in plan JSON.")
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, "w") as f:
-        f.write(content)
+    ws.write(file_path, content)
     return f"CI pipeline configuration created successfully at {file_path}."
 
 
-def generate_k8s_manifests(args: dict) -> str:
+@register_tool("generate_k8s_manifests", outputs=_k8s_outputs)
+def generate_k8s_manifests(args: dict, ws: Workspace) -> str:
     """
     Write out the Kubernetes manifest file(s) using the provided content.
     Can handle both single file content (string) or multiple files (dict).
     """
-    file_path = args.get("file_path", K8S_DIR)
     content = args.get("content")
     if not content:
         raise ValueError("No Kubernetes manifest content provided in plan JSON.")
-    
-    # Ensure the k8s directory exists
-    os.makedirs(file_path if os.path.isdir(file_path) or file_path.endswith('/') else os.path.dirname(file_path), exist_ok=True)
-    
-    created_files = []
-    
+
     if isinstance(content, dict):
         # Multiple files case
-        for filename, file_content in content.items():
-            full_path = os.path.join(file_path, filename)
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            with open(full_path, "w") as f:
-                f.write(file_content)
-            created_files.append(full_path)
+        created_files = []
+        for full_path, file_content in zip(_k8s_outputs(args), content.values()):
+            created_files.append(ws.write(full_path, file_content))
         return f"Kubernetes manifests created successfully: {', '.join(created_files)}"
     else:
         # Single file case
-        if file_path.endswith('/') or os.path.isdir(file_path):
-            full_path = os.path.join(file_path, "deployment.yml")
-        else:
-            full_path = file_path
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        with open(full_path, "w") as f:
-            f.write(content)
+        full_path = ws.write(_k8s_outputs(args)[0], content)
         return f"Kubernetes manifest created successfully at {full_path}"
 
 
-def deploy_to_cluster(args: dict) -> str:
+@register_tool("deploy_to_cluster", after=("create_dockerfile", "generate_k8s_manifests"), outputs=lambda args: [])
+def deploy_to_cluster(args: dict, ws: Workspace) -> str:
     """
     Simulate deployment to a cluster. This step might not produce a file.
     """
     return f"Application deployed to Kubernetes cluster (simulated) using manifest at {args.get('manifest_path')}"
 
 # ---------------- Executor ----------------
-def execute_plan(plan: List[Dict]) -> List[Dict]:
-    results = []
 
+# steps of one plan that may run at the same time
+EXECUTE_WORKERS = int(os.getenv("AGENT_EXECUTE_WORKERS", "4"))
+
+
+def _overlaps(a: str, b: str) -> bool:
+    try:
+        a, b = clean_path(a), clean_path(b)
+    except ValueError:
+        return False  # the step fails when it tries to write there
+    return a == b or a.startswith(b + "/") or b.startswith(a + "/")
+
+
+def check_plan(plan: Any) -> None:
+    """Raise ValueError unless plan is a list of step objects with well-formed fields."""
+    if not isinstance(plan, list) or not all(isinstance(step, dict) for step in plan):
+        raise ValueError("Plan must be a list of step objects")
+    for j, step in enumerate(plan):
+        if not isinstance(step.get("tool"), (str, type(None))):
+            raise ValueError(f"Step {j}: tool must be a string")
+        if not isinstance(step.get("args") or {}, dict):
+            raise ValueError(f"Step {j}: args must be an object")
+        if not isinstance(step.get("id"), (str, int, type(None))):
+            raise ValueError(f"Step {j}: id must be a string or number")
+        if not isinstance(step.get("depends_on") or [], list):
+            raise ValueError(f"Step {j}: depends_on must be a list")
+
+
+def explicit_dependencies(plan: List[Dict]) -> List[List[int]]:
+    """
+    For each step, the indexes of the steps its "depends_on" names (step
+    indexes or "id"s). Raises ValueError on unknown references.
+    """
+    ids = {step["id"]: i for i, step in enumerate(plan) if step.get("id") is not None}
+    deps: List[List[int]] = []
+    for j, step in enumerate(plan):
+        found = set()
+        for ref in step.get("depends_on") or []:
+            i = ids.get(ref, ref) if isinstance(ref, (str, int)) else ref
+            if not isinstance(i, int) or isinstance(i, bool) or not 0 <= i < len(plan) or i == j:
+                raise ValueError(f"Step {j} depends on unknown step {ref!r}")
+            found.add(i)
+        deps.append(sorted(found))
+    return deps
+
+
+def plan_dependencies(plan: List[Dict]) -> List[List[int]]:
+    """
+    For each step, the indexes of the steps it waits for: its explicit
+    dependencies (see explicit_dependencies), earlier steps of the tools its
+    tool runs after (see register_tool) and earlier steps writing the same
+    files (or a directory containing them). Only explicit dependencies are
+    prerequisites; the others just order the steps. Raises ValueError on a
+    malformed plan, unknown references and cycles.
+    """
+    check_plan(plan)
+    paths = []
     for step in plan:
-        tool = step.get("tool")
-        raw_args = step.get("args", {})
-        args = normalize_args(tool, raw_args)
-
-        try:
-            if tool == "create_dockerfile":
-                details = create_dockerfile(args)
-            elif tool == "write_docker_compose":
-                details = write_docker_compose(args)
-            elif tool == "setup_ci_pipeline":
-                details = setup_ci_pipeline(args)
-            elif tool == "generate_k8s_manifests":
-                details = generate_k8s_manifests(args)
-            elif tool == "deploy_to_cluster":
-                details = deploy_to_cluster(args)
-            else:
-                details = f"Unknown tool: {tool}"
-
-            results.append({"tool": tool, "status": "success", "details": details})
-
-        except Exception as e:
-            results.append({
-                "tool": tool,
-                "status": "failed",
-                "details": f"{step.get('on_fail', 'Step failed.')} | Error: {e}"
-            })
-
-    return results
+        tool = TOOLS.get(step.get("tool"))
+        args = normalize_args(step.get("tool"), step.get("args") or {})
+        paths.append(tool.outputs(args) if tool is not None else [])
+
+    deps: List[List[int]] = []
+    for j, explicit in enumerate(explicit_dependencies(plan)):
+        found = set(explicit)
+        tool = TOOLS.get(plan[j].get("tool"))
+        after = tool.after if tool is not None else ()
+        for i in range(j):
+            if plan[i].get("tool") in after:
+                found.add(i)
+            elif any(_overlaps(a, b) for a in paths[i] for b in paths[j]):
+                found.add(i)
+        deps.append(sorted(found))
+
+    # Kahn's algorithm: every step must be reachable without a cycle
+    pending = [len(d) for d in deps]
+    dependents: List[List[int]] = [[] for _ in plan]
+    for j, d in enumerate(deps):
+        for i in d:
+            dependents[i].append(j)
+    ready = [j for j, n in enumerate(pending) if n == 0]
+    seen = 0
+    while ready:
+        i = ready.pop()
+        seen += 1
+        for j in dependents[i]:
+            pending[j] -= 1
+            if pending[j] == 0:
+                ready.append(j)
+    if seen != len(plan):
+        raise ValueError("Plan step dependencies form a cycle")
+    return deps
+
+
+def _step_files(ws: Workspace, tool: str, written: List[str]) -> List[Dict]:
+    files = []
+    for path in written:
+        content = ws.read(path)
+        if content is not None:
+            files.append({"tool": tool, "file_path": clean_path(path), "content": content})
+    return files
+
+
+def _run_step(step: Dict, ws: Workspace) -> Dict:
+    tool_name = step.get("tool")
+    tool = TOOLS.get(tool_name)
+    if tool is None:
+        telemetry.count("agent_tool_calls_total", tool=str(tool_name), status="skipped")
+        return {"tool": tool_name, "status": "skipped", "details": f"Unknown tool: {tool_name}", "files": []}
+    args = normalize_args(tool_name, step.get("args", {}))
+    try:
+        with telemetry.span("execute.step", tool=tool_name):
+            details = tool.fn(args, ws)
+    except Exception as e:
+        telemetry.count("agent_tool_calls_total", tool=tool_name, status="failed")
+        return {"tool": tool_name, "status": "failed",
+                "details": f"{step.get('on_fail', 'Step failed.')} | Error: {e}", "files": []}
+    telemetry.count("agent_tool_calls_total", tool=tool_name, status="success")
+    return {"tool": tool_name, "status": "success", "details": details,
+            "files": _step_files(ws, tool_name, tool.outputs(args))}
+
+
+def run_plan(plan: List[Dict], workers: Optional[int] = None, ws: Optional[Workspace] = None) -> List[Dict]:
+    """
+    Run a plan as a DAG (see plan_dependencies): steps whose dependencies are
+    done run concurrently on up to workers threads. Returns one record per
+    step, in plan order: {"index", "tool", "status", "details", "files"},
+    where files are what the step wrote (read back from the workspace).
+    A step whose explicit dependency failed or was skipped is skipped; steps
+    that only wait on others for ordering run regardless. Files go to ws, or
+    to a throwaway new_workspace() when none is given.
+    """
+    if ws is None:
+        with new_workspace() as ws:
+            return run_plan(plan, workers, ws)
+    deps = plan_dependencies(plan)
+    required = explicit_dependencies(plan)
+    results: List[Optional[Dict]] = [None] * len(plan)
+    pending = set(range(len(plan)))
+    running: Dict[Any, int] = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers or EXECUTE_WORKERS), thread_name_prefix="execute") as pool:
+        while pending or running:
+            for j in sorted(pending):
+                if any(results[i] is None for i in deps[j]):
+                    continue
+                pending.discard(j)
+                blocked = [i for i in required[j] if results[i]["status"] != "success"]
+                if blocked:
+                    results[j] = {"tool": plan[j].get("tool"), "status": "skipped", "files": [],
+                                  "details": f"Skipped: step {blocked[0]} ({plan[blocked[0]].get('tool')}) did not succeed"}
+                else:
+                    running[pool.submit(telemetry.in_context(_run_step), plan[j], ws)] = j
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                results[running.pop(fut)] = fut.result()
+
+    return [{"index": j, **r} for j, r in enumerate(results)]
+
+
+def execute_plan(plan: List[Dict]) -> List[Dict]:
+    return [{"tool": r["tool"], "status": r["status"], "details": r["details"]} for r in run_plan(plan)]
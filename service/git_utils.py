@@ -1,43 +1,283 @@
 # service/git_utils.py
+import asyncio
+import subprocess
 import tempfile
+import time
 import os
 import shutil
-from typing import Optional, Tuple
+from typing import Generator, List, NamedTuple, Optional, Sequence, Tuple
 from git import Repo, GitCommandError
 
-def clone_repo(repo_url: str, branch: Optional[str] = None, github_token: Optional[str] = None, timeout: int = 60) -> Tuple[str, str]:
+from service import telemetry
+
+# Clone strategies, cheapest first:
+# - "sparse":   blobless, depth-1 clone that only checks out the given paths
+#               (the full file list is still available from the tree)
+# - "shallow":  depth-1, single-branch clone
+# - "blobless": partial clone (--filter=blob:none) with full history; blobs are
+#               fetched on demand when the working tree is checked out
+# - "full":     every branch and the full history
+# - "mirror":   incremental fetch into a persistent local mirror (see
+#               service/mirror_cache.py) plus a worktree checkout
+CLONE_STRATEGIES = ("sparse", "shallow", "blobless", "full", "mirror")
+DEFAULT_CLONE_STRATEGY = os.getenv("AGENT_CLONE_STRATEGY", "shallow")
+
+
+def authenticated_url(repo_url: str, github_token: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """
+    Returns: (url_to_fetch, note)
+    Embeds the token in HTTPS urls: https://<token>@github.com/owner/repo.git
+    """
+    if github_token and repo_url.startswith("https://"):
+        note = "Cloned with provided github_token (private repo). Make sure token has minimal scopes (repo:read)."
+        return repo_url.replace("https://", f"https://{github_token}@"), note
+    # For non-https urls, fallback to direct clone (may fail)
+    return repo_url, None
+
+
+class GitStep(NamedTuple):
+    argv: List[str]
+    check: bool = True  # raise if git fails; otherwise the return code is sent back
+
+
+# a clone is a generator of git commands; drivers run them (sync or async) and
+# send each return code back, so both share the same strategy/fallback logic
+CloneSteps = Generator[GitStep, Optional[int], None]
+
+GIT_ENV = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}  # never hang on a credential prompt
+
+
+def _checkout_steps(tmpdir: str, branch: str, shallow: bool = False) -> CloneSteps:
+    rc = yield GitStep(["git", "-C", tmpdir, "checkout", branch], check=False)
+    if rc != 0:
+        # try fetching remote branch (or a commit sha) and checking out
+        depth = ["--depth", "1"] if shallow else []
+        yield GitStep(["git", "-C", tmpdir, "fetch", *depth, "origin", branch])
+        yield GitStep(["git", "-C", tmpdir, "checkout", "FETCH_HEAD"])
+
+
+def _clone_branch_steps(url: str, tmpdir: str, branch: Optional[str], opts: List[str]) -> CloneSteps:
+    """
+    Clone with --branch when a branch is given. If the server doesn't know the ref
+    as a branch/tag (e.g. it is a commit sha), clone the default branch instead
+    and fetch it.
+    """
+    if not branch:
+        yield GitStep(["git", "clone", *opts, url, tmpdir])
+        return
+    rc = yield GitStep(["git", "clone", *opts, "--branch", branch, url, tmpdir], check=False)
+    if rc != 0:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        os.makedirs(tmpdir, exist_ok=True)
+        yield GitStep(["git", "clone", *opts, url, tmpdir])
+        yield from _checkout_steps(tmpdir, branch, shallow="--depth" in opts)
+
+
+def _clone_steps(url: str, tmpdir: str, branch: Optional[str], strategy: str,
+                 sparse_paths: Optional[Sequence[str]]) -> CloneSteps:
+    if strategy == "full":
+        yield GitStep(["git", "clone", "--no-single-branch", url, tmpdir])
+        # checkout branch if provided
+        if branch:
+            yield from _checkout_steps(tmpdir, branch)
+    elif strategy == "shallow":
+        yield from _clone_branch_steps(url, tmpdir, branch, ["--depth", "1", "--single-branch"])
+    elif strategy == "blobless":
+        yield from _clone_branch_steps(url, tmpdir, branch, ["--filter=blob:none"])
+    else:
+        # --sparse starts with only top-level files, so a fallback checkout
+        # stays cheap; read-tree then materializes the wanted paths
+        yield from _clone_branch_steps(url, tmpdir, branch, ["--depth", "1", "--single-branch", "--filter=blob:none",
+                                                             "--no-checkout", "--sparse"])
+        yield GitStep(["git", "-C", tmpdir, "sparse-checkout", "set", "--no-cone", *sparse_paths])
+        yield GitStep(["git", "-C", tmpdir, "read-tree", "-mu", "HEAD"])
+
+
+def _git_error(step: GitStep, rc: int, stderr: str, token: Optional[str]) -> RuntimeError:
+    msg = f"{' '.join(step.argv[:2])} exited with {rc}: {stderr.strip()}"
+    return RuntimeError(msg.replace(token, "***") if token else msg)
+
+
+def _observe_step(step: GitStep, started: float) -> None:
+    command = step.argv[3] if step.argv[1] == "-C" else step.argv[1]
+    telemetry.observe("agent_git_command_seconds", time.monotonic() - started, command=command)
+
+
+def _run_steps(steps: CloneSteps, timeout: float, token: Optional[str]) -> None:
+    deadline = time.monotonic() + timeout
+    rc = None
+    while True:
+        try:
+            step = steps.send(rc)
+        except StopIteration:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"git clone timed out after {timeout}s")
+        started = time.monotonic()
+        try:
+            proc = subprocess.run(step.argv, capture_output=True, text=True, timeout=remaining, env=GIT_ENV)
+        except subprocess.TimeoutExpired:
+            raise TimeoutError(f"git clone timed out after {timeout}s")
+        _observe_step(step, started)
+        if step.check and proc.returncode != 0:
+            raise _git_error(step, proc.returncode, proc.stderr, token)
+        rc = proc.returncode
+
+
+async def _run_steps_async(steps: CloneSteps, timeout: float, token: Optional[str]) -> None:
+    deadline = time.monotonic() + timeout
+    rc = None
+    while True:
+        try:
+            step = steps.send(rc)
+        except StopIteration:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"git clone timed out after {timeout}s")
+        started = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(*step.argv, stdout=asyncio.subprocess.DEVNULL,
+                                                    stderr=asyncio.subprocess.PIPE, env=GIT_ENV)
+        try:
+            _, stderr = await asyncio.wait_for(proc.communicate(), remaining)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # timed out or the request went away: don't leave git running
+            proc.kill()
+            await proc.wait()
+            if isinstance(e, asyncio.TimeoutError):
+                raise TimeoutError(f"git clone timed out after {timeout}s")
+            raise
+        _observe_step(step, started)
+        if step.check and proc.returncode != 0:
+            raise _git_error(step, proc.returncode, stderr.decode(errors="replace"), token)
+        rc = proc.returncode
+
+
+def _prepare_clone(repo_url: str, strategy: str, sparse_paths: Optional[Sequence[str]]) -> None:
+    if strategy not in CLONE_STRATEGIES:
+        raise ValueError(f"Unknown clone strategy: {strategy}")
+    if strategy == "sparse" and not sparse_paths:
+        raise ValueError("sparse clone needs sparse_paths")
+
+
+def clone_repo(repo_url: str, branch: Optional[str] = None, github_token: Optional[str] = None, timeout: int = 60,
+               strategy: str = DEFAULT_CLONE_STRATEGY, sparse_paths: Optional[Sequence[str]] = None) -> Tuple[str, str]:
     """
     Clones repo into a fresh temp directory.
     Returns: (path_to_repo, note)
     - Supports private repos by embedding token into HTTPS URL.
-      WARNING: token appears in process args if you use subprocess; GitPython hides it better.
+      WARNING: the token appears in the git process args; keep token scopes minimal.
+    - strategy picks how much gets downloaded (see CLONE_STRATEGIES).
+      "sparse" only checks out files matching sparse_paths (gitignore-style patterns);
+      use list_tree_files() to get the complete file list of such a clone.
+    - git is killed and the clone removed if it takes longer than timeout seconds.
+    - Always hand the path back to cleanup_repo() when done.
     """
+    _prepare_clone(repo_url, strategy, sparse_paths)
+    if strategy == "mirror":
+        from service.mirror_cache import get_mirror_cache
+        return get_mirror_cache().checkout(repo_url, branch=branch, github_token=github_token, timeout=timeout)
+
     tmpdir = tempfile.mkdtemp(prefix="repo_")
-    sanitized_url = repo_url
-    note = None
-
-    if github_token:
-        # Embed token in HTTPS url: https://<token>@github.com/owner/repo.git
-        # Keep origin URL without token for response
-        if repo_url.startswith("https://"):
-            sanitized_url = repo_url.replace("https://", f"https://{github_token}@")
-            note = "Cloned with provided github_token (private repo). Make sure token has minimal scopes (repo:read)."
-        else:
-            # For non-https urls, fallback to direct clone (may fail)
-            sanitized_url = repo_url
+    sanitized_url, note = authenticated_url(repo_url, github_token)
+    try:
+        _run_steps(_clone_steps(sanitized_url, tmpdir, branch, strategy, sparse_paths), timeout, github_token)
+    except Exception as e:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise RuntimeError(f"git clone failed: {e}")
+
+    return tmpdir, note or f"Cloned successfully ({strategy})"
+
+
+async def clone_repo_async(repo_url: str, branch: Optional[str] = None, github_token: Optional[str] = None,
+                           timeout: int = 60, strategy: str = DEFAULT_CLONE_STRATEGY,
+                           sparse_paths: Optional[Sequence[str]] = None) -> Tuple[str, str]:
+    """
+    clone_repo for asyncio code: git runs as async subprocesses, so the event loop
+    is never blocked. On timeout or cancellation git is killed and the temp dir
+    removed. The mirror strategy runs its (locked) fetch on a worker thread.
+    """
+    _prepare_clone(repo_url, strategy, sparse_paths)
+    if strategy == "mirror":
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(None, clone_repo, repo_url, branch, github_token, timeout, strategy, sparse_paths)
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # the worker thread can't be stopped; release its checkout once it finishes
+            fut.add_done_callback(lambda f: f.exception() is None and cleanup_repo(f.result()[0]))
+            if isinstance(e, asyncio.TimeoutError):
+                raise RuntimeError(f"git clone failed: timed out after {timeout}s")
+            raise
 
+    tmpdir = tempfile.mkdtemp(prefix="repo_")
+    sanitized_url, note = authenticated_url(repo_url, github_token)
     try:
-        repo = Repo.clone_from(sanitized_url, tmpdir, no_single_branch=True)
-        # checkout branch if provided
-        if branch:
-            try:
-                repo.git.checkout(branch)
-            except GitCommandError:
-                # try fetching remote branch and checking out
-                repo.git.fetch("origin", branch)
-                repo.git.checkout(branch)
+        await _run_steps_async(_clone_steps(sanitized_url, tmpdir, branch, strategy, sparse_paths), timeout, github_token)
+    except asyncio.CancelledError:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
     except Exception as e:
         shutil.rmtree(tmpdir, ignore_errors=True)
         raise RuntimeError(f"git clone failed: {e}")
 
-    return tmpdir, note or "Cloned successfully"
+    return tmpdir, note or f"Cloned successfully ({strategy})"
+
+
+def list_tree_files(path: str, ref: str = "HEAD") -> List[str]:
+    """
+    List every file path in the commit tree, including files a sparse checkout
+    left out of the working directory. Only reads tree objects, no blobs.
+    """
+    out = Repo(path).git.ls_tree("-r", "--name-only", "-z", ref)
+    return [p for p in out.split("\0") if p]
+
+
+def cleanup_repo(path: str) -> None:
+    """Remove a checkout made by clone_repo (temp clone or mirror worktree)."""
+    from service.mirror_cache import get_mirror_cache
+    cache = get_mirror_cache()
+    if cache.owns(path):
+        cache.release(path)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def head_commit(path: str) -> str:
+    """Commit sha checked out at path."""
+    return Repo(path).head.commit.hexsha
+
+
+def ensure_commit(path: str, sha: str, timeout: int = 60) -> bool:
+    """
+    Make sure commit sha is available in the clone at path (fetching just that
+    commit, depth 1, if a shallow/single-branch clone doesn't have it). The
+    fetch is killed after timeout seconds, like a clone.
+    """
+    repo = Repo(path)
+    try:
+        repo.git.cat_file("-e", f"{sha}^{{commit}}")
+        return True
+    except GitCommandError:
+        pass
+    try:
+        repo.git.fetch("origin", sha, depth=1, kill_after_timeout=timeout, env=GIT_ENV)
+        repo.git.cat_file("-e", f"{sha}^{{commit}}")
+        return True
+    except GitCommandError:
+        return False
+
+
+def diff_paths(path: str, old_sha: str, new_sha: str) -> Tuple[List[str], List[str]]:
+    """
+    Paths that differ between two commits, from comparing their trees (no blobs needed).
+    Returns: (changed, deleted) - changed covers added and modified files; renames
+    show up as a delete plus an add.
+    """
+    out = Repo(path).git.diff("--name-status", "--no-renames", "-z", old_sha, new_sha)
+    fields = [f for f in out.split("\0") if f]
+    changed, deleted = [], []
+    for status, rel in zip(fields[::2], fields[1::2]):
+        (deleted if status.startswith("D") else changed).append(rel)
+    return changed, deleted
@@ -0,0 +1,341 @@
+# service/jobs.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from service import telemetry
+
+JOB_STAGES = ("scan", "plan", "execute")
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+JOB_WORKERS = int(os.getenv("AGENT_JOB_WORKERS", "8"))
+# how many jobs may be inside each stage at once
+STAGE_CONCURRENCY = {
+    "scan": int(os.getenv("AGENT_JOB_SCAN_CONCURRENCY", "4")),
+    "plan": int(os.getenv("AGENT_JOB_PLAN_CONCURRENCY", "2")),
+    "execute": int(os.getenv("AGENT_JOB_EXECUTE_CONCURRENCY", "4")),
+}
+# finished jobs (and their results) are kept this many seconds
+JOB_TTL = float(os.getenv("AGENT_JOB_TTL", "3600"))
+# a running job in a shared store goes back to the queue when its worker stops renewing it for this many seconds
+JOB_LEASE = float(os.getenv("AGENT_JOB_LEASE", "60"))
+
+# stage handler: (job request, results of the earlier stages, secrets) -> stage result
+StageHandler = Callable[[Dict[str, Any], Dict[str, Any], Dict[str, Any]], Awaitable[Any]]
+
+
+def new_job(request: Dict[str, Any], stages: List[str]) -> Dict[str, Any]:
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "status": "queued",
+        "stages": stages,
+        "current_stage": None,
+        "request": request,
+        "results": {},
+        "error": None,
+        "created": now,
+        "updated": now,
+        "events": [],
+    }
+
+
+def add_event(job: Dict[str, Any], event_type: str, **data) -> None:
+    job["events"].append({"seq": len(job["events"]) + 1, "type": event_type, "time": time.time(), **data})
+    job["updated"] = time.time()
+
+
+def public_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in job.items() if k != "events"}
+
+
+class JobStore:
+    """Where jobs live between stages. Jobs are plain JSON-serializable dicts."""
+
+    def create(self, job: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def save(self, job: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running and return it."""
+        raise NotImplementedError
+
+    def heartbeat(self, job_ids: List[str]) -> None:
+        """Renew the leases of running jobs, for stores shared between processes."""
+
+    def purge(self, finished_before: float) -> int:
+        """Delete finished jobs last updated before the given time."""
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: List[str] = []
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._queue.append(job["id"])
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job is not None else None
+
+    def save(self, job):
+        with self._lock:
+            self._jobs[job["id"]] = job
+
+    def claim_next(self):
+        with self._lock:
+            while self._queue:
+                job = self._jobs.get(self._queue.pop(0))
+                if job is not None and job["status"] == "queued":
+                    job["status"] = "running"
+                    return job
+        return None
+
+    def purge(self, finished_before):
+        with self._lock:
+            old = [jid for jid, job in self._jobs.items()
+                   if job["status"] in TERMINAL_STATUSES and job["updated"] < finished_before]
+            for jid in old:
+                del self._jobs[jid]
+        return len(old)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Jobs persisted in a local SQLite file, so queued and interrupted jobs survive
+    a restart. No external broker needed, and several service processes can
+    share the file. A running job holds a lease that its worker keeps renewing
+    (heartbeat); once the lease runs out (the process died) any process may
+    claim the job again and resume it after its last finished stage.
+    """
+
+    def __init__(self, path: str, lease: float = JOB_LEASE):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lease = lease
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL,"
+                " lease_until REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "lease_until" not in columns:
+                # files from before leases: their running jobs have no lease, so they count as expired
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _lease_until(self, status: str) -> Optional[float]:
+        return time.time() + self.lease if status == "running" else None
+
+    def create(self, job):
+        with self._lock:
+            self._conn.execute("INSERT INTO jobs (id, status, data, created, updated) VALUES (?, ?, ?, ?, ?)",
+                               (job["id"], job["status"], json.dumps(job), job["created"], job["updated"]))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT status, data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = json.loads(row[1])
+        job["status"] = row[0]
+        return job
+
+    def save(self, job):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, data = ?, updated = ?, lease_until = ? WHERE id = ?",
+                               (job["status"], json.dumps(job), job["updated"], self._lease_until(job["status"]),
+                                job["id"]))
+
+    def claim_next(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # queued jobs, and running ones whose worker stopped renewing the lease
+                row = self._conn.execute(
+                    "SELECT id, data FROM jobs WHERE status = 'queued'"
+                    " OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?))"
+                    " ORDER BY created LIMIT 1", (time.time(),)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE jobs SET status = 'running', lease_until = ? WHERE id = ?",
+                                       (self._lease_until("running"), row[0]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = json.loads(row[1])
+        job["status"] = "running"
+        return job
+
+    def heartbeat(self, job_ids):
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.executemany("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+                                   [(self._lease_until("running"), jid) for jid in job_ids])
+
+    def purge(self, finished_before):
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated < ?",
+                                     (finished_before,))
+        return cur.rowcount
+
+
+def store_from_env() -> JobStore:
+    """AGENT_JOB_STORE=memory (default) | sqlite; AGENT_JOB_DB sets the SQLite file."""
+    if os.getenv("AGENT_JOB_STORE", "memory").lower() == "sqlite":
+        return SQLiteJobStore(os.getenv("AGENT_JOB_DB", os.path.join(".cache", "jobs.sqlite3")))
+    return MemoryJobStore()
+
+
+class JobManager:
+    """
+    Runs scan -> plan -> execute jobs in the background, in-process.
+    A pool of worker tasks claims queued jobs from the store and runs their
+    stages in order; a per-stage semaphore bounds how many jobs are in each
+    stage at once. Progress is recorded as events on the job (for SSE), and
+    finished jobs are purged after JOB_TTL seconds. The leases of running
+    jobs are renewed every JOB_LEASE / 3 seconds.
+    Secrets (e.g. github tokens) are kept in memory only, never in the store.
+    """
+
+    def __init__(self, store: Optional[JobStore] = None, workers: int = JOB_WORKERS,
+                 stage_concurrency: Optional[Dict[str, int]] = None, ttl: float = JOB_TTL,
+                 lease: float = JOB_LEASE):
+        self.store = store if store is not None else store_from_env()
+        self.workers = workers
+        self.stage_concurrency = stage_concurrency or STAGE_CONCURRENCY
+        self.ttl = ttl
+        self.lease = lease
+        self.handlers: Dict[str, StageHandler] = {}
+        self._secrets: Dict[str, Dict[str, Any]] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running: set = set()
+
+    def register_stage(self, name: str, handler: StageHandler) -> None:
+        self.handlers[name] = handler
+
+    def submit(self, request: Dict[str, Any], stages: List[str], secrets: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        job = new_job(request, stages)
+        add_event(job, "queued")
+        if secrets:
+            self._secrets[job["id"]] = secrets
+        self.store.create(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._semaphores = {stage: asyncio.Semaphore(n) for stage, n in self.stage_concurrency.items()}
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purger()))
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    # the SQLite queue may be fed by other processes: poll as well
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._running.add(job["id"])
+            try:
+                await self._run(job)
+            finally:
+                self._running.discard(job["id"])
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        secrets = self._secrets.get(job["id"], {})
+        telemetry.start_trace(job["id"][:16])
+        add_event(job, "started")
+        try:
+            for stage in job["stages"]:
+                if stage in job["results"]:
+                    continue  # already done before a restart
+                job["current_stage"] = stage
+                add_event(job, "stage_queued", stage=stage)
+                self.store.save(job)
+                async with self._semaphores.setdefault(stage, asyncio.Semaphore(1)):
+                    add_event(job, "stage_started", stage=stage)
+                    self.store.save(job)
+                    started = time.time()
+                    with telemetry.span(f"job.{stage}"):
+                        job["results"][stage] = await self.handlers[stage](job["request"], job["results"], secrets)
+                add_event(job, "stage_finished", stage=stage, seconds=round(time.time() - started, 3))
+                self.store.save(job)
+            job["status"] = "succeeded"
+            job["current_stage"] = None
+            add_event(job, "succeeded")
+        except asyncio.CancelledError:
+            # shutting down: leave it to be picked up again
+            job["status"] = "queued"
+            self.store.save(job)
+            raise
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = getattr(e, "detail", None) or str(e)
+            add_event(job, "failed", stage=job["current_stage"], error=job["error"])
+        self.store.save(job)
+        self._secrets.pop(job["id"], None)
+
+    async def _purger(self) -> None:
+        while True:
+            await asyncio.sleep(min(self.ttl, 60))
+            await asyncio.to_thread(self.store.purge, time.time() - self.ttl)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await asyncio.to_thread(self.store.heartbeat, list(self._running))
+
+    async def events(self, job_id: str, after: int = 0, poll: float = 0.5):
+        """Yield job events with seq > after as they happen, until the job finishes."""
+        while True:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None:
+                return
+            for event in job["events"]:
+                if event["seq"] > after:
+                    yield event
+                    after = event["seq"]
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(poll)
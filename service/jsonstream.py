@@ -0,0 +1,80 @@
+# service/jsonstream.py
+import json
+from typing import Any, List
+
+
+class ArrayItemParser:
+    """
+    Incremental parser for a streamed JSON array (optionally wrapped in
+    Markdown code fences). feed() text chunks as they arrive; it returns the
+    elements whose closing brace/bracket has been seen, in order. Only object
+    and array elements are supported, which is what plans are made of.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0          # next character to scan
+        self._started = False  # seen the opening "["
+        self._closed = False   # seen the closing "]"
+        self._depth = 0        # nesting inside the current element
+        self._start = -1       # where the current element starts
+        self._in_string = False
+        self._escape = False
+        self.count = 0
+
+    def feed(self, chunk: str) -> List[Any]:
+        self._buf += chunk
+        items = []
+        buf, i, n = self._buf, self._pos, len(self._buf)
+        while i < n and not self._closed:
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif not self._started:
+                if c == "[":
+                    self._started = True
+                elif c == "{":
+                    raise ValueError("Expected a JSON array of plan steps, got an object")
+            elif c == '"':
+                if self._depth == 0:
+                    raise ValueError(f"Unexpected string in plan array at offset {i}")
+                self._in_string = True
+            elif c in "{[":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 0:
+                    if c == "]":
+                        self._closed = True
+                    else:
+                        raise ValueError(f"Unbalanced '}}' in plan array at offset {i}")
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        try:
+                            items.append(json.loads(buf[self._start:i + 1]))
+                        except json.JSONDecodeError as e:
+                            raise ValueError(f"Failed to decode plan step: {e}")
+                        self._start = -1
+            i += 1
+        # keep only the unfinished element
+        if self._depth:
+            self._buf, self._pos = buf[self._start:], i - self._start
+            self._start = 0
+        else:
+            self._buf, self._pos = "", 0
+        self.count += len(items)
+        return items
+
+    def close(self) -> None:
+        """Raise ValueError if the stream ended before the array did."""
+        if not self._started:
+            raise ValueError("Empty response from Gemini: no JSON array found")
+        if not self._closed:
+            raise ValueError("Plan stream ended before the JSON array was closed")
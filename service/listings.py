@@ -0,0 +1,95 @@
+# service/listings.py
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from service.cache import Cache, cache_from_env
+from service.mirror_cache import normalize_repo_url
+from service.pathtrie import PathTrie
+
+MAX_PAGE_SIZE = 10000
+
+# key of the scan id HMAC; set it when several processes share a SQLite listing store
+SCAN_ID_SECRET = (os.getenv("AGENT_SCAN_ID_SECRET") or os.urandom(32).hex()).encode()
+
+
+def scan_id_for(repo_url: str, sha: str) -> str:
+    """
+    Id of a scan's listing: an HMAC of the repo and commit, so it can't be
+    derived from a commit sha, and repos sharing a sha get different ids.
+    """
+    msg = f"{normalize_repo_url(repo_url)}\n{sha}".encode()
+    return hmac.new(SCAN_ID_SECRET, msg, hashlib.sha256).hexdigest()[:32]
+
+
+def encode_cursor(path: str) -> str:
+    return base64.urlsafe_b64encode(path.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("malformed cursor")
+
+
+class ListingStore:
+    """
+    Full file listings of scans, stored as path tries keyed by scan id (see
+    scan_id_for), so /scan/{id}/files can page through all of them.
+    """
+
+    def __init__(self, backend: Cache):
+        self.backend = backend
+
+    def put(self, scan_id: str, tree: Dict[str, Any]) -> None:
+        self.backend.set(f"files:{scan_id}", tree)
+
+    def get(self, scan_id: str) -> Optional[PathTrie]:
+        tree = self.backend.get(f"files:{scan_id}")
+        return PathTrie.from_dict(tree) if tree is not None else None
+
+    def page(self, scan_id: str, cursor: Optional[str] = None, limit: int = 1000) -> Optional[Dict[str, Any]]:
+        """
+        One page of the listing: {"scan_id", "files", "total", "next_cursor"}.
+        Returns None for an unknown scan id; raises ValueError for a bad cursor.
+        """
+        trie = self.get(scan_id)
+        if trie is None:
+            return None
+        after = decode_cursor(cursor) if cursor else None
+        try:
+            files, more = trie.page(after, max(1, min(limit, MAX_PAGE_SIZE)))
+        except KeyError:
+            raise ValueError("cursor does not belong to this listing")
+        return {
+            "scan_id": scan_id,
+            "files": files,
+            "total": len(trie),
+            "next_cursor": encode_cursor(files[-1]) if more else None,
+        }
+
+    def stats(self) -> Dict:
+        return self.backend.stats()
+
+
+_store: Optional[ListingStore] = None
+_store_lock = threading.Lock()
+_configured = False
+
+def get_listing_store() -> Optional[ListingStore]:
+    """
+    Process-wide listing store, configured from AGENT_LISTING_CACHE_BACKEND
+    (memory | sqlite | off), AGENT_LISTING_CACHE_PATH and AGENT_LISTING_CACHE_MAX_ENTRIES.
+    """
+    global _store, _configured
+    with _store_lock:
+        if not _configured:
+            backend = cache_from_env("AGENT_LISTING_CACHE", table="file_listings", max_entries=64)
+            _store = ListingStore(backend) if backend is not None else None
+            _configured = True
+        return _store
@@ -0,0 +1,164 @@
+# service/llm.py
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import AsyncIterator, Callable, List, Optional, Union
+
+DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+
+class ModelBackend:
+    """
+    Text-in, text-out model used by the planner. Implement generate(); the
+    async path defaults to running generate() on a worker thread and astream()
+    to yielding the whole answer as one chunk.
+    """
+
+    name = "backend"
+    model = "none"
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str) -> str:
+        return await asyncio.to_thread(self.generate, prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        yield await self.agenerate(prompt)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class GeminiBackend(ModelBackend):
+    """
+    Gemini through one long-lived google-genai client (its HTTP connections are
+    reused across requests). The client is created on first use, so importing
+    and starting the service doesn't need GEMINI_API_KEY.
+    """
+
+    name = "gemini"
+
+    def __init__(self, model: str = DEFAULT_MODEL, api_key: Optional[str] = None):
+        self.model = model
+        self.api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import google.genai as genai
+
+                    api_key = self.api_key or os.getenv("GEMINI_API_KEY")
+                    if not api_key:
+                        raise RuntimeError("GEMINI_API_KEY not found in environment or .env file")
+                    self._client = genai.Client(api_key=api_key)
+        return self._client
+
+    def generate(self, prompt: str) -> str:
+        response = self.client.models.generate_content(model=self.model, contents=prompt)
+        return response.text or ""
+
+    async def agenerate(self, prompt: str) -> str:
+        response = await self.client.aio.models.generate_content(model=self.model, contents=prompt)
+        return response.text or ""
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        stream = await self.client.aio.models.generate_content_stream(model=self.model, contents=prompt)
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aio.aclose()
+            self._client.close()
+            self._client = None
+
+
+FAKE_PLAN = [
+    {
+        "tool": "create_dockerfile",
+        "args": {"file_path": "Dockerfile",
+                 "content": "FROM python:3.11-slim\nWORKDIR /app\nCOPY . .\n"
+                            "RUN pip install -r requirements.txt\nCMD [\"python\", \"main.py\"]\n"},
+        "success_check": "Dockerfile created",
+    },
+    {
+        "tool": "write_docker_compose",
+        "args": {"file_path": "docker-compose.yml",
+                 "content": "services:\n  app:\n    build: .\n    ports:\n      - \"8000:8000\"\n"},
+        "success_check": "docker-compose.yml created",
+    },
+]
+
+
+class FakeBackend(ModelBackend):
+    """
+    Offline backend for tests and deployments without an LLM: answers every
+    prompt with a fixed response (FAKE_PLAN by default) or with response(prompt).
+    astream() hands it out in chunk_size pieces, sleeping delay before the
+    first. Records the prompts it got.
+    """
+
+    name = "fake"
+    model = "fake"
+
+    def __init__(self, response: Union[str, Callable[[str], str], None] = None, delay: float = 0.0,
+                 chunk_size: int = 64, chunk_delay: float = 0.0):
+        self.response = response if response is not None else json.dumps(FAKE_PLAN, indent=2)
+        self.delay = delay
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.prompts: List[str] = []
+
+    def _answer(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return self.response(prompt) if callable(self.response) else self.response
+
+    def generate(self, prompt: str) -> str:
+        if self.delay:
+            time.sleep(self.delay)
+        return self._answer(prompt)
+
+    async def agenerate(self, prompt: str) -> str:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._answer(prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        text = self._answer(prompt)
+        for i in range(0, len(text), self.chunk_size):
+            if i and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield text[i:i + self.chunk_size]
+
+
+BACKENDS = {"gemini": GeminiBackend, "fake": FakeBackend}
+
+_backend: Optional[ModelBackend] = None
+_backend_lock = threading.Lock()
+
+def get_backend() -> ModelBackend:
+    """Process-wide model backend, chosen by AGENT_MODEL_BACKEND (gemini | fake; default gemini)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            kind = os.getenv("AGENT_MODEL_BACKEND", "gemini").lower()
+            if kind not in BACKENDS:
+                raise ValueError(f"Unknown model backend: {kind}")
+            _backend = BACKENDS[kind]()
+        return _backend
+
+def set_backend(backend: Optional[ModelBackend]) -> None:
+    """Replace the process-wide backend (e.g. with a FakeBackend in tests); None resets it."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
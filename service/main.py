@@ -1,16 +1,41 @@
 # service/main.py
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi import Body
-from service.schemas import ScanRequest, ScanResponse
-from service.git_utils import clone_repo
-from service.scanner import scan_repo
-from service.planner import generate_plan
-import shutil
-import os
-import traceback
+from service import telemetry
+from service.artifacts import ARTIFACT_KINDS, get_artifact_store
+from service.encoding import CompressionMiddleware, FastJSONResponse, dumps
+from service.schemas import FileListPage, JobRequest, ScanRequest, ScanResponse
+from service.jobs import JobManager, public_view
+from service.pipeline import BATCH_CONCURRENCY, run_scan, run_scan_batch, until_disconnected
+from service.listings import get_listing_store
+from service.manifests import get_manifest_cache
+from service.pathtrie import group_paths
+from service.plan_cache import get_plan_cache
+from service.result_cache import get_result_cache
+from service.workspace import ARCHIVE_FORMATS, ARCHIVE_MEDIA_TYPES, get_execution_cache, iter_archive, new_workspace
+from service.llm import get_backend
+from service.planner import agenerate_plan, astream_plan, preview_prompt
+import asyncio
+import json
+import time
+import uuid
+from typing import Literal
 
-app = FastAPI(title="Agent Bootstrapper - Repo Scanner")
+job_manager = JobManager()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_manager.start()
+    yield
+    await job_manager.stop()
+    await get_backend().aclose()
+
+
+app = FastAPI(title="Agent Bootstrapper - Repo Scanner", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,135 +44,293 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+
+
+if telemetry.METRICS_ENABLED:
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        """One trace id and one agent_http_request_seconds sample per request."""
+        trace_id = telemetry.start_trace(request.headers.get("x-trace-id"))
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["x-trace-id"] = trace_id
+            return response
+        finally:
+            route = request.scope.get("route")
+            telemetry.observe("agent_http_request_seconds", time.perf_counter() - started,
+                              method=request.method, route=getattr(route, "path", "unmatched"), status=str(status))
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of the service counters and histograms (AGENT_METRICS=0 disables)."""
+    if not telemetry.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (AGENT_METRICS=0)")
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/scan", response_model=ScanResponse)
-def scan_endpoint(req: ScanRequest):
+async def scan_endpoint(req: ScanRequest, request: Request, files_format: Literal["flat", "grouped"] = "flat"):
     """
     Clone the repo (public or private if token supplied), run scanner, and return JSON summary.
+    Results are cached by commit sha: if the ref resolves (via ls-remote) to an
+    already scanned commit, the cached summary is returned without cloning.
+    Clones run as async subprocesses and detection on a dedicated executor;
+    scans are cancelled (and cleaned up) when the client disconnects.
+    files_format=grouped returns discovered_files as {directory: [file names]}.
+    summary_id names the stored summary, for /plan?summary_id=.
     """
-    repo_url = req.repo_url
-    branch = req.branch
-    token = req.github_token.get_secret_value() if req.github_token else None
+    result = await until_disconnected(request, run_scan(req))
+    artifacts = get_artifact_store()
+    if artifacts is not None:
+        result = {**result, "summary_id": artifacts.put("scan", result)}
+    if files_format == "grouped":
+        result = {**result, "discovered_files": group_paths(result["discovered_files"])}
+    with telemetry.span("scan.serialize"):
+        # run_scan builds the ScanResponse fields itself (build_scan_response); no need to validate them again
+        body = dumps(result)
+    return Response(body, media_type="application/json")
 
-    try:
-        path, note = clone_repo(repo_url, branch=branch, github_token=token)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to clone repo: {e}")
 
+@app.post("/scan/batch")
+async def scan_batch_endpoint(reqs: list[ScanRequest], concurrency: int = BATCH_CONCURRENCY):
+    """
+    Scan a list of repos with bounded parallelism. Streams NDJSON, one line per
+    repo in completion order: {"index", "repo_url", "branch", "ok", "result" | "status_code" + "error"}.
+    One repo failing doesn't fail the batch.
+    """
+    async def lines():
+        async for line in run_scan_batch(reqs, concurrency=concurrency):
+            yield dumps(line) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/scan/{scan_id}/files", response_model=FileListPage)
+def scan_files(scan_id: str, cursor: str | None = None, limit: int = 1000,
+               files_format: Literal["flat", "grouped"] = "flat"):
+    """
+    Page through the full file listing of a scan. Pass the next_cursor of the
+    previous page (or of the /scan response) as cursor; limit is capped at 10000.
+    files_format=grouped returns files as {directory: [file names]}.
+    """
+    listings = get_listing_store()
     try:
-        summary = scan_repo(path)
-        summary["repo_url"] = str(repo_url)
-        summary["branch"] = branch
-        resp = {
-            "project_name": summary.get("project_name"),
-            "repo_url": summary.get("repo_url"),
-            "branch": summary.get("branch"),
-            "languages": summary.get("languages", []),
-            "frameworks": summary.get("frameworks", []),
-            "database": summary.get("database"),
-            "has_tests": summary.get("has_tests", False),
-            "entrypoints": summary.get("entrypoints", []),
-            "infrastructure": summary.get("infrastructure", {}),
-            "discovered_files": summary.get("discovered_files", [])[:1000],  # cap list
-            "note": note
-        }
-        return resp
-    except Exception as e:
-        tb = traceback.format_exc()
-        raise HTTPException(status_code=500, detail=f"Scan failed: {e}\n{tb}")
-    finally:
-        # cleanup - keep option to persist for debugging by env var
-        try:
-            persist = os.getenv("AGENT_PERSIST_WORKSPACE", "0")
-            if persist != "1":
-                shutil.rmtree(path, ignore_errors=True)
-        except Exception:
-            pass
+        page = listings.page(scan_id, cursor, limit) if listings is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Unknown scan id (listing expired or never stored); scan again")
+    if files_format == "grouped":
+        page = {**page, "files": group_paths(page["files"])}
+    return page
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters of the service caches."""
+    cache = get_result_cache()
+    listings = get_listing_store()
+    plans = get_plan_cache()
+    executions = get_execution_cache()
+    artifacts = get_artifact_store()
+    manifests = get_manifest_cache()
+    return {
+        "scan_results": cache.stats() if cache is not None else None,
+        "file_listings": listings.stats() if listings is not None else None,
+        "plans": plans.stats() if plans is not None else None,
+        "executions": executions.stats() if executions is not None else None,
+        "artifacts": artifacts.stats() if artifacts is not None else None,
+        "manifests": manifests.stats() if manifests is not None else None,
+    }
+
+
+def stored_artifact(kind: str, artifact_id: str):
+    artifacts = get_artifact_store()
+    value = artifacts.get(kind, artifact_id) if artifacts is not None else None
+    if value is None:
+        raise HTTPException(status_code=404, detail=f"Unknown {kind} id (expired or never stored)")
+    return value
+
+
+def scan_summary_from(scan_summary: dict | None, summary_id: str | None) -> dict:
+    """The summary sent in the body, or the stored one named by summary_id."""
+    if summary_id:
+        return stored_artifact("scan", summary_id)
+    if scan_summary is None:
+        raise HTTPException(status_code=400, detail="Send the scan summary as the body, or its summary_id")
+    return scan_summary
+
+
+def store_plan(plan) -> str | None:
+    artifacts = get_artifact_store()
+    return artifacts.put("plan", plan) if artifacts is not None else None
+
+
+@app.get("/artifacts/{kind}/{artifact_id}")
+def get_artifact(kind: str, artifact_id: str):
+    """A stored scan summary or plan (kind scan | plan), as the JSON it was stored as."""
+    if kind not in ARTIFACT_KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown artifact kind: {kind}")
+    artifacts = get_artifact_store()
+    text = artifacts.get_text(kind, artifact_id) if artifacts is not None else None
+    if text is None:
+        raise HTTPException(status_code=404, detail=f"Unknown {kind} id (expired or never stored)")
+    return Response(text, media_type="application/json")
 
 
 @app.post("/plan")
-def plan_endpoint(scan_summary: dict = Body(...)):
+async def plan_endpoint(scan_summary: dict | None = Body(None), summary_id: str | None = None,
+                        token_budget: int | None = None):
     """
-    Accepts scan summary JSON, calls Gemini to generate a structured plan.
+    Accepts scan summary JSON (or the summary_id of a stored one), calls Gemini to generate a structured plan.
+    The summary goes into the prompt as a projection of at most token_budget
+    tokens (default AGENT_PROMPT_TOKEN_BUDGET); see POST /plan/prompt.
+    The X-Plan-Id header names the stored plan, for /execute?plan_id=.
     """
+    scan_summary = scan_summary_from(scan_summary, summary_id)
     try:
-        plan_json = generate_plan(scan_summary)
-        return plan_json
+        plan_json = await agenerate_plan(scan_summary, budget=token_budget)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Planner failed: {e}")
+    plan_id = store_plan(plan_json)
+    return FastJSONResponse(plan_json, headers={"X-Plan-Id": plan_id} if plan_id else None)
+
+@app.post("/plan/prompt")
+def plan_prompt_endpoint(scan_summary: dict | None = Body(None), summary_id: str | None = None,
+                         token_budget: int | None = None):
+    """
+    The projection of the scan summary that /plan would send to the model and
+    the estimated prompt size in tokens. Doesn't call the model.
+    """
+    return preview_prompt(scan_summary_from(scan_summary, summary_id), token_budget)
+
+@app.post("/plan/stream")
+async def plan_stream_endpoint(request: Request, scan_summary: dict | None = Body(None), summary_id: str | None = None,
+                               token_budget: int | None = None):
+    """
+    Like /plan, but streams each step as soon as the model has finished it:
+    {"event": "step", "index", "step"} per step, then {"event": "done", "steps", "plan_id"}
+    or {"event": "error", "detail"}. NDJSON, or server-sent events when the
+    client sends Accept: text/event-stream.
+    """
+    scan_summary = scan_summary_from(scan_summary, summary_id)
+    sse = "text/event-stream" in request.headers.get("accept", "")
+
+    def frame(event: dict) -> str:
+        data = json.dumps(event)
+        return f"event: {event['event']}\ndata: {data}\n\n" if sse else data + "\n"
+
+    async def events():
+        steps = []
+        try:
+            async for step in astream_plan(scan_summary, budget=token_budget):
+                yield frame({"event": "step", "index": len(steps), "step": step})
+                steps.append(step)
+        except Exception as e:
+            yield frame({"event": "error", "detail": f"Planner failed: {e}"})
+            return
+        yield frame({"event": "done", "steps": len(steps), "plan_id": store_plan(steps)})
+
+    return StreamingResponse(events(), media_type="text/event-stream" if sse else "application/x-ndjson",
+                             headers={"Cache-Control": "no-cache"})
 
 @app.post("/execute")
-def execute_plan(plan: list[dict] = Body(...)):
-    import os
-    from service.executor import normalize_args, create_dockerfile, write_docker_compose, setup_ci_pipeline, generate_k8s_manifests, deploy_to_cluster
+def execute_plan(plan: list[dict] | None = Body(None), plan_id: str | None = None):
+    """
+    Run the plan's steps (independent ones concurrently, see
+    service/executor.py::run_plan) in a private workspace, and return their
+    results in plan order plus the files they wrote. The plan is the body,
+    or the stored plan named by plan_id. execution_id names the
+    download at GET /executions/{execution_id}/artifact.
+    """
+    from service.executor import run_plan
+
+    if plan_id:
+        plan = stored_artifact("plan", plan_id)
+    elif plan is None:
+        raise HTTPException(status_code=400, detail="Send the plan as the body, or its plan_id")
+    execution_id = uuid.uuid4().hex
+    with new_workspace() as ws:
+        try:
+            records = run_plan(plan, ws=ws)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        files = ws.files()
+    executions = get_execution_cache()
+    if executions is not None:
+        executions.set(execution_id, files)
 
     execution_results = []
-    file_results = []  # collect generated files
+    for step, record in zip(plan, records):
+        details = step.get("success_check", "") if record["status"] == "success" else record["details"]
+        execution_results.append({"tool": record["tool"], "status": record["status"], "details": details})
+    return {"execution_id": execution_id, "execution_results": execution_results,
+            "files": [f for r in records for f in r["files"]]}
 
-    for step in plan:
-        tool = step.get("tool")
-        raw_args = step.get("args", {})
-        args = normalize_args(tool, raw_args)
-        success_check = step.get("success_check", "")
-        on_fail = step.get("on_fail", "")
-        result = {"tool": tool, "status": None, "details": ""}
+@app.get("/executions/{execution_id}/artifact")
+def execution_artifact(execution_id: str, format: str = "zip"):
+    """The files an execution generated, as a zip or tar.gz download."""
+    if format not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(ARCHIVE_FORMATS)}")
+    executions = get_execution_cache()
+    files = executions.get(execution_id) if executions is not None else None
+    if files is None:
+        raise HTTPException(status_code=404, detail="Execution not found (unknown or expired)")
+    name = f"execution_{execution_id[:12]}"
+    return StreamingResponse(iter_archive(files.items(), format, root=name), media_type=ARCHIVE_MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f"attachment; filename={name}.{format}"})
 
-        try:
-            if tool == "create_dockerfile":
-                create_dockerfile(args)
-                file_path = raw_args.get("file_path", "Dockerfile")
-                if os.path.exists(file_path):
-                    with open(file_path, "r") as f:
-                        content = f.read()
-                    file_results.append({"tool": tool, "file_path": file_path, "content": content})
-            elif tool == "write_docker_compose":
-                write_docker_compose(args)
-                file_path = raw_args.get("file_path", "docker-compose.yml")
-                if os.path.exists(file_path):
-                    with open(file_path, "r") as f:
-                        content = f.read()
-                    file_results.append({"tool": tool, "file_path": file_path, "content": content})
-            elif tool == "setup_ci_pipeline":
-                setup_ci_pipeline(args)
-                file_path = raw_args.get("file_path", os.path.join(".github", "workflows", "ci.yml"))
-                if os.path.exists(file_path):
-                    with open(file_path, "r") as f:
-                        content = f.read()
-                    file_results.append({"tool": tool, "file_path": file_path, "content": content})
-            elif tool == "generate_k8s_manifests":
-                generate_k8s_manifests(args)
-                # Handle both single file and directory cases
-                file_path = raw_args.get("file_path", "k8s/")
-                if file_path.endswith('/') or os.path.isdir(file_path):
-                    # Directory case - collect all files
-                    if os.path.exists(file_path):
-                        for filename in os.listdir(file_path):
-                            full_path = os.path.join(file_path, filename)
-                            if os.path.isfile(full_path):
-                                with open(full_path, "r") as f:
-                                    content = f.read()
-                                file_results.append({"tool": tool, "file_path": full_path, "content": content})
-                else:
-                    # Single file case
-                    if os.path.exists(file_path):
-                        with open(file_path, "r") as f:
-                            content = f.read()
-                        file_results.append({"tool": tool, "file_path": file_path, "content": content})
-            elif tool == "deploy_to_cluster":
-                deploy_to_cluster(args)
-                # deploy_to_cluster may not generate a file
-            else:
-                result["status"] = "skipped"
-                result["details"] = f"Unknown tool: {tool}"
-                execution_results.append(result)
-                continue
-
-            result["status"] = "success"
-            result["details"] = success_check
 
-        except Exception as e:
-            result["status"] = "failed"
-            result["details"] = f"{on_fail} | Error: {e}"
-        execution_results.append(result)
+# ---------------- Background jobs ----------------
+
+async def _scan_stage(request: dict, results: dict, secrets: dict):
+    req = ScanRequest(**request["repo"], github_token=secrets.get("github_token"))
+    return await run_scan(req)
+
+async def _plan_stage(request: dict, results: dict, secrets: dict):
+    return await agenerate_plan(results["scan"])
+
+async def _execute_stage(request: dict, results: dict, secrets: dict):
+    return await asyncio.to_thread(execute_plan, results["plan"])
+
+job_manager.register_stage("scan", _scan_stage)
+job_manager.register_stage("plan", _plan_stage)
+job_manager.register_stage("execute", _execute_stage)
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(req: JobRequest):
+    """
+    Queue a scan -> plan -> execute job and return its id right away.
+    Poll GET /jobs/{id} or follow GET /jobs/{id}/events (SSE) for progress.
+    """
+    token = req.repo.github_token.get_secret_value() if req.repo.github_token else None
+    request = {"repo": req.repo.model_dump(mode="json", exclude={"github_token"})}
+    job = job_manager.submit(request, req.stages, secrets={"github_token": token} if token else None)
+    return {"job_id": job["id"], "status": job["status"]}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired)")
+    return public_view(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-sent events with the job's progress; honours Last-Event-ID to resume."""
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired)")
+    after = int(request.headers.get("last-event-id", "0") or 0)
+
+    async def stream():
+        async for event in job_manager.events(job_id, after=after):
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
 
-    return {"execution_results": execution_results, "files": file_results}
\ No newline at end of file
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
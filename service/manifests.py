@@ -0,0 +1,317 @@
+# service/manifests.py
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from service.cache import Cache, cache_from_env
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11: TOML manifests are parsed with the regex fallback only
+    tomllib = None
+
+MANIFEST_GLOBS = ("requirements*.txt", "pyproject.toml", "Pipfile", "package.json", "go.mod")
+# resolved versions; these also list transitive dependencies, so they don't count as declared
+LOCKFILE_GLOBS = ("poetry.lock", "uv.lock", "Pipfile.lock", "package-lock.json", "yarn.lock", "pnpm-lock.yaml",
+                  "go.sum")
+
+# bump whenever a parser's output changes, so cached parses are dropped
+PARSER_VERSION = "1"
+
+_REQ_LINE = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(\[[^\]]*\])?\s*(.*)$")
+_QUOTED_REQ = re.compile(r'"([A-Za-z0-9][A-Za-z0-9._-]*)(\[[^\]]*\])?\s*([^";]*)[^"]*"')
+_JSON_PAIR = re.compile(r'"(@?[A-Za-z0-9][\w./@-]*)"\s*:\s*"([^"]*)"')
+_GO_REQ = re.compile(r"^(?:require\s+)?([\w.-]+\.[\w.-]+/\S+)\s+(v\S+)")
+_TOML_PACKAGE = re.compile(r'^\[\[package\]\]\s*\nname\s*=\s*"([^"]+)"\s*\nversion\s*=\s*"([^"]+)"', re.M)
+_YARN_VERSION = re.compile(r'^\s+version:?\s+"?([^"\s]+)"?')
+# "/name@1.0.0" (v6), "name@1.0.0" (v9), "/name/1.0.0" (v5) keys under packages:
+_PNPM_PACKAGE = re.compile(r"^  '?/?(@[^/\s]+/[^@/\s:']+|[^@/\s:']+)[@/](\d[^:'\s(_]*)", re.M)
+
+
+def _globs(globs) -> re.Pattern:
+    return re.compile("|".join(fnmatch.translate(glob) for glob in globs))
+
+
+# called for every listed file, so one precompiled match instead of a fnmatch per glob
+_MANIFEST_NAME = _globs(MANIFEST_GLOBS)
+_LOCKFILE_NAMES = frozenset(LOCKFILE_GLOBS)
+
+
+def is_manifest(rel: str) -> bool:
+    return _MANIFEST_NAME.match(os.path.basename(rel)) is not None
+
+
+def is_lockfile(rel: str) -> bool:
+    return os.path.basename(rel) in _LOCKFILE_NAMES
+
+
+def _name(raw: str) -> str:
+    # PEP 503 normalisation, so "Flask_SQLAlchemy" and "flask-sqlalchemy" are one package
+    return re.sub(r"[-_.]+", "-", raw).lower()
+
+
+def parse_requirements(text: str) -> Dict[str, str]:
+    deps = {}
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line or line.startswith("-"):
+            continue
+        m = _REQ_LINE.match(line)
+        if m:
+            deps[_name(m.group(1))] = m.group(3).split(";", 1)[0].strip()
+    return deps
+
+
+def _pep508(specs) -> Dict[str, str]:
+    return parse_requirements("\n".join(s for s in specs if isinstance(s, str)))
+
+
+def _toml_table(deps) -> Dict[str, str]:
+    out = {}
+    for name, spec in (deps or {}).items():
+        if isinstance(spec, dict):
+            spec = spec.get("version", "")
+        out[_name(name)] = "" if spec == "*" else str(spec)
+    return out
+
+
+def parse_pyproject(text: str) -> Dict[str, str]:
+    if tomllib is not None:
+        try:
+            data = tomllib.loads(text)
+        except tomllib.TOMLDecodeError:
+            data = None
+        if data is not None:
+            deps = _pep508(data.get("project", {}).get("dependencies", []))
+            poetry = dict(data.get("tool", {}).get("poetry", {}).get("dependencies", {}))
+            poetry.pop("python", None)
+            deps.update(_toml_table(poetry))
+            return deps
+    # unparsable (or cut off) TOML: pick up the quoted PEP 508 strings
+    return {_name(m.group(1)): m.group(3).strip() for m in _QUOTED_REQ.finditer(text)}
+
+
+def parse_pipfile(text: str) -> Dict[str, str]:
+    if tomllib is not None:
+        try:
+            return _toml_table(tomllib.loads(text).get("packages"))
+        except tomllib.TOMLDecodeError:
+            pass
+    return {}
+
+
+def parse_package_json(text: str) -> Dict[str, str]:
+    try:
+        data = json.loads(text)
+    except ValueError:
+        # cut off or invalid: scan the dependency sections for "name": "version" pairs
+        start = text.find('"dependencies"')
+        return dict(_JSON_PAIR.findall(text[start:])) if start >= 0 else {}
+    deps = {}
+    for section in ("dependencies", "devDependencies"):
+        if isinstance(data.get(section), dict):
+            deps.update({name: str(v) for name, v in data[section].items()})
+    return deps
+
+
+def parse_go_mod(text: str) -> Dict[str, str]:
+    deps = {}
+    for line in text.splitlines():
+        m = _GO_REQ.match(line.strip())
+        if m:
+            deps[m.group(1)] = m.group(2)
+    return deps
+
+
+def parse_toml_lock(text: str) -> Dict[str, str]:
+    """poetry.lock and uv.lock: name -> locked version of every [[package]]."""
+    if tomllib is not None:
+        try:
+            packages = tomllib.loads(text).get("package", [])
+        except tomllib.TOMLDecodeError:
+            packages = None
+        if packages is not None:
+            return {_name(p["name"]): str(p.get("version", "")) for p in packages
+                    if isinstance(p, dict) and "name" in p}
+    return {_name(name): version for name, version in _TOML_PACKAGE.findall(text)}
+
+
+def parse_pipfile_lock(text: str) -> Dict[str, str]:
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+    deps = {}
+    for section in ("develop", "default"):
+        for name, spec in (data.get(section) or {}).items():
+            if isinstance(spec, dict):
+                deps[_name(name)] = str(spec.get("version", "")).lstrip("=")
+    return deps
+
+
+def parse_package_lock(text: str) -> Dict[str, str]:
+    """Top-level packages of package-lock.json (lockfile v2/v3 "packages", v1 "dependencies")."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+    deps = {}
+    for key, info in (data.get("packages") or {}).items():
+        name = key[len("node_modules/"):] if key.startswith("node_modules/") else ""
+        if name and "/node_modules/" not in name and isinstance(info, dict) and "version" in info:
+            deps[name] = str(info["version"])
+    if not deps:
+        for name, info in (data.get("dependencies") or {}).items():
+            if isinstance(info, dict) and "version" in info:
+                deps[name] = str(info["version"])
+    return deps
+
+
+def parse_yarn_lock(text: str) -> Dict[str, str]:
+    """yarn.lock, classic and berry: the first line of each entry names it, "version" follows."""
+    deps = {}
+    name = None
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        if not line[0].isspace():
+            spec = line.rstrip(":").split(",", 1)[0].strip().strip('"')
+            at = spec.find("@", 1)
+            name = spec[:at] if at > 0 else None
+        elif name is not None:
+            m = _YARN_VERSION.match(line)
+            if m:
+                deps[name] = m.group(1)
+                name = None
+    return deps
+
+
+def parse_pnpm_lock(text: str) -> Dict[str, str]:
+    start = text.find("\npackages:")
+    return dict(_PNPM_PACKAGE.findall(text[start:])) if start >= 0 else {}
+
+
+def parse_go_sum(text: str) -> Dict[str, str]:
+    deps = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and not parts[1].endswith("/go.mod"):
+            deps[parts[0]] = parts[1]
+    return deps
+
+
+# file name glob -> parser; the glob also names the parser in cache keys
+PARSERS: List[Tuple[str, Callable[[str], Dict[str, str]]]] = [
+    ("pyproject.toml", parse_pyproject),
+    ("Pipfile", parse_pipfile),
+    ("package.json", parse_package_json),
+    ("go.mod", parse_go_mod),
+    ("requirements*.txt", parse_requirements),
+    ("poetry.lock", parse_toml_lock),
+    ("uv.lock", parse_toml_lock),
+    ("Pipfile.lock", parse_pipfile_lock),
+    ("package-lock.json", parse_package_lock),
+    ("yarn.lock", parse_yarn_lock),
+    ("pnpm-lock.yaml", parse_pnpm_lock),
+    ("go.sum", parse_go_sum),
+]
+
+
+def parser_for(rel: str) -> Optional[Tuple[str, Callable[[str], Dict[str, str]]]]:
+    name = os.path.basename(rel)
+    for glob, parser in PARSERS:
+        if fnmatch.fnmatchcase(name, glob):
+            return glob, parser
+    return None
+
+
+def parse_manifest(rel: str, text: str) -> Dict[str, str]:
+    """
+    Dependency name -> version spec ("" when unpinned) for a manifest file,
+    name -> locked version for a lockfile, {} for anything else.
+    """
+    found = parser_for(rel)
+    return found[1](text) if found is not None else {}
+
+
+def blob_hash(text: str) -> str:
+    """The git blob id of text (as UTF-8), so an unchanged manifest has the same key in every commit and repo."""
+    data = text.encode()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+_configured = False
+
+def get_manifest_cache() -> Optional[Cache]:
+    """
+    Process-wide cache of parsed manifests, keyed by parser and blob hash;
+    configured from AGENT_MANIFEST_CACHE_BACKEND (memory | sqlite | off),
+    AGENT_MANIFEST_CACHE_PATH, AGENT_MANIFEST_CACHE_MAX_ENTRIES (default 4096)
+    and AGENT_MANIFEST_CACHE_MAX_BYTES (default 64 MiB).
+    """
+    global _cache, _configured
+    with _cache_lock:
+        if not _configured:
+            _cache = cache_from_env("AGENT_MANIFEST_CACHE", table="manifests", max_entries=4096,
+                                    max_bytes=64 * 1024 * 1024)
+            _configured = True
+        return _cache
+
+
+def parse_manifest_cached(rel: str, text: str) -> Dict[str, str]:
+    """parse_manifest(), parsing each distinct manifest content only once. Don't modify the result."""
+    found = parser_for(rel)
+    if found is None:
+        return {}
+    glob, parser = found
+    cache = get_manifest_cache()
+    if cache is None:
+        return parser(text)
+    key = f"{glob}:{blob_hash(text)}:{PARSER_VERSION}"
+    deps = cache.get(key)
+    if deps is None:
+        deps = parser(text)
+        cache.set(key, deps)
+    return deps
+
+
+class DependencyIndex:
+    """
+    Normalized dependency table of a scan, built from parsed manifests and
+    lockfiles: per package, the manifests declaring it with their specs, and
+    its locked version. Lookups are dict hits.
+    """
+
+    def __init__(self, parsed: Iterable[Tuple[str, Dict[str, str]]] = ()):
+        self._declared: Dict[str, Dict[str, str]] = {}
+        self._locked: Dict[str, str] = {}
+        for rel, deps in parsed:
+            self.add(rel, deps)
+
+    def add(self, rel: str, deps: Dict[str, str]) -> None:
+        if is_lockfile(rel):
+            for name, version in deps.items():
+                self._locked.setdefault(name, version)
+        else:
+            for name, spec in deps.items():
+                self._declared.setdefault(name, {})[rel] = spec
+
+    def has(self, name: str) -> bool:
+        return name in self._declared
+
+    def specs(self, name: str) -> Dict[str, str]:
+        """Manifest -> declared spec of a package, {} if no manifest declares it."""
+        return self._declared.get(name, {})
+
+    def locked(self, name: str) -> Optional[str]:
+        return self._locked.get(name)
+
+    def locked_versions(self) -> Dict[str, str]:
+        """Locked version of every declared package that a lockfile pins."""
+        return {name: self._locked[name] for name in sorted(self._declared) if name in self._locked}
@@ -0,0 +1,288 @@
+# service/mirror_cache.py
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from git import Git, Repo, GitCommandError
+
+from service.git_utils import GIT_ENV, authenticated_url
+
+try:
+    import fcntl  # cross-process locking where available
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+MIRROR_CACHE_DIR = os.getenv("AGENT_MIRROR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "agent_mirrors"))
+MIRROR_CACHE_MAX_REPOS = int(os.getenv("AGENT_MIRROR_CACHE_MAX_REPOS", "50"))
+MIRROR_CACHE_MAX_BYTES = int(os.getenv("AGENT_MIRROR_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+# git talking to the remote is killed after this many seconds, so a stuck remote can't hold a mirror's lock
+MIRROR_FETCH_TIMEOUT = int(os.getenv("AGENT_MIRROR_FETCH_TIMEOUT", "120"))
+
+FETCH_REFSPECS = ("+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*")
+LAST_USED_FILE = "agent-last-used"
+FETCHED_FILE = "agent-fetched"
+URL_FILE = "agent-url"
+
+
+def normalize_repo_url(repo_url: str) -> str:
+    """
+    Canonical form of a repo URL used as the cache key: credentials, trailing
+    slashes and a trailing .git are dropped and scheme/host are lowercased.
+    """
+    parts = urlsplit(repo_url.strip())
+    host = (parts.hostname or "").lower()
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/")
+    if path.endswith(".git"):
+        path = path[:-4]
+    if host in ("github.com", "www.github.com"):
+        # GitHub owner/repo names are case-insensitive
+        host, path = "github.com", path.lower()
+    return f"{parts.scheme.lower()}://{host}{path}"
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, filenames in os.walk(path):
+        for fn in filenames:
+            try:
+                total += os.lstat(os.path.join(root, fn)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class MirrorCache:
+    """
+    Local cache of bare mirrors keyed by normalized repo URL.
+    The first scan of a repo fetches it into a bare repo; later scans only do an
+    incremental fetch and check out a detached worktree from the mirror.
+    One fetch per repo runs at a time (thread lock + flock); callers that were
+    waiting while it ran reuse its result instead of fetching again.
+    Mirrors are evicted least-recently-used first once the cache holds more than
+    max_repos mirrors or more than max_bytes on disk.
+    """
+
+    def __init__(self, root: str = MIRROR_CACHE_DIR, max_repos: int = MIRROR_CACHE_MAX_REPOS,
+                 max_bytes: int = MIRROR_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_repos = max_repos
+        self.max_bytes = max_bytes
+        self._guard = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._in_use: Counter = Counter()
+        self._worktrees: Dict[str, str] = {}  # worktree path -> cache key
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, repo_url: str) -> str:
+        return hashlib.sha1(normalize_repo_url(repo_url).encode()).hexdigest()[:20]
+
+    def mirror_path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".git")
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _locked(self, key: str):
+        return _KeyLock(self._lock_for(key), os.path.join(self.root, key + ".lock"))
+
+    def _verify(self, url: str, timeout: float) -> str:
+        """
+        `git ls-remote --symref <url> HEAD` with the caller's credentials;
+        raises GitCommandError when the remote refuses them (or is unreachable).
+        """
+        return Git().execute(["git", "ls-remote", "--symref", url, "HEAD"],
+                             kill_after_timeout=timeout, env=GIT_ENV)
+
+    def _fetch(self, repo: Repo, url: str, remote_head: str, timeout: float) -> None:
+        repo.git.fetch(url, *FETCH_REFSPECS, prune=True, force=True, kill_after_timeout=timeout, env=GIT_ENV)
+        # follow the remote's default branch so checkouts without a branch get it
+        lines = remote_head.splitlines()
+        if lines and lines[0].startswith("ref: "):
+            try:
+                repo.git.symbolic_ref("HEAD", lines[0][5:].split("\t")[0])
+            except GitCommandError:
+                pass
+
+    def _resolve(self, repo: Repo, url: str, branch: Optional[str], timeout: float) -> str:
+        ref = branch or "HEAD"
+        try:
+            return repo.git.rev_parse("--verify", f"{ref}^{{commit}}")
+        except GitCommandError:
+            # not a branch/tag of the mirror: maybe a commit sha the refspecs don't cover
+            repo.git.fetch(url, ref, kill_after_timeout=timeout, env=GIT_ENV)
+            return repo.git.rev_parse("--verify", "FETCH_HEAD^{commit}")
+
+    def checkout(self, repo_url: str, branch: Optional[str] = None, github_token: Optional[str] = None,
+                 timeout: float = MIRROR_FETCH_TIMEOUT) -> Tuple[str, str]:
+        """
+        Update the mirror for repo_url and check out branch (default: the remote's
+        default branch) into a fresh temp worktree.
+        Returns: (path_to_worktree, note). Call release(path) when done.
+        Every caller is checked against the remote with its own credentials
+        (an ls-remote) before a worktree is created, also when it reuses a
+        concurrent fetch, so a cached private repo is never handed out to a
+        caller without valid credentials. Remote git calls are killed after
+        timeout seconds.
+        """
+        url, note = authenticated_url(repo_url, github_token)
+        key = self.key(repo_url)
+        mirror = self.mirror_path(key)
+        requested = time.time()
+        worktree = tempfile.mkdtemp(prefix="repo_")
+
+        try:
+            remote_head = self._verify(url, timeout)
+            with self._locked(key):
+                if not os.path.isdir(mirror):
+                    repo = Repo.init(mirror, bare=True)
+                    with open(os.path.join(mirror, URL_FILE), "w") as f:
+                        f.write(normalize_repo_url(repo_url))
+                    status = "new mirror"
+                else:
+                    repo = Repo(mirror)
+                    status = "cached mirror"
+                fetched = os.path.join(mirror, FETCHED_FILE)
+                if os.path.exists(fetched) and os.path.getmtime(fetched) >= requested:
+                    status += ", shared concurrent fetch"
+                else:
+                    self._fetch(repo, url, remote_head, timeout)
+                    with open(fetched, "w"):
+                        pass
+                    status += ", fetched"
+                sha = self._resolve(repo, url, branch, timeout)
+                repo.git.worktree("add", "--force", "--detach", worktree, sha)
+                with self._guard:
+                    self._in_use[key] += 1
+                    self._worktrees[worktree] = key
+                with open(os.path.join(mirror, LAST_USED_FILE), "w"):
+                    pass
+        except Exception as e:
+            shutil.rmtree(worktree, ignore_errors=True)
+            raise RuntimeError(f"git mirror checkout failed: {e}")
+
+        self.evict(keep=key)
+        return worktree, f"{note or 'Cloned successfully'} (mirror: {status})"
+
+    def owns(self, path: str) -> bool:
+        with self._guard:
+            return path in self._worktrees
+
+    def release(self, path: str) -> None:
+        """Remove a worktree created by checkout()."""
+        with self._guard:
+            key = self._worktrees.pop(path, None)
+        if key is None:
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        try:
+            with self._locked(key):
+                repo = Repo(self.mirror_path(key))
+                try:
+                    repo.git.worktree("remove", "--force", path)
+                except GitCommandError:
+                    shutil.rmtree(path, ignore_errors=True)
+                    repo.git.worktree("prune")
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+            with self._guard:
+                self._in_use[key] -= 1
+
+    def _busy(self, key: str) -> bool:
+        with self._guard:
+            if self._in_use[key] > 0:
+                return True
+        # worktrees checked out by other processes are registered in the mirror too
+        worktrees = os.path.join(self.mirror_path(key), "worktrees")
+        return os.path.isdir(worktrees) and bool(os.listdir(worktrees))
+
+    def entries(self) -> List[Tuple[str, float, int]]:
+        """(key, last_used, size_bytes) for every cached mirror, least recently used first."""
+        out = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".git"):
+                continue
+            path = os.path.join(self.root, name)
+            last_used_file = os.path.join(path, LAST_USED_FILE)
+            last_used = os.path.getmtime(last_used_file if os.path.exists(last_used_file) else path)
+            out.append((name[:-4], last_used, _dir_size(path)))
+        return sorted(out, key=lambda e: e[1])
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """Drop least-recently-used mirrors until the cache fits its repo and byte budgets."""
+        entries = self.entries()
+        count = len(entries)
+        total = sum(size for _, _, size in entries)
+        evicted = []
+        for key, _, size in entries:
+            if count <= self.max_repos and total <= self.max_bytes:
+                break
+            if key == keep or self._busy(key):
+                continue
+            lock = self._locked(key)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                shutil.rmtree(self.mirror_path(key), ignore_errors=True)
+            finally:
+                lock.release()
+            count -= 1
+            total -= size
+            evicted.append(key)
+        return evicted
+
+
+class _KeyLock:
+    """Thread lock plus (where supported) an flock, so other worker processes serialize too."""
+
+    def __init__(self, lock: threading.Lock, lock_path: str):
+        self.lock = lock
+        self.lock_path = lock_path
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self.lock.acquire(blocking=blocking):
+            return False
+        if fcntl is not None:
+            self._fd = open(self.lock_path, "a")
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._fd.close()
+                self._fd = None
+                self.lock.release()
+                return False
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._fd.close()
+            self._fd = None
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+_cache: Optional[MirrorCache] = None
+_cache_lock = threading.Lock()
+
+def get_mirror_cache() -> MirrorCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MirrorCache()
+        return _cache
@@ -0,0 +1,154 @@
+# service/pathtrie.py
+from itertools import dropwhile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# a node maps each name to its child node (a directory) or to FILE
+FILE = 0
+
+
+class PathTrie:
+    """
+    Set of relative file paths stored as a trie of path components, so shared
+    directory prefixes are stored once. The node dicts are plain JSON (files
+    map to 0), which is also the stored form: to_dict/from_dict don't copy.
+    Iteration follows insertion order per directory; for a depth-first walk
+    that's the walk order.
+    """
+
+    def __init__(self, root: Optional[Dict[str, Any]] = None, count: Optional[int] = None):
+        self.root = root if root is not None else {}
+        self._count = count if count is not None else sum(1 for _ in self)
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[str]) -> "PathTrie":
+        trie = cls()
+        for path in paths:
+            trie.add(path)
+        return trie
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PathTrie":
+        return cls(data["tree"], data["count"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self._count, "tree": self.root}
+
+    def copy(self) -> "PathTrie":
+        def clone(node):
+            return {name: clone(child) if isinstance(child, dict) else FILE for name, child in node.items()}
+        return PathTrie(clone(self.root), self._count)
+
+    def add(self, path: str, keep_sorted: bool = False) -> None:
+        """
+        Add path. With keep_sorted, a new entry goes into its name-sorted place
+        in its directory (the order a walk produces) instead of at the end.
+        """
+        *dirs, name = path.split("/")
+        node = self.root
+        for d in dirs:
+            child = node.get(d)
+            if not isinstance(child, dict):
+                child = node[d] = {}
+                if keep_sorted:
+                    _resort(node)
+            node = child
+        if name not in node:
+            node[name] = FILE
+            self._count += 1
+            if keep_sorted:
+                _resort(node)
+
+    def discard(self, path: str) -> None:
+        *dirs, name = path.split("/")
+        trail: List[Tuple[Dict[str, Any], str]] = []
+        node = self.root
+        for d in dirs:
+            child = node.get(d)
+            if not isinstance(child, dict):
+                return
+            trail.append((node, d))
+            node = child
+        if name not in node or isinstance(node[name], dict):
+            return
+        del node[name]
+        self._count -= 1
+        # drop directories left empty
+        for parent, d in reversed(trail):
+            if parent[d]:
+                break
+            del parent[d]
+
+    def __contains__(self, path: str) -> bool:
+        node: Any = self.root
+        for part in path.split("/"):
+            if not isinstance(node, dict) or part not in node:
+                return False
+            node = node[part]
+        return not isinstance(node, dict)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iter_after(None)
+
+    def iter_after(self, after: Optional[str]) -> Iterator[str]:
+        """
+        Paths in trie order, starting right after `after` (from the start if None).
+        Raises KeyError if `after` isn't in the trie.
+        """
+        if after is not None and after not in self:
+            raise KeyError(after)
+        # stack of (prefix, iterator over a directory's items)
+        stack = []
+        node, prefix = self.root, ""
+        if after is not None:
+            *dirs, name = after.split("/")
+            for d in dirs:
+                items = dropwhile(lambda item, d=d: item[0] != d, node.items())
+                next(items)
+                stack.append((prefix, items))
+                node, prefix = node[d], f"{prefix}{d}/"
+            items = dropwhile(lambda item: item[0] != name, node.items())
+            next(items)
+            stack.append((prefix, items))
+        else:
+            stack.append((prefix, iter(node.items())))
+        while stack:
+            prefix, items = stack[-1]
+            item = next(items, None)
+            if item is None:
+                stack.pop()
+            elif isinstance(item[1], dict):
+                stack.append((f"{prefix}{item[0]}/", iter(item[1].items())))
+            else:
+                yield prefix + item[0]
+
+    def page(self, after: Optional[str], limit: int) -> Tuple[List[str], bool]:
+        """Up to limit paths after `after`, and whether more follow."""
+        it = self.iter_after(after)
+        paths = [path for _, path in zip(range(limit), it)]
+        return paths, next(it, None) is not None
+
+
+def _resort(node: Dict[str, Any]) -> None:
+    # rebuilt in place: the parent keeps referencing the same dict
+    items = sorted(node.items(), key=lambda item: item[0])
+    node.clear()
+    node.update(items)
+
+
+def group_paths(paths: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Directory-grouped form of a file listing: {"dir/sub": ["a.py", ...], "":
+    [root files]}. Directories keep the order their first file had in paths.
+    """
+    grouped: Dict[str, List[str]] = {}
+    for path in paths:
+        head, _, name = path.rpartition("/")
+        grouped.setdefault(head, []).append(name)
+    return grouped
+
+
+def ungroup_paths(grouped: Dict[str, List[str]]) -> List[str]:
+    return [f"{head}/{name}" if head else name for head, names in grouped.items() for name in names]
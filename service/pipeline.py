@@ -0,0 +1,252 @@
+# service/pipeline.py
+import asyncio
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, List, Optional, TypeVar
+
+from fastapi import HTTPException, Request
+
+from service.telemetry import in_context, span
+from service.git_utils import (DEFAULT_CLONE_STRATEGY, cleanup_repo, clone_repo_async, diff_paths, ensure_commit,
+                               head_commit, list_tree_files)
+from service.listings import encode_cursor, get_listing_store, scan_id_for
+from service.mirror_cache import normalize_repo_url
+from service.result_cache import ResultCache, get_result_cache, resolve_commit
+from service.scanner import rescan_repo, scan_repo_with_state, sparse_patterns
+from service.schemas import ScanRequest
+from service.walker import changes_rules
+
+# fall back to a full scan when more than this share of the files changed
+INCREMENTAL_MAX_RATIO = float(os.getenv("AGENT_INCREMENTAL_MAX_RATIO", "0.5"))
+CLONE_TIMEOUT = int(os.getenv("AGENT_CLONE_TIMEOUT", "120"))
+# scans running at once (clone + detection) and scans allowed to wait for a slot
+MAX_CONCURRENT_SCANS = int(os.getenv("AGENT_MAX_CONCURRENT_SCANS", "8"))
+MAX_QUEUED_SCANS = int(os.getenv("AGENT_MAX_QUEUED_SCANS", "64"))
+# scans of one /scan/batch request in flight at once
+BATCH_CONCURRENCY = int(os.getenv("AGENT_BATCH_CONCURRENCY", "4"))
+
+# detection and git bookkeeping run here, not on Starlette's shared threadpool,
+# so a burst of scans can't starve /plan and /execute
+SCAN_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("AGENT_SCAN_WORKERS", "4")),
+                                   thread_name_prefix="scan")
+
+T = TypeVar("T")
+
+
+class ScanLimiter:
+    """Global concurrency limit for scans with a bounded wait queue (503 once it is full)."""
+
+    def __init__(self, limit: int = MAX_CONCURRENT_SCANS, max_queued: int = MAX_QUEUED_SCANS):
+        self.limit = limit
+        self.max_queued = max_queued
+        self.running = 0
+        self.queued = 0
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.limit)
+        if self._sem.locked() and self.queued >= self.max_queued:
+            raise HTTPException(status_code=503, detail="Too many scans queued, try again later")
+        self.queued += 1
+        try:
+            with span("scan.queue"):
+                await self._sem.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.running -= 1
+        self._sem.release()
+
+
+scan_limiter = ScanLimiter()
+
+
+def repo_project_name(repo_url: str | None) -> str | None:
+    """Project name from the repo url (the checkout dir name is a random temp name)."""
+    if not repo_url:
+        return None
+    return normalize_repo_url(repo_url).rsplit("/", 1)[-1] or None
+
+
+def build_scan_response(summary: dict, note: str | None) -> dict:
+    first_page = summary.get("discovered_files", [])
+    files_total = summary.get("files_total", len(first_page))
+    return {
+        "project_name": repo_project_name(summary.get("repo_url")) or summary.get("project_name"),
+        "repo_url": summary.get("repo_url"),
+        "branch": summary.get("branch"),
+        "commit_sha": summary.get("commit_sha"),
+        "languages": summary.get("languages", []),
+        "frameworks": summary.get("frameworks", []),
+        "database": summary.get("database"),
+        "has_tests": summary.get("has_tests", False),
+        "entrypoints": summary.get("entrypoints", []),
+        "infrastructure": summary.get("infrastructure", {}),
+        "dependencies": summary.get("dependencies", {}),
+        "locked_versions": summary.get("locked_versions", {}),
+        "discovered_files": first_page,
+        "files_total": files_total,
+        "scan_id": summary.get("scan_id"),
+        # continue with GET /scan/{scan_id}/files?cursor=...
+        "next_cursor": encode_cursor(first_page[-1]) if files_total > len(first_page) else None,
+        "detection_sources": summary.get("detection_sources", {}),
+        "timings_ms": summary.get("timings_ms"),
+        "walk_stats": summary.get("walk_stats"),
+        "note": note
+    }
+
+
+def scan_checkout(path: str, repo_url: str, strategy: str, cache: ResultCache | None) -> tuple[dict, str]:
+    """
+    Scan a checkout, incrementally when the previous scan of the same repo is
+    known: only the paths changed between that commit and this one are re-read.
+    Returns (summary, scan mode description).
+    """
+    sha = head_commit(path)
+    previous = cache.get_state(repo_url) if cache is not None else None
+    summary = None
+    mode = "full scan"
+    if previous and previous["sha"] != sha and ensure_commit(path, previous["sha"], timeout=CLONE_TIMEOUT):
+        changed, deleted = diff_paths(path, previous["sha"], sha)
+        if changes_rules(changed + deleted):
+            mode = "full scan (ignore files changed)"
+        elif len(changed) + len(deleted) <= INCREMENTAL_MAX_RATIO * max(previous["state"]["files"]["count"], 1):
+            summary, state = rescan_repo(path, previous["state"], changed, deleted)
+            mode = f"incremental scan from {previous['sha'][:12]}: {len(changed)} changed, {len(deleted)} deleted"
+    elif previous and previous["sha"] == sha:
+        summary, state = rescan_repo(path, previous["state"], [], [])
+        mode = "reused scan state"
+    if summary is None:
+        # a sparse checkout only has some files on disk; list the whole tree from git
+        files = list_tree_files(path) if strategy == "sparse" else None
+        summary, state = scan_repo_with_state(path, files=files)
+    summary["commit_sha"] = sha
+    _store_listing(summary, repo_url)
+    if cache is not None:
+        cache.put(repo_url, sha, summary)
+        cache.put_state(repo_url, sha, state)
+    return summary, mode
+
+
+def _store_listing(summary: dict, repo_url: str) -> None:
+    if not summary.get("commit_sha"):
+        return
+    summary["scan_id"] = scan_id_for(repo_url, summary["commit_sha"])
+    listings = get_listing_store()
+    if listings is not None and "file_tree" in summary:
+        listings.put(summary["scan_id"], summary["file_tree"])
+
+
+def _release_checkout(path: str) -> None:
+    # keep option to persist for debugging by env var
+    if os.getenv("AGENT_PERSIST_WORKSPACE", "0") != "1":
+        cleanup_repo(path)
+
+
+async def run_scan(req: ScanRequest) -> dict:
+    """
+    Full /scan pipeline: result-cache lookup, async clone, detection on the scan
+    executor, cleanup. Returns the ScanResponse dict; failures raise HTTPException.
+    Cancelling the coroutine kills a running clone and removes the checkout
+    (after detection finishes if it was already running).
+    """
+    repo_url = str(req.repo_url)
+    branch = req.branch
+    token = req.github_token.get_secret_value() if req.github_token else None
+    strategy = req.clone_strategy or DEFAULT_CLONE_STRATEGY
+    loop = asyncio.get_running_loop()
+
+    cache = get_result_cache()
+    if cache is not None:
+        with span("scan.resolve_commit"):
+            sha = await loop.run_in_executor(SCAN_EXECUTOR, resolve_commit, repo_url, branch, token)
+        cached = cache.get(repo_url, sha) if sha else None
+        if cached is not None:
+            _store_listing(cached, repo_url)
+            cached["repo_url"] = repo_url
+            cached["branch"] = branch
+            return build_scan_response(cached, f"Served from scan cache (commit {sha[:12]})")
+
+    async with scan_limiter:
+        try:
+            with span("scan.clone", strategy=strategy):
+                path, note = await clone_repo_async(repo_url, branch=branch, github_token=token,
+                                                    timeout=CLONE_TIMEOUT, strategy=strategy,
+                                                    sparse_paths=sparse_patterns())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Failed to clone repo: {e}")
+
+        fut = loop.run_in_executor(SCAN_EXECUTOR, in_context(scan_checkout), path, repo_url, strategy, cache)
+        try:
+            with span("scan.detect") as detect:
+                summary, mode = await asyncio.shield(fut)
+                detect.set(mode=mode.split(":")[0], files=summary.get("files_total"))
+        except asyncio.CancelledError:
+            # detection can't be interrupted; remove the checkout once it's done
+            fut.add_done_callback(lambda _: SCAN_EXECUTOR.submit(_release_checkout, path))
+            raise
+        except Exception as e:
+            tb = traceback.format_exc()
+            await loop.run_in_executor(SCAN_EXECUTOR, _release_checkout, path)
+            raise HTTPException(status_code=500, detail=f"Scan failed: {e}\n{tb}")
+        with span("scan.cleanup"):
+            await loop.run_in_executor(SCAN_EXECUTOR, _release_checkout, path)
+
+    summary["repo_url"] = repo_url
+    summary["branch"] = branch
+    return build_scan_response(summary, f"{note}; {mode}")
+
+
+async def run_scan_batch(reqs: List[ScanRequest], concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[dict]:
+    """
+    Scan many repos with at most `concurrency` in flight, yielding one result
+    line per repo as soon as it finishes. A failing repo yields an error line and
+    doesn't affect the others. Stopping the iteration cancels unfinished scans.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(index: int, req: ScanRequest) -> dict:
+        line = {"index": index, "repo_url": str(req.repo_url), "branch": req.branch}
+        async with sem:
+            try:
+                line.update(ok=True, result=await run_scan(req))
+            except HTTPException as e:
+                line.update(ok=False, status_code=e.status_code, error=e.detail)
+            except Exception as e:
+                line.update(ok=False, status_code=500, error=str(e))
+        return line
+
+    tasks = [asyncio.ensure_future(one(i, req)) for i, req in enumerate(reqs)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def until_disconnected(request: Request, work: Awaitable[T], poll: float = 0.5) -> T:
+    """
+    Await work, cancelling it if the HTTP client goes away in the meantime
+    (the pipeline then cleans up after itself).
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
@@ -0,0 +1,151 @@
+# service/plan_cache.py
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from service import telemetry
+from service.cache import Cache, cache_from_env
+
+
+def plan_key(prompt_input: Any, prompt_version: str, model: str) -> str:
+    """Canonical hash of what a plan depends on: the prompt input, the template version and the model."""
+    canonical = json.dumps(prompt_input, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    return f"plan:{model}:{prompt_version}:{digest}"
+
+
+class PlanCache:
+    """
+    Generated plans keyed by plan_key. Concurrent requests for a key that is
+    being generated wait for that one model call instead of making their own.
+    """
+
+    def __init__(self, backend: Cache):
+        self.backend = backend
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        """(future, leader): the leader makes the model call, everyone else waits on its future."""
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is None:
+                fut = self._inflight[key] = Future()
+                return fut, True
+            self.coalesced += 1
+        telemetry.count("agent_plan_requests_coalesced_total")
+        return fut, False
+
+    def _settle(self, key: str, fut: Future, plan: Any = None, error: Optional[BaseException] = None) -> None:
+        try:
+            if error is None:
+                self.backend.set(key, plan)
+                fut.set_result(plan)
+            else:
+                fut.set_exception(error)
+        except BaseException as e:
+            # never leave waiters hanging, e.g. when the cache backend fails
+            if not fut.done():
+                fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def get_or_create(self, key: str, create: Callable[[], Any]) -> Tuple[Any, str]:
+        """Returns (plan, source) where source is "hit", "coalesced" or "miss"."""
+        plan = self.backend.get(key)
+        if plan is not None:
+            return copy.deepcopy(plan), "hit"
+        fut, leader = self._claim(key)
+        if not leader:
+            return copy.deepcopy(fut.result()), "coalesced"
+        try:
+            plan = create()
+        except BaseException as e:
+            self._settle(key, fut, error=e)
+            raise
+        self._settle(key, fut, plan)
+        return copy.deepcopy(plan), "miss"
+
+    async def aget_or_create(self, key: str, create: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """get_or_create for coroutines; in-flight calls are shared with sync callers too."""
+        plan = self.backend.get(key)
+        if plan is not None:
+            return copy.deepcopy(plan), "hit"
+        fut, leader = self._claim(key)
+        if not leader:
+            return copy.deepcopy(await asyncio.wrap_future(fut)), "coalesced"
+        try:
+            plan = await create()
+        except BaseException as e:
+            self._settle(key, fut, error=e)
+            raise
+        self._settle(key, fut, plan)
+        return copy.deepcopy(plan), "miss"
+
+    async def astream(self, key: str, create: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Tuple[Any, str]]:
+        """
+        Streaming get_or_create for plans that are lists of steps: yields
+        (step, source). A miss passes steps through as create() produces them
+        and caches the list once it is complete.
+        """
+        plan = self.backend.get(key)
+        source = "hit"
+        if plan is None:
+            fut, leader = self._claim(key)
+            if not leader:
+                plan, source = await asyncio.wrap_future(fut), "coalesced"
+        if plan is not None:
+            if not isinstance(plan, list):
+                raise ValueError("Cached plan is not a list of steps")
+            for step in copy.deepcopy(plan):
+                yield step, source
+            return
+        plan = []
+        try:
+            async with aclosing(create()) as steps:
+                async for step in steps:
+                    plan.append(step)
+                    yield copy.deepcopy(step), "miss"
+        except GeneratorExit:
+            self._settle(key, fut, error=RuntimeError("Plan stream was abandoned by its client"))
+            raise
+        except BaseException as e:
+            self._settle(key, fut, error=e)
+            raise
+        self._settle(key, fut, plan)
+
+    def stats(self) -> Dict:
+        """Backend stats plus coalesced requests; hit_rate counts both as requests that saved a model call."""
+        stats = self.backend.stats()
+        requests = stats["hits"] + stats["misses"]
+        stats["coalesced"] = self.coalesced
+        stats["model_calls"] = stats["misses"] - self.coalesced
+        stats["hit_rate"] = round((stats["hits"] + self.coalesced) / requests, 4) if requests else 0.0
+        return stats
+
+
+_cache: Optional[PlanCache] = None
+_cache_lock = threading.Lock()
+_configured = False
+
+def get_plan_cache() -> Optional[PlanCache]:
+    """
+    Process-wide plan cache, configured from AGENT_PLAN_CACHE_BACKEND
+    (memory | sqlite | off), AGENT_PLAN_CACHE_PATH, AGENT_PLAN_CACHE_MAX_ENTRIES
+    and AGENT_PLAN_CACHE_TTL (seconds, default one day).
+    """
+    global _cache, _configured
+    with _cache_lock:
+        if not _configured:
+            backend = cache_from_env("AGENT_PLAN_CACHE", table="plans", max_entries=256, ttl=86400)
+            _cache = PlanCache(backend) if backend is not None else None
+            _configured = True
+        return _cache
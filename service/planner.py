@@ -1,14 +1,25 @@
-import google.genai as genai
 import json
+import logging
+import time
+from contextlib import aclosing
 from dotenv import load_dotenv
-import os
+from typing import AsyncIterator, Optional
 
-# Load .env file (for GEMINI_API_KEY)
+from service import telemetry
+from service.jsonstream import ArrayItemParser
+from service.listings import get_listing_store
+from service.llm import ModelBackend, get_backend
+from service.plan_cache import get_plan_cache, plan_key
+from service.summarize import TOKEN_BUDGET, estimate_tokens, project, render
+from service.telemetry import span
+
+# Load .env file (for GEMINI_API_KEY); the key itself is only needed on the first model call
 load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment or .env file")
-print("GEMINI_API_KEY loaded successfully:", bool(api_key))
+
+# bump whenever the prompt template changes, so cached plans are invalidated
+PROMPT_VERSION = "2"
+
+log = logging.getLogger("agent.planner")
 
 def extract_json(text: str) -> dict:
     """
@@ -32,21 +43,44 @@ def extract_json(text: str) -> dict:
         obj, idx = decoder.raw_decode(text)
         return obj
     except json.JSONDecodeError as e:
-        print("Raw Gemini response causing JSONDecodeError:")
-        print(repr(text))
+        log.debug("Model response is not valid JSON: %r", text)
         raise ValueError(f"Failed to decode JSON: {e}")
 
-def generate_plan(scan_summary: dict) -> dict:
+def prompt_input(scan_summary: dict, budget: Optional[int] = None) -> dict:
     """
-    Generates a tailored execution plan from the repository scan.
-    Uses scan_summary details (e.g., languages, frameworks, entrypoints) to customize files.
+    What goes into the prompt (and the plan cache key): the token-budgeted
+    projection of the scan summary (see service/summarize.py), built from the
+    full file listing when the scan's listing is still stored.
     """
-    client = genai.Client()
+    files = None
+    listings = get_listing_store()
+    if listings is not None and scan_summary.get("scan_id"):
+        files = listings.get(scan_summary["scan_id"])
+    return project(scan_summary, budget, files)
 
-    # Create a dynamic prompt describing the project details
-    prompt = f"""
-You are an expert DevOps engineer. Analyze the following repository details:
-{json.dumps(scan_summary, indent=2)}
+def preview_prompt(scan_summary: dict, budget: Optional[int] = None) -> dict:
+    """The projection and prompt size /plan would use for this summary, without calling the model."""
+    summary = prompt_input(scan_summary, budget)
+    return {
+        "budget": TOKEN_BUDGET if budget is None else budget,
+        "summary_tokens": estimate_tokens(render(summary)),
+        "prompt_tokens": estimate_tokens(_build_prompt(summary)),
+        "projection": summary,
+    }
+
+def _prompt(summary: dict) -> str:
+    with span("plan.prompt") as build:
+        prompt = _build_prompt(summary)
+        tokens = estimate_tokens(prompt)
+        build.set(prompt_tokens=tokens)
+    telemetry.observe("agent_plan_prompt_tokens", tokens)
+    return prompt
+
+def _build_prompt(scan_summary: dict) -> str:
+    return f"""
+You are an expert DevOps engineer. Analyze the following repository details
+(long lists are cut to fit; "omitted" counts the entries left out):
+{render(scan_summary)}
 
 Based on the information above, generate a step-by-step execution plan to build and deploy this project.
 For each step, output a JSON object with:
@@ -60,11 +94,87 @@ For each step, output a JSON object with:
 
 Respond with ONLY valid JSON.
 """
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
-    )
-    print("Raw Gemini response:")
-    print(repr(response.text))
-    plan_json = extract_json(response.text)
-    return plan_json
\ No newline at end of file
+
+def generate_plan(scan_summary: dict, backend: Optional[ModelBackend] = None, budget: Optional[int] = None) -> dict:
+    """
+    Generates a tailored execution plan from the repository scan.
+    Uses scan_summary details (e.g., languages, frameworks, entrypoints) to customize files.
+    Plans are cached by prompt input, prompt version and model (see service/plan_cache.py);
+    identical requests in flight share one model call. backend defaults to
+    get_backend() (see service/llm.py); budget to AGENT_PROMPT_TOKEN_BUDGET.
+    """
+    backend = backend or get_backend()
+    summary = prompt_input(scan_summary, budget)
+    cache = get_plan_cache()
+    if cache is None:
+        return _generate(summary, backend)
+    plan, _ = cache.get_or_create(plan_key(summary, PROMPT_VERSION, backend.model),
+                                  lambda: _generate(summary, backend))
+    return plan
+
+async def agenerate_plan(scan_summary: dict, backend: Optional[ModelBackend] = None,
+                         budget: Optional[int] = None) -> dict:
+    """generate_plan on the backend's async client, for use inside the event loop."""
+    backend = backend or get_backend()
+    summary = prompt_input(scan_summary, budget)
+    cache = get_plan_cache()
+    if cache is None:
+        return await _agenerate(summary, backend)
+    plan, _ = await cache.aget_or_create(plan_key(summary, PROMPT_VERSION, backend.model),
+                                         lambda: _agenerate(summary, backend))
+    return plan
+
+async def astream_plan(scan_summary: dict, backend: Optional[ModelBackend] = None,
+                       budget: Optional[int] = None) -> AsyncIterator[dict]:
+    """
+    generate_plan on the model's streaming API: yields each plan step as soon
+    as its JSON object is complete. Shares the plan cache with generate_plan;
+    cached plans come out all at once.
+    """
+    backend = backend or get_backend()
+    summary = prompt_input(scan_summary, budget)
+    cache = get_plan_cache()
+    started = time.perf_counter()
+    if cache is None:
+        steps = ((step, "miss") async for step in _astream(summary, backend))
+    else:
+        steps = cache.astream(plan_key(summary, PROMPT_VERSION, backend.model), lambda: _astream(summary, backend))
+    async with aclosing(steps):
+        async for step, source in steps:
+            if started is not None:
+                telemetry.observe("agent_plan_first_step_seconds", time.perf_counter() - started, source=source)
+                started = None
+            yield step
+
+async def _astream(scan_summary: dict, backend: ModelBackend) -> AsyncIterator[dict]:
+    prompt = _prompt(scan_summary)
+    parser = ArrayItemParser()
+    chars = 0
+    with span("plan.model_stream", backend=backend.name, model=backend.model) as call:
+        async with aclosing(backend.astream(prompt)) as chunks:
+            async for chunk in chunks:
+                chars += len(chunk)
+                for step in parser.feed(chunk):
+                    yield step
+        parser.close()
+        call.set(prompt_chars=len(prompt), response_chars=chars, steps=parser.count)
+
+def _parse(text: str) -> dict:
+    log.debug("Raw model response: %r", text)
+    with span("plan.extract_json"):
+        return extract_json(text)
+
+def _generate(scan_summary: dict, backend: ModelBackend) -> dict:
+    # Create a dynamic prompt describing the project details
+    prompt = _prompt(scan_summary)
+    with span("plan.model_call", backend=backend.name, model=backend.model) as call:
+        text = backend.generate(prompt)
+        call.set(prompt_chars=len(prompt), response_chars=len(text))
+    return _parse(text)
+
+async def _agenerate(scan_summary: dict, backend: ModelBackend) -> dict:
+    prompt = _prompt(scan_summary)
+    with span("plan.model_call", backend=backend.name, model=backend.model) as call:
+        text = await backend.agenerate(prompt)
+        call.set(prompt_chars=len(prompt), response_chars=len(text))
+    return _parse(text)
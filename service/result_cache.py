@@ -0,0 +1,102 @@
+# service/result_cache.py
+import re
+import threading
+from typing import Dict, Optional
+
+from git import Git, GitCommandError
+
+from service.cache import Cache, cache_from_env
+from service.git_utils import GIT_ENV, authenticated_url
+from service.mirror_cache import normalize_repo_url
+from service.scanner import SCANNER_VERSION
+
+SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+
+
+def resolve_commit(repo_url: str, branch: Optional[str] = None, github_token: Optional[str] = None,
+                   timeout: int = 15) -> Optional[str]:
+    """
+    Resolve a branch/tag (default: the remote HEAD) to a commit sha with
+    `git ls-remote`, without cloning anything. The ls-remote always runs with
+    the caller's credentials, so a sha is only returned to someone who can
+    read the remote. A sha ref is returned only when the remote advertises it
+    as the tip of one of its refs (ls-remote can't tell whether an older
+    commit is reachable). Returns None if it can't be resolved (the caller
+    then just scans).
+    """
+    ref = branch or "HEAD"
+    by_sha = SHA_RE.match(ref) is not None
+    url, _ = authenticated_url(repo_url, github_token)
+    argv = ["git", "ls-remote", url] if by_sha else ["git", "ls-remote", url, ref]
+    try:
+        out = Git().execute(argv, kill_after_timeout=timeout, env=GIT_ENV)
+    except GitCommandError:
+        return None
+    refs: Dict[str, str] = {}
+    for line in out.splitlines():
+        sha, _, name = line.partition("\t")
+        refs[name] = sha
+    if by_sha:
+        return ref if ref in refs.values() else None
+    # prefer a branch, then the peeled commit of an annotated tag, then a plain tag
+    for name in ("HEAD", f"refs/heads/{ref}", f"refs/tags/{ref}^{{}}", f"refs/tags/{ref}", ref):
+        if name in refs:
+            return refs[name]
+    return None
+
+
+def result_key(repo_url: str, sha: str) -> str:
+    return f"scan:{normalize_repo_url(repo_url)}:{sha}:{SCANNER_VERSION}"
+
+
+def state_key(repo_url: str) -> str:
+    return f"state:{normalize_repo_url(repo_url)}:{SCANNER_VERSION}"
+
+
+class ResultCache:
+    """
+    Scan summaries keyed by (repo, commit sha, scanner version). A scan only
+    depends on the tree at a commit, so entries never go stale; bumping
+    SCANNER_VERSION invalidates them when detectors change. The repo is part
+    of the key so a sha can't fetch another repo's summary.
+    It also keeps the per-file detector state of the latest scanned commit of
+    each repo, which incremental rescans start from.
+    """
+
+    def __init__(self, backend: Cache):
+        self.backend = backend
+
+    def get(self, repo_url: str, sha: str) -> Optional[Dict]:
+        summary = self.backend.get(result_key(repo_url, sha))
+        return dict(summary) if summary is not None else None
+
+    def put(self, repo_url: str, sha: str, summary: Dict) -> None:
+        self.backend.set(result_key(repo_url, sha), dict(summary))
+
+    def get_state(self, repo_url: str) -> Optional[Dict]:
+        """Returns {"sha": ..., "state": ...} for the last scan of repo_url, if any."""
+        return self.backend.get(state_key(repo_url))
+
+    def put_state(self, repo_url: str, sha: str, state: Dict) -> None:
+        self.backend.set(state_key(repo_url), {"sha": sha, "state": state})
+
+    def stats(self) -> Dict:
+        return self.backend.stats()
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+_configured = False
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    Process-wide result cache, configured from AGENT_RESULT_CACHE_BACKEND
+    (memory | sqlite | off), AGENT_RESULT_CACHE_PATH and AGENT_RESULT_CACHE_MAX_ENTRIES.
+    """
+    global _cache, _configured
+    with _cache_lock:
+        if not _configured:
+            backend = cache_from_env("AGENT_RESULT_CACHE", table="scan_results", max_entries=256)
+            _cache = ResultCache(backend) if backend is not None else None
+            _configured = True
+        return _cache
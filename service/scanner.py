@@ -1,7 +1,33 @@
 # service/scanner.py
 import os
-from typing import Dict, List
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 import fnmatch
+from service import telemetry
+from service.manifests import (LOCKFILE_GLOBS, MANIFEST_GLOBS, DependencyIndex, is_lockfile, is_manifest,
+                               parse_manifest_cached)
+from service.pathtrie import PathTrie
+from service.signatures import imported_modules, matcher_for, modules_for, packages_for
+from service.walker import IGNORE_FILE_NAMES, MAX_FILE_BYTES, Walker
+
+# bump whenever detector output changes, so cached scan results are invalidated
+SCANNER_VERSION = "9"
+
+# max number of triggering files reported per detected name
+MAX_SOURCES = 20
+
+# discovered_files in a summary holds the first page; the rest is paged from the file tree
+DISCOVERED_FILES_PAGE = 1000
+
+# parallel head reads kick in above this many candidate files
+PARALLEL_READ_THRESHOLD = int(os.getenv("SCAN_PARALLEL_THRESHOLD", "500"))
+READ_WORKERS = int(os.getenv("SCAN_READ_WORKERS", "16"))
+# upper bound on head bytes read but not yet consumed by the detectors
+MAX_INFLIGHT_BYTES = int(os.getenv("SCAN_MAX_INFLIGHT_BYTES", str(1024 * 1024)))
+# manifests and lockfiles are read whole (one at a time), up to this many characters
+MAX_MANIFEST_CHARS = int(os.getenv("SCAN_MAX_MANIFEST_CHARS", str(MAX_FILE_BYTES)))
 
 # helper to read a bit of file safely
 def read_head(path: str, max_chars: int = 2000) -> str:
@@ -11,106 +37,515 @@ def read_head(path: str, max_chars: int = 2000) -> str:
     except Exception:
         return ""
 
-def list_files(base: str) -> List[str]:
-    files = []
-    for root, _, filenames in os.walk(base):
-        for fn in filenames:
-            rel = os.path.relpath(os.path.join(root, fn), base)
-            files.append(rel.replace("\\", "/"))
-    return files
+def _read_batch(base: str, rels: List[str], max_chars: int) -> List[Tuple[str, str]]:
+    return [(rel, read_head(os.path.join(base, rel), max_chars)) for rel in rels]
+
+def read_heads_parallel(base: str, rels: Iterable[str], workers: int = READ_WORKERS,
+                        max_chars: int = 2000, max_inflight_bytes: int = MAX_INFLIGHT_BYTES,
+                        batch_size: int = 32) -> Iterator[Tuple[str, str]]:
+    """
+    Read file heads on a thread pool and yield (rel, head) as reads complete.
+    Files are read in small batches to keep per-task overhead low. Every batch
+    reserves batch_size * max_chars bytes of the in-flight budget until its
+    results have been consumed, so memory stays bounded however many files
+    there are; at least one batch is always allowed.
+    """
+    rels = iter(rels)
+    reserve = batch_size * max_chars
+    inflight = 0
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="read_head") as pool:
+        try:
+            while True:
+                while not pending or inflight + reserve <= max_inflight_bytes:
+                    batch = list(islice(rels, batch_size))
+                    if not batch:
+                        break
+                    pending.add(pool.submit(_read_batch, base, batch, max_chars))
+                    inflight += reserve
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield from fut.result()
+                    inflight -= reserve
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+def list_files(base: str) -> Iterator[str]:
+    """Lazily yield the relative paths of the files worth scanning under base (see Walker)."""
+    return Walker(base).walk()
+
+# ---------------- Detectors ----------------
+
+class Detector:
+    """
+    Base class for pluggable scan detectors.
+    The engine calls inspect() once per file; files for which wants_content()
+    is True also get the file head (read once and shared by all detectors),
+    or the whole file when wants_full() is True as well.
+    Whatever inspect() returns (if not None) is kept as that file's contribution
+    and summarize() folds all contributions into the summary value; extra()
+    can add more summary fields.
+    """
+    name = "detector"
+    field = "detector"
+
+    def wants_content(self, rel: str) -> bool:
+        return False
+
+    def wants_full(self, rel: str) -> bool:
+        return False
+
+    def content_globs(self) -> List[str]:
+        """Gitignore-style patterns covering every file wants_content() accepts."""
+        return []
+
+    def inspect(self, rel: str, head: Optional[str]) -> Any:
+        return None
+
+    def summarize(self, contributions: Dict[str, Any]) -> Any:
+        raise NotImplementedError
+
+    def sources(self, contributions: Dict[str, Any]) -> Optional[Dict[str, List[str]]]:
+        """Optionally map each detected value to the files that triggered it."""
+        return None
+
+    def extra(self, contributions: Dict[str, Any]) -> Dict[str, Any]:
+        """Summary fields besides field."""
+        return {}
+
+
+class LanguageDetector(Detector):
+    name = "languages"
+    field = "languages"
+
+    def inspect(self, rel: str, head: Optional[str]) -> Any:
+        if rel.endswith(".py"):
+            return "python"
+        if rel.endswith(".js") or rel.endswith(".ts"):
+            return "javascript"
+        if rel.endswith(".html"):
+            return "html"
+        if rel.endswith(".css"):
+            return "css"
+        if fnmatch.fnmatch(rel, "*.go"):
+            return "go"
+        return None
+
+    def summarize(self, contributions: Dict[str, Any]) -> Any:
+        return sorted(set(contributions.values()))
+
+
+class SignatureDetector(Detector):
+    """
+    Looks up the declared dependencies of each manifest in the package
+    signatures, and the import statements of the other candidate files (.py
+    sources) in the module signatures. Keeps the per-file hits, so results
+    can say which file triggered a detection.
+    """
+    categories: Tuple[str, ...] = ()
+    suffixes: Tuple[str, ...] = ()
+
+    def __init__(self):
+        self.matcher = matcher_for(*self.categories)
+        self.packages = packages_for(*self.categories)
+        self.modules = modules_for(*self.categories)
+
+    def wants_content(self, rel: str) -> bool:
+        return rel.endswith(self.suffixes) or is_manifest(rel)
+
+    def wants_full(self, rel: str) -> bool:
+        return is_manifest(rel)
+
+    def content_globs(self) -> List[str]:
+        return ["*" + suffix for suffix in self.suffixes] + list(MANIFEST_GLOBS)
+
+    def inspect(self, rel: str, head: Optional[str]) -> Any:
+        if not head:
+            return None
+        if is_manifest(rel):
+            deps = parse_manifest_cached(rel, head)
+            return sorted({name for package, name in self.packages.items() if package in deps}) or None
+        return sorted({self.modules[m] for m in imported_modules(head) if m in self.modules}) or None
+
+    def sources(self, contributions: Dict[str, Any]) -> Dict[str, List[str]]:
+        found: Dict[str, List[str]] = {}
+        for rel in sorted(contributions):
+            for name in contributions[rel]:
+                found.setdefault(name, []).append(rel)
+        return {name: found[name][:MAX_SOURCES] for name in self.matcher.ordered(found)}
+
+
+class FrameworkDetector(SignatureDetector):
+    name = "frameworks"
+    field = "frameworks"
+    categories = ("framework", "orm", "migrations")
+    suffixes = (".py",)
+
+    def summarize(self, contributions: Dict[str, Any]) -> Any:
+        return self.matcher.ordered(n for names in contributions.values() for n in names)
+
+
+class DatabaseDetector(SignatureDetector):
+    name = "database"
+    field = "database"
+    categories = ("db_driver",)
+    suffixes = (".py",)
+
+    def summarize(self, contributions: Dict[str, Any]) -> Any:
+        # signature table order is priority order: the first database found wins
+        found = self.matcher.ordered(n for names in contributions.values() for n in names)
+        return found[0] if found else None
+
+
+class EntrypointDetector(Detector):
+    name = "entrypoints"
+    field = "entrypoints"
+
+    def __init__(self):
+        self.servers = matcher_for("web_server")
+
+    def wants_content(self, rel: str) -> bool:
+        return rel.endswith(".py")
+
+    def content_globs(self) -> List[str]:
+        return ["*.py"]
+
+    def inspect(self, rel: str, head: Optional[str]) -> Any:
+        # common entrypoints
+        if rel.endswith("main.py") or rel.endswith("app.py") or rel.endswith("wsgi.py"):
+            return True
+        # fallback: top-level package with uvicorn/gunicorn/... mention
+        if head and self.servers.scan(head):
+            return True
+        return None
+
+    def summarize(self, contributions: Dict[str, Any]) -> Any:
+        return sorted(contributions)
+
+
+class InfraDetector(Detector):
+    name = "infrastructure"
+    field = "infrastructure"
+    keys = ("dockerfile", "docker_compose", "k8s_manifests", "ci")
+
+    def inspect(self, rel: str, head: Optional[str]) -> Any:
+        low = rel.lower()
+        found = []
+        if low.endswith("dockerfile") or low.endswith("dockerfile.j2"):
+            found.append("dockerfile")
+        if "docker-compose" in low or low.endswith("compose.yaml"):
+            found.append("docker_compose")
+        if rel.endswith((".yaml", ".yml")) and ("k8s" in low or "deployment" in low or "service" in low):
+            found.append("k8s_manifests")
+        if low.startswith(".github/") or "gitlab-ci" in low or ".circleci" in low:
+            found.append("ci")
+        return found or None
+
+    def summarize(self, contributions: Dict[str, Any]) -> Any:
+        seen = set()
+        for keys in contributions.values():
+            seen.update(keys)
+        return {key: key in seen for key in self.keys}
+
+
+class TestsDetector(Detector):
+    name = "tests"
+    field = "has_tests"
+
+    def inspect(self, rel: str, head: Optional[str]) -> Any:
+        if rel.startswith("tests/") or rel.endswith("_test.py") or rel.endswith("test.py"):
+            return True
+        return None
+
+    def summarize(self, contributions: Dict[str, Any]) -> Any:
+        return bool(contributions)
+
+
+class DependencyDetector(Detector):
+    """
+    Declared dependencies and their version specs, per manifest file, plus
+    the locked versions of those dependencies from lockfiles.
+    """
+    name = "dependencies"
+    field = "dependencies"
+
+    def wants_content(self, rel: str) -> bool:
+        return is_manifest(rel) or is_lockfile(rel)
+
+    def wants_full(self, rel: str) -> bool:
+        return True
+
+    def content_globs(self) -> List[str]:
+        return list(MANIFEST_GLOBS + LOCKFILE_GLOBS)
+
+    def inspect(self, rel: str, head: Optional[str]) -> Any:
+        if not head:
+            return None
+        return parse_manifest_cached(rel, head) or None
+
+    def summarize(self, contributions: Dict[str, Any]) -> Any:
+        return {rel: contributions[rel] for rel in sorted(contributions) if not is_lockfile(rel)}
+
+    def extra(self, contributions: Dict[str, Any]) -> Dict[str, Any]:
+        # shallowest lockfile first, so a root lockfile wins over nested ones
+        index = DependencyIndex((rel, contributions[rel])
+                                for rel in sorted(contributions, key=lambda r: (r.count("/"), r)))
+        return {"locked_versions": index.locked_versions()}
+
+
+def default_detectors() -> List[Detector]:
+    return [
+        LanguageDetector(),
+        FrameworkDetector(),
+        DatabaseDetector(),
+        EntrypointDetector(),
+        InfraDetector(),
+        TestsDetector(),
+        DependencyDetector(),
+    ]
+
+def sparse_patterns(detectors: Optional[List[Detector]] = None) -> List[str]:
+    """
+    Paths a sparse checkout must contain for the detectors to see every file
+    they read, plus the ignore files the walk rules come from.
+    """
+    detectors = detectors if detectors is not None else default_detectors()
+    return sorted({glob for d in detectors for glob in d.content_globs()} | set(IGNORE_FILE_NAMES))
+
+# ---------------- Engine ----------------
+
+class ScanEngine:
+    """
+    Runs a set of detectors over a file list in a single pass.
+    Each candidate file's head is read at most once and shared by every detector
+    that asked for it. Time spent in each detector is accumulated separately.
+    """
+
+    def __init__(self, detectors: Optional[List[Detector]] = None, max_chars: int = 2000,
+                 workers: int = READ_WORKERS, parallel_threshold: int = PARALLEL_READ_THRESHOLD):
+        self.detectors = detectors if detectors is not None else default_detectors()
+        self.max_chars = max_chars
+        self.workers = workers
+        self.parallel_threshold = parallel_threshold
+
+    def _read(self, base: str, rels: List[str]) -> Iterator[Tuple[str, str]]:
+        if self.workers > 1 and len(rels) >= self.parallel_threshold:
+            return read_heads_parallel(base, rels, workers=self.workers, max_chars=self.max_chars)
+        return ((rel, read_head(os.path.join(base, rel), self.max_chars)) for rel in rels)
+
+    def new_state(self) -> Dict[str, Dict[str, Any]]:
+        """Per-detector map of file -> contribution; JSON-serializable so it can be stored."""
+        return {d.name: {} for d in self.detectors}
+
+    def collect(self, base: str, files: Iterable[str], state: Dict[str, Dict[str, Any]],
+                timings: Dict[str, float]) -> None:
+        """Inspect files and record their contributions in state."""
+        perf = time.perf_counter
+
+        # path-only detection, collecting which detectors need each file's head
+        readers: Dict[str, List[Detector]] = {}
+        for rel in files:
+            for d in self.detectors:
+                t0 = perf()
+                if d.wants_content(rel):
+                    readers.setdefault(rel, []).append(d)
+                else:
+                    contribution = d.inspect(rel, None)
+                    if contribution is not None:
+                        state[d.name][rel] = contribution
+                timings[d.name] += perf() - t0
+
+        # content detection, fed in completion order; files some detector wants whole are read after the heads
+        full = [rel for rel, ds in readers.items() if any(d.wants_full(rel) for d in ds)]
+        whole = set(full)
+        heads = chain(self._read(base, [rel for rel in readers if rel not in whole]),
+                      ((rel, read_head(os.path.join(base, rel), MAX_MANIFEST_CHARS)) for rel in full))
+        bytes_read = 0
+        while True:
+            t0 = perf()
+            item = next(heads, None)
+            timings["read"] += perf() - t0
+            if item is None:
+                break
+            rel, head = item
+            bytes_read += len(head)
+            for d in readers[rel]:
+                t0 = perf()
+                content = head[:self.max_chars] if rel in whole and not d.wants_full(rel) else head
+                contribution = d.inspect(rel, content)
+                if contribution is not None:
+                    state[d.name][rel] = contribution
+                timings[d.name] += perf() - t0
+        telemetry.count("agent_bytes_read_total", bytes_read)
+
+    def summarize(self, state: Dict[str, Dict[str, Any]], timings: Dict[str, float]) -> Dict[str, Any]:
+        perf = time.perf_counter
+        results = {"detection_sources": {}}
+        for d in self.detectors:
+            t0 = perf()
+            contributions = state.get(d.name, {})
+            results[d.field] = d.summarize(contributions)
+            results.update(d.extra(contributions))
+            sources = d.sources(contributions)
+            if sources is not None:
+                results["detection_sources"][d.field] = sources
+            timings[d.name] += perf() - t0
+        return results
+
+    def _timings(self) -> Dict[str, float]:
+        timings = {"read": 0.0}
+        timings.update({d.name: 0.0 for d in self.detectors})
+        return timings
+
+    def run(self, base: str, files: Iterable[str]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        results, _, timings = self.run_with_state(base, files)
+        return results, timings
+
+    def run_with_state(self, base: str, files: Iterable[str]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]], Dict[str, float]]:
+        timings = self._timings()
+        state = self.new_state()
+        self.collect(base, files, state, timings)
+        return self.summarize(state, timings), state, timings
+
+    def rescan(self, base: str, state: Dict[str, Dict[str, Any]], changed: Iterable[str],
+               deleted: Iterable[str]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """
+        Update state in place for a set of changed (added/modified) and deleted
+        files, then re-summarize. Unchanged files are neither listed nor read.
+        """
+        timings = self._timings()
+        changed = list(changed)
+        for d in self.detectors:
+            contributions = state.setdefault(d.name, {})
+            for rel in changed:
+                contributions.pop(rel, None)
+            for rel in deleted:
+                contributions.pop(rel, None)
+        self.collect(base, changed, state, timings)
+        return self.summarize(state, timings), timings
+
+
+def _run_detector(detector: Detector, base: str, files: List[str]) -> Any:
+    results, _ = ScanEngine([detector]).run(base, files)
+    return results[detector.field]
 
 def detect_languages(files: List[str]) -> List[str]:
-    langs = set()
-    for f in files:
-        if f.endswith(".py"):
-            langs.add("python")
-        if f.endswith(".js") or f.endswith(".ts"):
-            langs.add("javascript")
-        if f.endswith(".html"):
-            langs.add("html")
-        if f.endswith(".css"):
-            langs.add("css")
-        if fnmatch.fnmatch(f, "*.go"):
-            langs.add("go")
-    return sorted(list(langs))
+    return _run_detector(LanguageDetector(), "", files)
 
 def detect_frameworks(base: str, files: List[str]) -> List[str]:
-    content = ""
-    for f in files:
-        if f.endswith((".py", ".txt", ".md", "requirements.txt", "pyproject.toml", "Pipfile")):
-            content += read_head(os.path.join(base, f))
-            content += "\n"
-    frameworks = []
-    c = content.lower()
-    if "fastapi" in c:
-        frameworks.append("fastapi")
-    if "flask" in c:
-        frameworks.append("flask")
-    if "django" in c:
-        frameworks.append("django")
-    if "sqlalchemy" in c:
-        frameworks.append("sqlalchemy")
-    if "alembic" in c:
-        frameworks.append("alembic")
-    if "react" in c or "create-react-app" in c:
-        frameworks.append("react")
-    if "vue" in c:
-        frameworks.append("vue")
-    return frameworks
+    return _run_detector(FrameworkDetector(), base, files)
 
 def detect_database(base: str, files: List[str]) -> str | None:
-    content = ""
-    for f in files:
-        if f.endswith((".py", "requirements.txt", "pyproject.toml", "Pipfile")):
-            content += read_head(os.path.join(base, f))
-    c = content.lower()
-    if "psycopg2" in c or "postgresql" in c:
-        return "postgres"
-    if "mysqlclient" in c or "pymysql" in c:
-        return "mysql"
-    if "sqlite3" in c or "sqlite" in c:
-        return "sqlite"
-    return None
+    return _run_detector(DatabaseDetector(), base, files)
 
 def find_entrypoints(base: str, files: List[str]) -> List[str]:
-    candidates = []
-    # common entrypoints
-    for f in files:
-        if f.endswith("main.py") or f.endswith("app.py") or f.endswith("wsgi.py"):
-            candidates.append(f)
-    # fallback: top-level package with uvicorn/gunicorn mention
-    for f in files:
-        if f.endswith(".py"):
-            head = read_head(os.path.join(base, f))
-            if "uvicorn" in head or "gunicorn" in head:
-                candidates.append(f)
-    return sorted(list(dict.fromkeys(candidates)))  # preserve order unique
+    return _run_detector(EntrypointDetector(), base, files)
 
 def detect_infra(files: List[str]) -> Dict:
-    infra = {
-        "dockerfile": any(f.lower().endswith("dockerfile") or f.lower().endswith("dockerfile.j2") for f in files),
-        "docker_compose": any("docker-compose" in f.lower() or f.lower().endswith("compose.yaml") for f in files),
-        "k8s_manifests": any(f.endswith((".yaml", ".yml")) and ("k8s" in f.lower() or "deployment" in f.lower() or "service" in f.lower()) for f in files),
-        "ci": any(f.lower().startswith(".github/") or "gitlab-ci" in f.lower() or ".circleci" in f.lower() for f in files),
-    }
-    return infra
+    return _run_detector(InfraDetector(), "", files)
 
-def scan_repo(path: str) -> Dict:
-    files = list_files(path)
-    languages = detect_languages(files)
-    frameworks = detect_frameworks(path, files)
-    db = detect_database(path, files)
-    entrypoints = find_entrypoints(path, files)
-    infra = detect_infra(files)
-    has_tests = any(f.startswith("tests/") or f.endswith("_test.py") or f.endswith("test.py") for f in files)
+def _export_metrics(timings: Dict[str, float], walk_stats: Dict[str, Any]) -> None:
+    """Feed a scan's timings and walk counts to the metrics registry."""
+    if not telemetry.METRICS_ENABLED:
+        return
+    for name, seconds in timings.items():
+        if name != "total":
+            telemetry.observe("agent_scan_part_seconds", seconds, part=name)
+    telemetry.count("agent_files_walked_total", walk_stats["files"])
+    for reason, n in walk_stats["skipped"].items():
+        if n:
+            telemetry.count("agent_files_skipped_total", n, reason=reason)
 
+def _summary(path: str, files: PathTrie, results: Dict[str, Any], timings: Dict[str, float],
+             walk_stats: Optional[Dict[str, Any]]) -> Dict:
     return {
         "project_name": os.path.basename(path.rstrip("/")),
-        "languages": languages,
-        "frameworks": frameworks,
-        "database": db,
-        "has_tests": has_tests,
-        "entrypoints": entrypoints,
-        "infrastructure": infra,
-        "discovered_files": files
+        "languages": results["languages"],
+        "frameworks": results["frameworks"],
+        "database": results["database"],
+        "has_tests": results["has_tests"],
+        "entrypoints": results["entrypoints"],
+        "infrastructure": results["infrastructure"],
+        "dependencies": results["dependencies"],
+        "locked_versions": results["locked_versions"],
+        "discovered_files": files.page(None, DISCOVERED_FILES_PAGE)[0],
+        "files_total": len(files),
+        "file_tree": files.to_dict(),
+        "walk_stats": walk_stats,
+        "detection_sources": results["detection_sources"],
+        "timings_ms": {k: round(v * 1000, 3) for k, v in timings.items()},
     }
+
+def _recorded(files: Iterable[str], trie: PathTrie, timings: Dict[str, float]) -> Iterator[str]:
+    """Pass files through while adding them to trie and timing the listing itself."""
+    perf = time.perf_counter
+    it = iter(files)
+    while True:
+        t0 = perf()
+        rel = next(it, None)
+        timings["walk"] += perf() - t0
+        if rel is None:
+            return
+        trie.add(rel)
+        yield rel
+
+def scan_repo_with_state(path: str, files: Optional[Iterable[str]] = None) -> Tuple[Dict, Dict]:
+    """
+    Like scan_repo, but also returns the per-file detector state that
+    rescan_repo needs to update the result incrementally later.
+    The listing is streamed through the detectors as it is walked; only the
+    compact file tree is kept. A passed file list goes through the same
+    skip/ignore rules as a walk.
+    """
+    perf = time.perf_counter
+    started = perf()
+    trie = PathTrie()
+    walk = {"walk": 0.0}
+    walker = Walker(path)
+    files = walker.walk() if files is None else walker.filter(files)
+    results, detector_state, timings = ScanEngine().run_with_state(path, _recorded(files, trie, walk))
+    timings.update(walk)
+    timings["total"] = perf() - started
+    state = {"version": SCANNER_VERSION, "files": trie.to_dict(), "detectors": detector_state}
+    _export_metrics(timings, walker.stats)
+    return _summary(path, trie, results, timings, walker.stats), state
+
+def scan_repo(path: str, files: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Scan a checked-out repo. Pass files to scan a known file list instead of
+    walking the directory (e.g. the tree listing of a sparse clone).
+    """
+    return scan_repo_with_state(path, files)[0]
+
+def rescan_repo(path: str, state: Dict, changed: List[str], deleted: List[str]) -> Tuple[Dict, Dict]:
+    """
+    Incrementally update a previous scan (state from scan_repo_with_state) to the
+    checkout at path, given the paths changed/deleted since the scanned commit.
+    Returns (summary, new_state); the passed state is left untouched.
+    """
+    if state.get("version") != SCANNER_VERSION:
+        raise ValueError("scan state was produced by a different scanner version")
+    perf = time.perf_counter
+    started = perf()
+    walker = Walker(path)
+    kept = list(walker.filter(changed))
+    # changed files that are now skipped (e.g. grew too large) drop out like deleted ones
+    deleted = list(deleted) + sorted(set(changed) - set(kept))
+    changed = kept
+    files = PathTrie.from_dict(state["files"]).copy()
+    for rel in deleted:
+        files.discard(rel)
+    for rel in changed:
+        # added paths land where a full walk would list them, so pages match a fresh scan
+        files.add(rel, keep_sorted=True)
+    # contributions are never mutated, so copying the per-detector maps is enough
+    detector_state = {name: dict(contributions) for name, contributions in state["detectors"].items()}
+    results, timings = ScanEngine().rescan(path, detector_state, changed, deleted)
+    timings["total"] = perf() - started
+    new_state = {"version": SCANNER_VERSION, "files": files.to_dict(), "detectors": detector_state}
+    _export_metrics(timings, walker.stats)
+    # walk_stats only cover the changed files here
+    return _summary(path, files, results, timings, dict(walker.stats, incremental=True)), new_state
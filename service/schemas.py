@@ -1,21 +1,52 @@
 # service/schemas.py
-from pydantic import BaseModel, HttpUrl, Field, SecretStr
-from typing import Optional
+from pydantic import BaseModel, HttpUrl, Field, SecretStr, field_validator
+from typing import Literal, Optional
 
 class ScanRequest(BaseModel):
     repo_url: HttpUrl = Field(..., description="HTTPS url to the GitHub repository (https://github.com/org/repo.git)")
     branch: Optional[str] = Field(None, description="Optional branch or ref to checkout")
     github_token: Optional[SecretStr] = Field(None, description="Optional personal access token to clone private repos (sent securely)")
+    clone_strategy: Optional[Literal["sparse", "shallow", "blobless", "full", "mirror"]] = Field(None, description="How much of the repo to download (server default: shallow): sparse (only files the scanner reads), shallow (depth 1), blobless (history, blobs on demand), full, or mirror (incremental fetch into a persistent local mirror)")
 
 class ScanResponse(BaseModel):
     project_name: str
     repo_url: str
     branch: Optional[str]
+    commit_sha: Optional[str] = None
     languages: list[str]
     frameworks: list[str]
     database: Optional[str] = None
     has_tests: bool
     entrypoints: list[str]
     infrastructure: dict
-    discovered_files: list[str]
+    dependencies: dict = Field(default_factory=dict, description="Declared dependencies and version specs per manifest file")
+    locked_versions: dict = Field(default_factory=dict, description="Versions lockfiles pin for the declared dependencies")
+    discovered_files: list[str] | dict[str, list[str]] = Field(..., description="First page of the file listing; page through the rest with GET /scan/{scan_id}/files. With files_format=grouped: {directory: [file names]}")
+    files_total: int = 0
+    scan_id: Optional[str] = Field(None, description="Id of the stored file listing (an HMAC of the repo and commit sha)")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page of files, None when discovered_files is complete")
+    detection_sources: dict = Field(default_factory=dict, description="Files that triggered each framework/database detection")
+    timings_ms: Optional[dict] = Field(None, description="Per-stage and per-detector scan time in milliseconds")
+    walk_stats: Optional[dict] = Field(None, description="Files listed, and files/bytes/directories skipped by the walk (skip list, ignore files, binary, oversized)")
     note: Optional[str] = None
+    summary_id: Optional[str] = Field(None, description="Id of this summary in the artifact store: pass it to /plan as ?summary_id= instead of the summary")
+
+
+class FileListPage(BaseModel):
+    scan_id: str
+    files: list[str] | dict[str, list[str]]
+    total: int
+    next_cursor: Optional[str] = None
+
+
+class JobRequest(BaseModel):
+    repo: ScanRequest
+    stages: list[Literal["scan", "plan", "execute"]] = Field(["scan", "plan", "execute"], description="Stages to run, in order, starting with scan")
+
+    @field_validator("stages")
+    @classmethod
+    def stages_in_order(cls, stages):
+        expected = ["scan", "plan", "execute"][:len(stages)]
+        if stages != expected:
+            raise ValueError("stages must be scan, scan+plan or scan+plan+execute (in that order)")
+        return stages
@@ -0,0 +1,248 @@
+# service/signatures.py
+import re
+from typing import Dict, Iterable, List, NamedTuple, Set
+
+
+class Signature(NamedTuple):
+    keyword: str   # text to look for (matched case-insensitively)
+    name: str      # what gets reported when the keyword is seen
+    category: str  # framework | orm | migrations | db_driver | web_server
+
+
+# Declarative signature table used by the scanner detectors.
+# Names are reported in the order they first appear here, so keep the
+# original detections at the top and append new ones below them.
+SIGNATURES: List[Signature] = [
+    # web frameworks
+    Signature("fastapi", "fastapi", "framework"),
+    Signature("flask", "flask", "framework"),
+    Signature("django", "django", "framework"),
+    # ORMs / migrations
+    Signature("sqlalchemy", "sqlalchemy", "orm"),
+    Signature("alembic", "alembic", "migrations"),
+    # frontend frameworks
+    Signature("react", "react", "framework"),
+    Signature("create-react-app", "react", "framework"),
+    Signature("vue", "vue", "framework"),
+    # additional frameworks
+    Signature("starlette", "starlette", "framework"),
+    Signature("tornado", "tornado", "framework"),
+    Signature('"express"', "express", "framework"),
+    Signature("@angular/core", "angular", "framework"),
+    Signature('"svelte"', "svelte", "framework"),
+    Signature("gin-gonic/gin", "gin", "framework"),
+    # additional ORMs
+    Signature("peewee", "peewee", "orm"),
+    Signature("tortoise-orm", "tortoise", "orm"),
+    Signature('"prisma"', "prisma", "orm"),
+    Signature('"sequelize"', "sequelize", "orm"),
+    Signature('"typeorm"', "typeorm", "orm"),
+    Signature('"mongoose"', "mongoose", "orm"),
+    Signature("gorm.io/gorm", "gorm", "orm"),
+    # database drivers, in priority order
+    Signature("psycopg2", "postgres", "db_driver"),
+    Signature("postgresql", "postgres", "db_driver"),
+    Signature("asyncpg", "postgres", "db_driver"),
+    Signature("mysqlclient", "mysql", "db_driver"),
+    Signature("pymysql", "mysql", "db_driver"),
+    Signature("mysql-connector", "mysql", "db_driver"),
+    Signature("sqlite3", "sqlite", "db_driver"),
+    Signature("sqlite", "sqlite", "db_driver"),
+    Signature("pymongo", "mongodb", "db_driver"),
+    # web servers
+    Signature("uvicorn", "uvicorn", "web_server"),
+    Signature("gunicorn", "gunicorn", "web_server"),
+    Signature("hypercorn", "hypercorn", "web_server"),
+    Signature("waitress", "waitress", "web_server"),
+]
+
+
+class PackageSignature(NamedTuple):
+    package: str   # dependency name as the manifest index normalizes it (PEP 503 for Python)
+    name: str      # what gets reported, as in SIGNATURES
+    category: str
+
+
+# Dependencies that imply a detection when a manifest declares them. Looked up
+# by exact name in the parsed manifest, so a README mentioning "vue" or a
+# package called "vue-loader-helper" doesn't count.
+PACKAGE_SIGNATURES: List[PackageSignature] = [
+    PackageSignature("fastapi", "fastapi", "framework"),
+    PackageSignature("flask", "flask", "framework"),
+    PackageSignature("django", "django", "framework"),
+    PackageSignature("sqlalchemy", "sqlalchemy", "orm"),
+    PackageSignature("flask-sqlalchemy", "sqlalchemy", "orm"),
+    PackageSignature("sqlmodel", "sqlalchemy", "orm"),
+    PackageSignature("alembic", "alembic", "migrations"),
+    PackageSignature("react", "react", "framework"),
+    PackageSignature("react-scripts", "react", "framework"),
+    PackageSignature("vue", "vue", "framework"),
+    PackageSignature("starlette", "starlette", "framework"),
+    PackageSignature("tornado", "tornado", "framework"),
+    PackageSignature("express", "express", "framework"),
+    PackageSignature("@angular/core", "angular", "framework"),
+    PackageSignature("svelte", "svelte", "framework"),
+    PackageSignature("github.com/gin-gonic/gin", "gin", "framework"),
+    PackageSignature("peewee", "peewee", "orm"),
+    PackageSignature("tortoise-orm", "tortoise", "orm"),
+    PackageSignature("prisma", "prisma", "orm"),
+    PackageSignature("@prisma/client", "prisma", "orm"),
+    PackageSignature("sequelize", "sequelize", "orm"),
+    PackageSignature("typeorm", "typeorm", "orm"),
+    PackageSignature("mongoose", "mongoose", "orm"),
+    PackageSignature("gorm.io/gorm", "gorm", "orm"),
+    PackageSignature("psycopg2", "postgres", "db_driver"),
+    PackageSignature("psycopg2-binary", "postgres", "db_driver"),
+    PackageSignature("psycopg", "postgres", "db_driver"),
+    PackageSignature("asyncpg", "postgres", "db_driver"),
+    PackageSignature("pg", "postgres", "db_driver"),
+    PackageSignature("github.com/lib/pq", "postgres", "db_driver"),
+    PackageSignature("github.com/jackc/pgx/v5", "postgres", "db_driver"),
+    PackageSignature("mysqlclient", "mysql", "db_driver"),
+    PackageSignature("pymysql", "mysql", "db_driver"),
+    PackageSignature("mysql-connector-python", "mysql", "db_driver"),
+    PackageSignature("mysql2", "mysql", "db_driver"),
+    PackageSignature("github.com/go-sql-driver/mysql", "mysql", "db_driver"),
+    PackageSignature("aiosqlite", "sqlite", "db_driver"),
+    PackageSignature("sqlite3", "sqlite", "db_driver"),
+    PackageSignature("better-sqlite3", "sqlite", "db_driver"),
+    PackageSignature("pymongo", "mongodb", "db_driver"),
+    PackageSignature("motor", "mongodb", "db_driver"),
+    PackageSignature("mongodb", "mongodb", "db_driver"),
+    PackageSignature("go.mongodb.org/mongo-driver", "mongodb", "db_driver"),
+    PackageSignature("uvicorn", "uvicorn", "web_server"),
+    PackageSignature("gunicorn", "gunicorn", "web_server"),
+    PackageSignature("hypercorn", "hypercorn", "web_server"),
+    PackageSignature("waitress", "waitress", "web_server"),
+]
+
+
+class ModuleSignature(NamedTuple):
+    module: str    # top-level module a .py file imports (case-sensitive, as Python treats it)
+    name: str      # what gets reported, as in SIGNATURES
+    category: str
+
+
+# Python imports that imply a detection. Only import statements count (see
+# imported_modules), so a comment or string naming "flask" doesn't, and .py
+# files never report JS or Go frameworks: those come from package.json / go.mod.
+MODULE_SIGNATURES: List[ModuleSignature] = [
+    ModuleSignature("fastapi", "fastapi", "framework"),
+    ModuleSignature("flask", "flask", "framework"),
+    ModuleSignature("django", "django", "framework"),
+    ModuleSignature("sqlalchemy", "sqlalchemy", "orm"),
+    ModuleSignature("flask_sqlalchemy", "sqlalchemy", "orm"),
+    ModuleSignature("sqlmodel", "sqlalchemy", "orm"),
+    ModuleSignature("alembic", "alembic", "migrations"),
+    ModuleSignature("starlette", "starlette", "framework"),
+    ModuleSignature("tornado", "tornado", "framework"),
+    ModuleSignature("peewee", "peewee", "orm"),
+    ModuleSignature("tortoise", "tortoise", "orm"),
+    ModuleSignature("psycopg2", "postgres", "db_driver"),
+    ModuleSignature("psycopg", "postgres", "db_driver"),
+    ModuleSignature("asyncpg", "postgres", "db_driver"),
+    ModuleSignature("MySQLdb", "mysql", "db_driver"),
+    ModuleSignature("pymysql", "mysql", "db_driver"),
+    ModuleSignature("mysql", "mysql", "db_driver"),
+    ModuleSignature("sqlite3", "sqlite", "db_driver"),
+    ModuleSignature("aiosqlite", "sqlite", "db_driver"),
+    ModuleSignature("pymongo", "mongodb", "db_driver"),
+    ModuleSignature("motor", "mongodb", "db_driver"),
+]
+
+# One left-to-right pass over Python source: strings (an unterminated one, as at
+# the end of a truncated head, runs to the end; prefixes like r/b/f don't change
+# where a string ends) and comments are consumed whole,
+# so only real statements are left to match "import a.b as c, d" / "from a.b
+# import x" at the start of a line (indented is fine: imports inside try/if).
+# Relative imports are left out.
+_PY_IMPORT_RE = re.compile(r"""
+    \"\"\"[\s\S]*?(?:\"\"\"|\Z)|\'\'\'[\s\S]*?(?:\'\'\'|\Z)
+    |"(?:[^"\\\n]|\\.)*"?|'(?:[^'\\\n]|\\.)*'?
+    |\#[^\n]*
+    |^[ \t]*(?:from[ \t]+(?P<from>[A-Za-z_]\w*)[\w.]*[ \t]+import\b
+              |import[ \t]+(?P<imports>[A-Za-z_][\w.]*(?:[ \t]+as[ \t]+\w+)?
+                                       (?:[ \t]*,[ \t]*[A-Za-z_][\w.]*(?:[ \t]+as[ \t]+\w+)?)*))
+""", re.MULTILINE | re.VERBOSE)
+
+
+def imported_modules(text: str) -> Set[str]:
+    """Top-level modules imported by the import statements in Python source text."""
+    found: Set[str] = set()
+    for match in _PY_IMPORT_RE.finditer(text):
+        if match["from"]:
+            found.add(match["from"])
+        elif match["imports"]:
+            found.update(part.split()[0].split(".")[0] for part in match["imports"].split(","))
+    return found
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Build a regex whose alternations follow a trie of the words (shared prefixes are matched once)."""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        if list(node) == [""]:
+            return ""
+        optional = "" in node
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        pattern = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        # greedy optional tail: at any position the longest keyword wins
+        return "(?:" + pattern + ")?" if optional else pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Matches every keyword of a signature set in one pass over the text.
+    Keywords are compiled into a single trie-shaped regex and matched against the
+    lowercased text, so each file head is scanned once however many signatures
+    there are. A keyword that contains another keyword also reports the inner
+    one's name, so the longest match never hides a shorter signature.
+    """
+
+    def __init__(self, signatures: Iterable[Signature]):
+        signatures = list(signatures)
+        self.order: List[str] = list(dict.fromkeys(s.name for s in signatures))
+        self._names: Dict[str, Set[str]] = {}
+        for s in signatures:
+            self._names.setdefault(s.keyword.lower(), set()).add(s.name)
+        for outer in self._names:
+            for inner, names in list(self._names.items()):
+                if inner != outer and inner in outer:
+                    self._names[outer] |= names
+        self._pattern = re.compile(_trie_pattern(self._names)) if self._names else None
+
+    def scan(self, text: str) -> Set[str]:
+        """Return the names of all signatures found in text."""
+        found: Set[str] = set()
+        if self._pattern is None:
+            return found
+        for keyword in set(self._pattern.findall(text.lower())):
+            found |= self._names[keyword]
+        return found
+
+    def ordered(self, names: Iterable[str]) -> List[str]:
+        """Sort names by their position in the signature table."""
+        names = set(names)
+        return [n for n in self.order if n in names]
+
+
+def matcher_for(*categories: str) -> KeywordMatcher:
+    return KeywordMatcher(s for s in SIGNATURES if s.category in categories)
+
+
+def packages_for(*categories: str) -> Dict[str, str]:
+    """Dependency name -> reported name, for the package signatures of the given categories."""
+    return {p.package: p.name for p in PACKAGE_SIGNATURES if p.category in categories}
+
+
+def modules_for(*categories: str) -> Dict[str, str]:
+    """Top-level module -> reported name, for the module signatures of the given categories."""
+    return {m.module: m.name for m in MODULE_SIGNATURES if m.category in categories}
@@ -0,0 +1,160 @@
+# service/summarize.py
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from service.manifests import is_lockfile, is_manifest
+from service.pathtrie import ungroup_paths
+from service.signatures import PACKAGE_SIGNATURES, SIGNATURES
+
+# token budget for the scan summary part of the planner prompt (the template adds ~250 more)
+TOKEN_BUDGET = int(os.getenv("AGENT_PROMPT_TOKEN_BUDGET", "1500"))
+
+# starting caps per section, before the budget is applied
+MAX_ENTRYPOINTS = 20
+MAX_MANIFESTS = 30
+MAX_INFRA_FILES = 30
+MAX_DIRECTORIES = 40
+MAX_DEPENDENCIES = 60
+
+# sections that get cut (halved, taking turns in this order) while the projection is over budget
+SHRINK_ORDER = ("directories", "infra_files", "manifests", "dependencies", "entrypoints")
+
+CORE_FIELDS = ("project_name", "languages", "frameworks", "database", "has_tests", "infrastructure", "files_total")
+
+# dependencies the detectors know about are the ones worth their tokens first
+KEY_PACKAGES = {sig.keyword.strip('"').lower() for sig in SIGNATURES} | {p.package for p in PACKAGE_SIGNATURES}
+
+_TOKEN = re.compile(r"[A-Za-z]+|\d+|\s+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Offline estimate of the model's token count for text: words count one
+    token per 4 letters, digit runs one per 3 digits, punctuation one each and
+    whitespace runs are free unless longer than a space.
+    """
+    n = 0
+    for m in _TOKEN.finditer(text):
+        piece = m.group()
+        c = piece[0]
+        if c.isalpha():
+            n += math.ceil(len(piece) / 4)
+        elif c.isdigit():
+            n += math.ceil(len(piece) / 3)
+        elif c.isspace():
+            n += len(piece) > 1
+        else:
+            n += 1
+    return n
+
+
+def render(projection: Dict[str, Any]) -> str:
+    """The projection as it goes into the prompt (compact JSON: indentation is mostly wasted tokens)."""
+    return json.dumps(projection, separators=(",", ":"), ensure_ascii=False)
+
+
+def _is_infra(rel: str) -> bool:
+    low = rel.lower()
+    name = os.path.basename(low)
+    return (name.startswith("dockerfile") or name.endswith(".dockerfile") or "docker-compose" in name
+            or name in ("compose.yaml", "compose.yml", ".gitlab-ci.yml", "jenkinsfile", "procfile")
+            or low.startswith((".github/workflows/", ".circleci/"))
+            or (low.endswith((".yaml", ".yml")) and ("k8s" in low or "deployment" in low or "helm" in low))
+            or name.endswith(".tf"))
+
+
+def directory_histogram(paths: Iterable[str], depth: int = 2) -> List[Tuple[str, int]]:
+    """(directory, file count) for directories up to depth levels deep, biggest first; "." is the repo root."""
+    counts: Counter = Counter()
+    for rel in paths:
+        parts = rel.split("/")[:-1]
+        counts["/".join(parts[:depth]) or "."] += 1
+    return sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+
+
+def _is_key(name: str) -> bool:
+    low = name.lower()
+    return low in KEY_PACKAGES or any(k in low for k in KEY_PACKAGES if len(k) > 4)
+
+
+def _flat_dependencies(dependencies: Dict[str, Dict[str, str]],
+                       locked: Dict[str, str]) -> List[Tuple[str, str, str]]:
+    """(manifest, name, spec and locked version), key packages first, then by manifest depth and name."""
+    rows = [(rel, name, _with_lock(spec, locked.get(name))) for rel, deps in dependencies.items()
+            for name, spec in deps.items()]
+    return sorted(rows, key=lambda r: (not _is_key(r[1]), r[0].count("/"), r[0], r[1].lower()))
+
+
+def _with_lock(spec: str, version: Optional[str]) -> str:
+    if not version or spec.lstrip("=") == version:
+        return spec
+    return f"{spec}, locked {version}" if spec else f"locked {version}"
+
+
+def _regroup(rows: List[Tuple[str, str, str]]) -> Dict[str, Dict[str, str]]:
+    out: Dict[str, Dict[str, str]] = {}
+    for rel, name, spec in rows:
+        out.setdefault(rel, {})[name] = spec
+    return out
+
+
+def project(scan_summary: Dict[str, Any], budget: Optional[int] = None,
+            files: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Bounded view of a scan summary for the planner prompt: the detected stack,
+    manifests, entrypoints, infra files, a directory histogram and key
+    dependency versions, cut down until render(projection) fits in budget
+    tokens. files is the full listing when known (otherwise discovered_files
+    is used); "omitted" says how many items each section lost.
+    """
+    budget = TOKEN_BUDGET if budget is None else budget
+    if files is None:
+        files = scan_summary.get("discovered_files") or []
+        # a /scan?files_format=grouped response
+        files = ungroup_paths(files) if isinstance(files, dict) else files
+    files = list(files)
+    sections = {
+        "entrypoints": list(scan_summary.get("entrypoints") or []),
+        "manifests": [rel for rel in files if is_manifest(rel) or is_lockfile(rel)],
+        "infra_files": [rel for rel in files if _is_infra(rel)],
+        "directories": directory_histogram(files),
+        "dependencies": _flat_dependencies(scan_summary.get("dependencies") or {},
+                                           scan_summary.get("locked_versions") or {}),
+    }
+    caps = {"entrypoints": MAX_ENTRYPOINTS, "manifests": MAX_MANIFESTS, "infra_files": MAX_INFRA_FILES,
+            "directories": MAX_DIRECTORIES, "dependencies": MAX_DEPENDENCIES}
+    core = {k: scan_summary.get(k) for k in CORE_FIELDS if scan_summary.get(k) not in (None, [], {})}
+    core.setdefault("files_total", len(files))
+
+    def build() -> Dict[str, Any]:
+        out = dict(core)
+        for name, items in sections.items():
+            kept = items[:caps[name]]
+            if not kept:
+                continue
+            if name == "directories":
+                out[name] = dict(kept)
+            elif name == "dependencies":
+                out[name] = _regroup(kept)
+            else:
+                out[name] = kept
+        omitted = {name: len(items) - caps[name] for name, items in sections.items() if len(items) > caps[name]}
+        if omitted:
+            out["omitted"] = omitted
+        return out
+
+    projection = build()
+    turn = 0
+    while estimate_tokens(render(projection)) > budget:
+        left = [n for n in SHRINK_ORDER if min(caps[n], len(sections[n])) > 0]
+        if not left:
+            break  # only the core fields are left
+        name = left[turn % len(left)]
+        caps[name] = min(caps[name], len(sections[name])) // 2
+        turn += 1
+        projection = build()
+    return projection
@@ -0,0 +1,219 @@
+# service/telemetry.py
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Tuple
+
+# AGENT_METRICS=0 turns every call below into a flag check (span() returns a shared no-op)
+METRICS_ENABLED = os.getenv("AGENT_METRICS", "1") == "1"
+# AGENT_TRACE_LOG=1 logs every finished span as a JSON line on the "agent.trace" logger
+TRACE_LOG = os.getenv("AGENT_TRACE_LOG", "0") == "1"
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+log = logging.getLogger("agent.trace")
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_span_name: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("span_name", default=None)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    """In-process counters and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._buckets: Dict[str, tuple] = {}
+
+    def describe(self, name: str, help_text: str, buckets: Optional[tuple] = None) -> None:
+        self._help[name] = help_text
+        if buckets is not None:
+            self._buckets[name] = buckets
+
+    def inc(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(self._buckets.get(name, SECONDS_BUCKETS))
+            hist.observe(value)
+
+    def counter_value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        def fmt(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = key + extra
+            if not pairs:
+                return ""
+            escaped = (v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{fmt(key)} {_num(value)}")
+            for name in sorted(self._histograms):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets, hist.counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{fmt(key, (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{name}_bucket{fmt(key, (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{name}_sum{fmt(key)} {_num(hist.sum)}")
+                    lines.append(f"{name}_count{fmt(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.describe("agent_stage_seconds", "Duration of pipeline stages (spans)")
+registry.describe("agent_http_request_seconds", "HTTP request duration by route and status")
+registry.describe("agent_git_command_seconds", "Duration of git subprocesses by subcommand")
+registry.describe("agent_scan_part_seconds", "Time per scan spent walking, reading file heads and in each detector")
+registry.describe("agent_files_walked_total", "Files listed by scan walks")
+registry.describe("agent_files_skipped_total", "Files left out of scans by reason")
+registry.describe("agent_bytes_read_total", "File head bytes read by the scanner")
+registry.describe("agent_cache_requests_total", "Cache lookups by cache and result (hit/miss)")
+registry.describe("agent_plan_requests_coalesced_total", "Plan requests that waited for an identical in-flight model call")
+registry.describe("agent_plan_first_step_seconds", "Time from a streamed plan request to its first step, by plan cache source")
+registry.describe("agent_plan_prompt_tokens", "Estimated planner prompt size in tokens",
+                  buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 8000, 16000, 32000))
+registry.describe("agent_tool_calls_total", "Executed plan steps by tool and status")
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    if METRICS_ENABLED:
+        registry.inc(name, value, labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    if METRICS_ENABLED:
+        registry.observe(name, value, labels)
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "started", "_parent")
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._parent = _span_name.set(self.name)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        _span_name.reset(self._parent)
+        status = "error" if exc_type is not None else "ok"
+        registry.observe("agent_stage_seconds", seconds, {"stage": self.name, "status": status})
+        if TRACE_LOG:
+            log.info(json.dumps({
+                "span": self.name,
+                "trace_id": _trace_id.get(),
+                "parent": _span_name.get(),
+                "ms": round(seconds * 1000, 3),
+                "status": status,
+                **({"error": str(exc)} if exc is not None else {}),
+                **self.attrs,
+            }, default=str))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """
+    Time a stage: `with span("scan.clone", strategy=...):`. Feeds the
+    agent_stage_seconds histogram and, with AGENT_TRACE_LOG=1, a JSON log line
+    carrying the request's trace id and the enclosing span.
+    """
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def start_trace(trace_id: Optional[str] = None) -> str:
+    """Set the trace id for the current context (one per HTTP request or job)."""
+    trace_id = trace_id or uuid.uuid4().hex[:16]
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def in_context(fn: Callable) -> Callable:
+    """
+    Bind fn to a copy of the current context, so spans it opens on an executor
+    thread keep the trace id (loop.run_in_executor doesn't carry context over).
+    """
+    if not METRICS_ENABLED:
+        return fn
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+def render() -> str:
+    return registry.render()
@@ -0,0 +1,273 @@
+# service/walker.py
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# directories never descended into (vcs data, dependencies, virtualenvs, build output)
+DEFAULT_SKIP_DIRS = (".git", ".hg", ".svn", "node_modules", "bower_components", "venv", ".venv",
+                     "__pycache__", ".tox", ".mypy_cache", ".pytest_cache", "dist", "build", ".next")
+SKIP_DIRS = tuple(d.strip() for d in os.getenv("SCAN_SKIP_DIRS", ",".join(DEFAULT_SKIP_DIRS)).split(",") if d.strip())
+# vcs metadata that can also be a file: a git worktree or submodule has a .git file pointing at the
+# real repository. Skipped like the directory (when skipped at all), so every clone strategy lists the same files
+VCS_NAMES = frozenset((".git", ".hg", ".svn"))
+MAX_FILE_BYTES = int(os.getenv("SCAN_MAX_FILE_BYTES", str(2 * 1024 * 1024)))
+# also sniff files with unknown extensions for NUL bytes (costs an extra open per file)
+SNIFF_BINARY = os.getenv("SCAN_SNIFF_BINARY", "0") == "1"
+IGNORE_FILES = os.getenv("SCAN_IGNORE_FILES", "1") == "1"
+
+# .dockerignore is left alone: it describes a build context, and repos routinely list their
+# Dockerfile, CI config and tests in it, which the detectors must still see
+IGNORE_FILE_NAMES = (".gitignore",)
+
+BINARY_EXTENSIONS = frozenset((
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".tif", ".tiff", ".psd",
+    ".pdf", ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".jar", ".war", ".class",
+    ".so", ".dylib", ".dll", ".exe", ".o", ".a", ".lib", ".pyc", ".pyo", ".whl", ".egg",
+    ".woff", ".woff2", ".ttf", ".otf", ".eot", ".mp3", ".mp4", ".mov", ".avi", ".wav",
+    ".flac", ".ogg", ".webm", ".sqlite", ".sqlite3", ".db", ".bin", ".iso", ".dmg",
+    ".pkl", ".npy", ".npz", ".h5", ".parquet", ".onnx", ".pt",
+))
+
+
+class IgnoreRule:
+    """One ignore pattern: `path` matches the path itself, `inside` anything below it."""
+    __slots__ = ("path", "inside", "negate", "dir_only")
+
+    def __init__(self, core: str, negate: bool, dir_only: bool):
+        self.path = re.compile(core + "\\Z", re.DOTALL)
+        self.inside = re.compile(core + "/.*\\Z", re.DOTALL)
+        self.negate = negate
+        self.dir_only = dir_only
+
+    def matches(self, rel: str, is_dir: bool) -> bool:
+        if (is_dir or not self.dir_only) and self.path.match(rel):
+            return True
+        return bool(self.inside.match(rel))
+
+
+def _translate(pattern: str) -> str:
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = pattern.find("]", i + 2)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = j
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def parse_ignore(text: str) -> List[IgnoreRule]:
+    """
+    Parse .gitignore-style patterns (comments, !negation, trailing / for
+    directories, * ? [] and **). Like git, a pattern without an inner slash
+    matches at any depth.
+    """
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if line.startswith("./"):
+            line = line[2:]
+        rooted = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            continue
+        prefix = "" if rooted else "(?:.*/)?"
+        rules.append(IgnoreRule(prefix + _translate(line), negate, dir_only))
+    return rules
+
+
+def changes_rules(paths: Iterable[str]) -> bool:
+    """Whether any of paths is an ignore file, i.e. the walk rules may have changed."""
+    return any(p.rsplit("/", 1)[-1] in IGNORE_FILE_NAMES for p in paths)
+
+
+def _read_rules(path: str) -> List[IgnoreRule]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return parse_ignore(f.read())
+    except OSError:
+        return []
+
+
+class Walker:
+    """
+    Lists the files of a checkout that are worth scanning: skip-listed
+    directories are pruned without being descended into, paths matched by
+    .gitignore files (at any level) are left out,
+    and so are binary (by extension, optionally by sniffing) and oversized
+    files. Counts of what was left out end up in stats.
+    """
+
+    def __init__(self, base: str, skip_dirs: Iterable[str] = SKIP_DIRS, max_file_bytes: int = MAX_FILE_BYTES,
+                 ignore_files: bool = IGNORE_FILES, sniff_binary: bool = SNIFF_BINARY):
+        self.base = base
+        self.skip_dirs = frozenset(skip_dirs)
+        self.max_file_bytes = max_file_bytes
+        self.ignore_files = ignore_files
+        self.sniff_binary = sniff_binary
+        self._rules: Dict[str, List[IgnoreRule]] = {}
+        self._chains: Dict[str, List[Tuple[str, List[IgnoreRule]]]] = {}
+        self.stats = {"files": 0, "skipped_files": 0, "skipped_bytes": 0, "pruned_dirs": 0,
+                      "skipped": {"ignored": 0, "binary": 0, "oversized": 0}}
+
+    def _dir_rules(self, prefix: str) -> List[IgnoreRule]:
+        """Rules of the ignore files in the directory prefix ("" or "a/b/")."""
+        rules = self._rules.get(prefix)
+        if rules is None:
+            rules = []
+            if self.ignore_files:
+                rules.extend(_read_rules(os.path.join(self.base, prefix, ".gitignore")))
+            self._rules[prefix] = rules
+        return rules
+
+    def _chain(self, prefix: str) -> List[Tuple[str, List[IgnoreRule]]]:
+        """(directory prefix, rules) of every ignore file that applies inside prefix, outermost first."""
+        chain = self._chains.get(prefix)
+        if chain is None:
+            parent = prefix[:-1].rpartition("/")[0]
+            chain = self._chain(parent + "/" if parent else "") if prefix else []
+            rules = self._dir_rules(prefix)
+            if rules:
+                chain = chain + [(prefix, rules)]
+            self._chains[prefix] = chain
+        return chain
+
+    def ignored(self, rel: str, is_dir: bool = False) -> bool:
+        """Whether rel is excluded by the ignore files; the last matching rule wins."""
+        if not self.ignore_files:
+            return False
+        parent = rel.rpartition("/")[0]
+        result = False
+        for prefix, rules in self._chain(parent + "/" if parent else ""):
+            sub = rel[len(prefix):]
+            for rule in rules:
+                if rule.matches(sub, is_dir):
+                    result = not rule.negate
+        return result
+
+    def _skip_dir(self, rel: str, name: str) -> bool:
+        if name in self.skip_dirs or self.ignored(rel, is_dir=True):
+            self.stats["pruned_dirs"] += 1
+            return True
+        return False
+
+    def _is_binary(self, rel: str) -> bool:
+        ext = os.path.splitext(rel)[1].lower()
+        if ext in BINARY_EXTENSIONS:
+            return True
+        if self.sniff_binary:
+            try:
+                with open(os.path.join(self.base, rel), "rb") as f:
+                    return b"\0" in f.read(8000)
+            except OSError:
+                return False
+        return False
+
+    def _skip_file(self, rel: str, size: Optional[int]) -> bool:
+        name = rel.rpartition("/")[2]
+        if name in VCS_NAMES and name in self.skip_dirs:
+            self.stats["pruned_dirs"] += 1
+            return True
+        if self.ignored(rel):
+            reason = "ignored"
+        elif self._is_binary(rel):
+            reason = "binary"
+        elif size is not None and size > self.max_file_bytes:
+            reason = "oversized"
+        else:
+            self.stats["files"] += 1
+            return False
+        self.stats["skipped"][reason] += 1
+        self.stats["skipped_files"] += 1
+        self.stats["skipped_bytes"] += size or 0
+        return True
+
+    def walk(self) -> Iterator[str]:
+        """
+        Lazily yield relative file paths, depth-first with each directory's
+        entries in name order (so the listing is deterministic).
+        Symlinked directories are not followed.
+        """
+        def entries(path: str) -> Iterator[os.DirEntry]:
+            try:
+                with os.scandir(path) as it:
+                    return iter(sorted(it, key=lambda e: e.name))
+            except OSError:
+                return iter(())
+
+        stack = [("", entries(self.base))]
+        while stack:
+            prefix, it = stack[-1]
+            entry = next(it, None)
+            if entry is None:
+                stack.pop()
+                continue
+            rel = prefix + entry.name
+            try:
+                is_dir = entry.is_dir()
+                if not is_dir:
+                    size = entry.stat().st_size
+            except OSError:
+                continue
+            if not is_dir:
+                if not self._skip_file(rel, size):
+                    yield rel
+            elif not entry.is_symlink() and not self._skip_dir(rel, entry.name):
+                stack.append((rel + "/", entries(entry.path)))
+
+    def filter(self, paths: Iterable[str]) -> Iterator[str]:
+        """
+        Apply the same rules to an existing listing (e.g. a git tree listing of
+        a sparse checkout). Sizes are only checked for files present on disk.
+        """
+        pruned: Dict[str, bool] = {}
+        for rel in paths:
+            parts = rel.split("/")
+            skip = False
+            for depth in range(1, len(parts)):
+                d = "/".join(parts[:depth])
+                if d not in pruned:
+                    pruned[d] = self._skip_dir(d, parts[depth - 1])
+                if pruned[d]:
+                    skip = True
+                    break
+            if skip:
+                continue
+            try:
+                size: Optional[int] = os.stat(os.path.join(self.base, rel)).st_size
+            except OSError:
+                size = None
+            if not self._skip_file(rel, size):
+                yield rel
@@ -0,0 +1,261 @@
+# service/workspace.py
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from service.cache import Cache, cache_from_env
+
+# memory (default) keeps generated files in a dict; disk writes them under AGENT_WORKSPACE_DIR
+WORKSPACE_MODE = os.getenv("AGENT_WORKSPACE", "memory")
+# parent directory of disk workspaces, e.g. /dev/shm for tmpfs (default: the system temp dir)
+WORKSPACE_DIR = os.getenv("AGENT_WORKSPACE_DIR") or None
+
+ARCHIVE_FORMATS = ("zip", "tar.gz")
+
+
+def clean_path(path: str) -> str:
+    """
+    Workspace-relative form of a path from a plan: absolute paths are taken as
+    relative to the workspace root; anything escaping it raises ValueError.
+    """
+    rel = posixpath.normpath(str(path).replace("\\", "/").lstrip("/"))
+    if rel in ("", ".") or rel == ".." or rel.startswith("../"):
+        raise ValueError(f"Path escapes the workspace: {path}")
+    return rel
+
+
+class Workspace:
+    """
+    Private file tree of one plan execution, so concurrent executions can't
+    overwrite (or return) each other's files. Paths are workspace-relative.
+    """
+
+    def write(self, path: str, content: str) -> str:
+        raise NotImplementedError
+
+    def read(self, path: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def isdir(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def files(self) -> Dict[str, str]:
+        """Every file written, path -> content, sorted by path."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class MemoryWorkspace(Workspace):
+    def __init__(self):
+        self._files: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def write(self, path: str, content: str) -> str:
+        rel = clean_path(path)
+        with self._lock:
+            if self._isdir(rel):
+                raise ValueError(f"Is a directory: {rel}")
+            parent = posixpath.dirname(rel)
+            while parent:
+                if parent in self._files:
+                    raise ValueError(f"Not a directory: {parent}")
+                parent = posixpath.dirname(parent)
+            self._files[rel] = content
+        return rel
+
+    def read(self, path: str) -> Optional[str]:
+        with self._lock:
+            return self._files.get(clean_path(path))
+
+    def _isdir(self, rel: str) -> bool:
+        prefix = rel + "/"
+        return any(p.startswith(prefix) for p in self._files)
+
+    def isdir(self, path: str) -> bool:
+        rel = clean_path(path)
+        with self._lock:
+            return self._isdir(rel)
+
+    def files(self) -> Dict[str, str]:
+        with self._lock:
+            return {p: self._files[p] for p in sorted(self._files)}
+
+
+class DiskWorkspace(Workspace):
+    """Files under a fresh temp directory (in parent, e.g. a tmpfs), removed on close()."""
+
+    def __init__(self, parent: Optional[str] = None):
+        self.root = tempfile.mkdtemp(prefix="agent_ws_", dir=parent)
+
+    def _abs(self, path: str) -> str:
+        return os.path.join(self.root, *clean_path(path).split("/"))
+
+    def write(self, path: str, content: str) -> str:
+        target = self._abs(path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "w") as f:
+            f.write(content)
+        return clean_path(path)
+
+    def read(self, path: str) -> Optional[str]:
+        try:
+            with open(self._abs(path), "r") as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    def isdir(self, path: str) -> bool:
+        return os.path.isdir(self._abs(path))
+
+    def files(self) -> Dict[str, str]:
+        out = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                full = os.path.join(dirpath, name)
+                with open(full, "r") as f:
+                    out[os.path.relpath(full, self.root).replace(os.sep, "/")] = f.read()
+        return {p: out[p] for p in sorted(out)}
+
+    def close(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def new_workspace(mode: Optional[str] = None) -> Workspace:
+    mode = (mode or WORKSPACE_MODE).lower()
+    if mode == "memory":
+        return MemoryWorkspace()
+    if mode in ("disk", "tmpfs"):
+        return DiskWorkspace(WORKSPACE_DIR or ("/dev/shm" if mode == "tmpfs" else None))
+    raise ValueError(f"Unknown workspace mode: {mode}")
+
+
+ARCHIVE_MEDIA_TYPES = {"zip": "application/zip", "tar.gz": "application/gzip"}
+ARCHIVE_BLOCK = 64 * 1024
+
+
+class _Chunks:
+    """Write-only sink the archive writers stream into; take() hands over what was written since."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _blocks(content: Union[str, bytes, BinaryIO]) -> Tuple[int, Iterator[bytes]]:
+    """Size and ARCHIVE_BLOCK-sized pieces of an entry: text, bytes or a seekable binary file."""
+    if isinstance(content, str):
+        content = content.encode()
+    if isinstance(content, bytes):
+        view = memoryview(content)
+        return len(content), (bytes(view[i:i + ARCHIVE_BLOCK]) for i in range(0, len(content), ARCHIVE_BLOCK))
+    size = content.seek(0, os.SEEK_END)
+    content.seek(0)
+    return size, iter(lambda: content.read(ARCHIVE_BLOCK), b"")
+
+
+def iter_archive(entries: Iterable[Tuple[str, Union[str, bytes, BinaryIO]]], fmt: str = "zip",
+                 root: str = "") -> Iterator[bytes]:
+    """
+    Streamed zip or tar.gz of (path, content) entries, under root/ when given:
+    yields the archive bytes as entries are added, so neither the archive nor
+    (for file entries) the content is held in memory as a whole.
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format: {fmt} (expected one of {', '.join(ARCHIVE_FORMATS)})")
+    return (chunk for chunk in _archive_chunks(entries, fmt, root) if chunk)
+
+
+def _archive_chunks(entries, fmt: str, root: str) -> Iterator[bytes]:
+    sink = _Chunks()
+    mtime = time.time()
+    if fmt == "zip":
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+            for path, content in entries:
+                info = zipfile.ZipInfo(posixpath.join(root, path), time.localtime(mtime)[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                size, blocks = _blocks(content)
+                with zf.open(info, "w", force_zip64=size > zipfile.ZIP64_LIMIT) as dest:
+                    for block in blocks:
+                        dest.write(block)
+                        yield sink.take()
+                yield sink.take()
+    else:
+        with tarfile.open(fileobj=sink, mode="w|gz") as tf:
+            for path, content in entries:
+                info = tarfile.TarInfo(posixpath.join(root, path))
+                info.size, blocks = _blocks(content)
+                info.mtime = mtime
+                info.mode = 0o644
+                tf.addfile(info, _BlockReader(blocks))
+                yield sink.take()
+    yield sink.take()
+
+
+class _BlockReader:
+    """read() over an iterator of byte blocks, for tarfile.addfile."""
+
+    def __init__(self, blocks: Iterator[bytes]):
+        self._blocks = blocks
+        self._rest = b""
+
+    def read(self, n: int = -1) -> bytes:
+        while n < 0 or len(self._rest) < n:
+            block = next(self._blocks, None)
+            if block is None:
+                break
+            self._rest += block
+        if n < 0:
+            data, self._rest = self._rest, b""
+        else:
+            data, self._rest = self._rest[:n], self._rest[n:]
+        return data
+
+
+def archive(files: Dict[str, str], fmt: str = "zip", root: str = "") -> bytes:
+    """files (path -> content) packed as a zip or tar.gz, under root/ when given."""
+    return b"".join(iter_archive(files.items(), fmt, root))
+
+
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+_configured = False
+
+def get_execution_cache() -> Optional[Cache]:
+    """
+    Files of finished executions by execution id, for artifact downloads.
+    Configured from AGENT_EXECUTION_CACHE_BACKEND (memory | sqlite | off),
+    AGENT_EXECUTION_CACHE_PATH, AGENT_EXECUTION_CACHE_MAX_ENTRIES and
+    AGENT_EXECUTION_CACHE_TTL (seconds, default one hour).
+    """
+    global _cache, _configured
+    with _cache_lock:
+        if not _configured:
+            _cache = cache_from_env("AGENT_EXECUTION_CACHE", table="executions", max_entries=64, ttl=3600)
+            _configured = True
+        return _cache
@@ -0,0 +1,37 @@
+# tests/test_signatures.py
+from service.scanner import DatabaseDetector, FrameworkDetector
+from service.signatures import imported_modules
+
+UTIL_PY = '''"""Helpers shared by the react/vue frontends and the flask app."""
+import os
+# we used to import django here
+NAME = "flask"
+HELP = """
+from fastapi import FastAPI
+"""
+'''
+
+
+def test_mentions_are_not_detected():
+    assert FrameworkDetector().inspect("app/util.py", UTIL_PY) is None
+    assert DatabaseDetector().inspect("app/util.py", 'DSN = "postgresql://localhost/db"  # psycopg2\n') is None
+
+
+def test_imports_are_detected():
+    source = (
+        "import os, flask as f\n"
+        "from sqlalchemy.orm import Session\n"
+        "try:\n"
+        "    import psycopg2\n"
+        "except ImportError:\n"
+        "    import mysql.connector\n"
+        "from . import react\n"
+    )
+    assert imported_modules(source) == {"os", "flask", "sqlalchemy", "psycopg2", "mysql"}
+    assert FrameworkDetector().inspect("app/db.py", source) == ["flask", "sqlalchemy"]
+    assert DatabaseDetector().inspect("app/db.py", source) == ["mysql", "postgres"]
+
+
+def test_js_frameworks_only_come_from_package_json():
+    assert FrameworkDetector().inspect("app/views.py", "import react\nimport vue\n") is None
+    assert FrameworkDetector().inspect("web/package.json", '{"dependencies": {"react": "^18.0.0"}}') == ["react"]
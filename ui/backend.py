@@ -0,0 +1,115 @@
+# ui/backend.py
+import asyncio
+import os
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+BACKEND_URL = os.getenv("AGENT_BACKEND_URL", "http://127.0.0.1:8080")
+
+# seconds to wait for the backend's response, per kind of call (a cold scan clones the repo)
+TIMEOUTS: Dict[str, float] = {
+    "scan": float(os.getenv("AGENT_UI_SCAN_TIMEOUT", "600")),
+    "plan": float(os.getenv("AGENT_UI_PLAN_TIMEOUT", "180")),
+    "execute": float(os.getenv("AGENT_UI_EXECUTE_TIMEOUT", "60")),
+    "default": float(os.getenv("AGENT_UI_TIMEOUT", "30")),
+}
+CONNECT_TIMEOUT = float(os.getenv("AGENT_UI_CONNECT_TIMEOUT", "5"))
+
+# extra attempts after a failed call, waiting RETRY_BACKOFF * 2**attempt (plus jitter) in between
+RETRIES = int(os.getenv("AGENT_UI_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("AGENT_UI_RETRY_BACKOFF", "0.25"))
+RETRY_STATUSES = (502, 503, 504)
+
+MAX_CONNECTIONS = int(os.getenv("AGENT_UI_BACKEND_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("AGENT_UI_BACKEND_KEEPALIVE", "20"))
+
+# failures where the request never reached the backend, so any call can be sent again
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class BackendUnavailable(RuntimeError):
+    pass
+
+
+class BackendClient:
+    """
+    One pooled, keep-alive httpx.AsyncClient for every call the UI makes to
+    the backend. start() at app startup, aclose() at shutdown. Calls that
+    can't reach the backend are retried with exponential backoff; idempotent
+    ones (scan and plan are cached by the backend) are also retried on
+    dropped connections and 502/503/504. Timeouts are per route (TIMEOUTS).
+    """
+
+    def __init__(self, base_url: str = BACKEND_URL, retries: int = RETRIES, backoff: float = RETRY_BACKOFF):
+        self.base_url = base_url
+        self.retries = retries
+        self.backoff = backoff
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def start(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(TIMEOUTS["default"], connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+            )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("Backend client not started (BackendClient.start() runs in the app lifespan)")
+        return self._client
+
+    def _timeout(self, route: str) -> httpx.Timeout:
+        return httpx.Timeout(TIMEOUTS.get(route, TIMEOUTS["default"]), connect=CONNECT_TIMEOUT)
+
+    async def _wait(self, attempt: int) -> None:
+        delay = self.backoff * 2 ** attempt
+        await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    async def _send(self, request: httpx.Request, idempotent: bool, stream: bool = False) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                retry = isinstance(e, _NOT_SENT) or (
+                    idempotent and isinstance(e, (httpx.ReadError, httpx.RemoteProtocolError)))
+                if not retry or attempt >= self.retries:
+                    raise BackendUnavailable(f"Backend {self.base_url} unavailable: {e!r}") from e
+            else:
+                if not (idempotent and response.status_code in RETRY_STATUSES and attempt < self.retries):
+                    return response
+                await response.aclose()
+            await self._wait(attempt)
+            attempt += 1
+
+    async def request(self, method: str, path: str, route: str = "default", idempotent: bool = True,
+                      **kwargs) -> httpx.Response:
+        """One call to the backend, retried as described above; raises BackendUnavailable when it gives up."""
+        request = self.client.build_request(method, path, timeout=self._timeout(route), **kwargs)
+        return await self._send(request, idempotent)
+
+    async def open_stream(self, method: str, path: str, route: str = "default", idempotent: bool = True,
+                          **kwargs) -> httpx.Response:
+        """Like request(), with the body left unread (the caller closes the response); no retries once it started."""
+        request = self.client.build_request(method, path, timeout=self._timeout(route), **kwargs)
+        return await self._send(request, idempotent, stream=True)
+
+    @asynccontextmanager
+    async def stream(self, method: str, path: str, route: str = "default", idempotent: bool = True,
+                     **kwargs) -> AsyncIterator[httpx.Response]:
+        """open_stream() as a context manager that closes the response."""
+        response = await self.open_stream(method, path, route=route, idempotent=idempotent, **kwargs)
+        try:
+            yield response
+        finally:
+            await response.aclose()
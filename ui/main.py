@@ -1,14 +1,32 @@
 # ui/main.py
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, Response
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Form
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-import requests
 import json
 import os
 from datetime import datetime
+from typing import Callable, Iterable, Tuple
+from service.encoding import CompressionMiddleware
+from service.workspace import ARCHIVE_FORMATS, ARCHIVE_MEDIA_TYPES, iter_archive
+from ui import reports
+from ui.backend import BACKEND_URL, BackendClient, BackendUnavailable
+
+# one pooled client for all backend calls (AGENT_BACKEND_URL, default http://127.0.0.1:8080)
+backend = BackendClient(BACKEND_URL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    backend.start()
+    yield
+    await backend.aclose()
+
 # UI FastAPI app
-app = FastAPI(title="Agentic UI")
+app = FastAPI(title="Agentic UI", lifespan=lifespan)
+# gzip/zstd for the rendered pages; the plan stream passes through uncompressed
+app.add_middleware(CompressionMiddleware)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Mount templates + static files
@@ -20,165 +38,170 @@ app.mount(
 )
 
 
-BACKEND_URL = "http://127.0.0.1:8080"  # adjust if backend runs elsewhere
+async def call_backend(method: str, path: str, route: str = "default", idempotent: bool = True, **kwargs):
+    try:
+        return await backend.request(method, path, route=route, idempotent=idempotent, **kwargs)
+    except BackendUnavailable as e:
+        raise HTTPException(status_code=502, detail=str(e))
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse(request, "index.html", {"request": request})
 
 @app.post("/scan", response_class=HTMLResponse)
 async def ui_scan(request: Request, repo_url: str = Form(...), branch: str = Form("main")):
-    # Call backend /scan
-    scan_response = requests.post(
-        f"{BACKEND_URL}/scan",
+    # Call backend /scan (httpx asks for gzip and decodes it; the grouped file
+    # listing keeps the page small). Later steps pass only the summary_id on.
+    scan_response = (await call_backend(
+        "POST", "/scan", route="scan",
+        params={"files_format": "grouped"},
         json={"repo_url": repo_url, "branch": branch}
-    ).json()
-    return templates.TemplateResponse("plan.html", {"request": request, "scan": scan_response})
+    )).json()
+    return templates.TemplateResponse(request, "plan.html", {"request": request, "scan": scan_response})
 
 @app.post("/plan", response_class=HTMLResponse)
-async def ui_plan(request: Request, project_data: str = Form(...)):
-    project_json = json.loads(project_data)
-    plan_response = requests.post(
-        f"{BACKEND_URL}/plan",
-        json=project_json
-    ).json()
-    return templates.TemplateResponse("plan_results.html", {
+async def ui_plan(request: Request, summary_id: str | None = Form(None), project_data: str | None = Form(None),
+                  wait: bool = Form(False)):
+    # the summary stays on the backend when it has an id; project_data is the fallback (artifact store off)
+    project_json = json.loads(project_data) if not summary_id and project_data else None
+    if not wait:
+        # render right away; the page streams the steps in from /plan/stream
+        return templates.TemplateResponse(request, "plan_results.html", {
+            "request": request,
+            "summary_id": summary_id,
+            "scan": project_json,
+            "plan": None
+        })
+    r = await call_backend("POST", "/plan", route="plan",
+                           params={"summary_id": summary_id} if summary_id else None, json=project_json)
+    return templates.TemplateResponse(request, "plan_results.html", {
         "request": request,
+        "summary_id": summary_id,
         "scan": project_json,
-        "plan": plan_response
+        "plan": r.json(),
+        "plan_id": r.headers.get("x-plan-id")
     })
 
+@app.post("/plan/stream")
+async def ui_plan_stream(request: Request):
+    """Proxy the backend's NDJSON plan stream (?summary_id= or a summary body), passing chunks through as they arrive."""
+    body = await request.body()
+
+    async def relay():
+        try:
+            async with backend.stream("POST", "/plan/stream", route="plan", params=request.query_params,
+                                      content=body or None,
+                                      headers={"Content-Type": "application/json"} if body else None) as r:
+                async for chunk in r.aiter_bytes():
+                    yield chunk
+        except BackendUnavailable as e:
+            yield (json.dumps({"event": "error", "detail": str(e)}) + "\n").encode()
+
+    return StreamingResponse(relay(), media_type="application/x-ndjson")
+
 @app.post("/execute", response_class=HTMLResponse)
-async def ui_execute(request: Request, plan_data: str = Form(...)):
-    plan_json = json.loads(plan_data)
-    exec_response = requests.post(f"{BACKEND_URL}/execute", json=plan_json).json()
-    return templates.TemplateResponse("execute.html", {
+async def ui_execute(request: Request, plan_id: str | None = Form(None), plan_data: str | None = Form(None)):
+    plan_json = json.loads(plan_data) if not plan_id and plan_data else None
+    # not idempotent: only retried when the request never reached the backend
+    exec_response = (await call_backend("POST", "/execute", route="execute", idempotent=False,
+                                        params={"plan_id": plan_id} if plan_id else None, json=plan_json)).json()
+    return templates.TemplateResponse(request, "execute.html", {
         "request": request,
         "plan": exec_response["execution_results"],
-        "files": exec_response.get("files", [])
+        "files": exec_response.get("files", []),
+        "execution_id": exec_response.get("execution_id")
     })
 
-@app.post("/download-execution-results")
-async def download_execution_results(execution_data: str = Form(...), files_data: str = Form(...)):
-    """Generate and serve a markdown file containing execution results"""
+@app.get("/download-artifact/{execution_id}")
+async def download_artifact(execution_id: str, format: str = "zip"):
+    """Pass through the backend's zip/tar.gz of the files an execution generated"""
     try:
-        execution_results = json.loads(execution_data)
-        files = json.loads(files_data)
-        
-        # Generate markdown content
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"execution_results_{timestamp}.md"
-        
-        markdown_content = f"""# Execution Results Report
-
-Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-
-## Execution Summary
-
-"""
-        
-        # Add execution results
-        if execution_results:
-            markdown_content += "### Execution Status\n\n"
-            for result in execution_results:
-                status_emoji = "✅" if result.get("status") == "success" else "❌" if result.get("status") == "failed" else "⚠️"
-                markdown_content += f"- **{result.get('tool', 'Unknown')}**: {status_emoji} {result.get('status', 'unknown')}\n"
-                if result.get("details"):
-                    markdown_content += f"  - Details: {result.get('details')}\n"
-                markdown_content += "\n"
-        
-        # Add generated files
-        if files:
-            markdown_content += "## Generated Files\n\n"
-            for file in files:
-                markdown_content += f"### {file.get('tool', 'Unknown Tool')} - {file.get('file_path', 'Unknown Path')}\n\n"
-                markdown_content += f"**File Path:** `{file.get('file_path', 'Unknown')}`\n\n"
-                markdown_content += "**Content:**\n\n"
-                markdown_content += f"```\n{file.get('content', '')}\n```\n\n"
-                markdown_content += "---\n\n"
-        
-        # Return the markdown file as a download
-        return Response(
-            content=markdown_content,
-            media_type="text/markdown",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}",
-                "Content-Type": "text/markdown; charset=utf-8"
-            }
-        )
-        
-    except Exception as e:
-        return Response(
-            content=f"Error generating markdown: {str(e)}",
-            status_code=500,
-            media_type="text/plain"
+        r = await backend.open_stream("GET", f"/executions/{execution_id}/artifact", params={"format": format})
+    except BackendUnavailable as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    async def relay():
+        try:
+            async for chunk in r.aiter_bytes():
+                yield chunk
+        finally:
+            await r.aclose()
+
+    headers = {k: v for k, v in r.headers.items() if k.lower() == "content-disposition"}
+    return StreamingResponse(relay(), status_code=r.status_code,
+                             media_type=r.headers.get("content-type"), headers=headers)
+
+def report_download(report: Iterable[str], name: str, format: str,
+                    files: Callable[[], Iterable[Tuple[str, str]]]) -> StreamingResponse:
+    """
+    Stream a Markdown report as name.md, or (format zip / tar.gz) a bundle of
+    the report plus the files it covers, produced by files().
+    """
+    if format == "md":
+        return StreamingResponse(
+            (chunk.encode() for chunk in reports.batched(report)),
+            media_type="text/markdown; charset=utf-8",
+            headers={"Content-Disposition": f"attachment; filename={name}.md"}
         )
+    if format not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: md, {', '.join(ARCHIVE_FORMATS)}")
+    entries = reports.bundle_entries(report, "report.md", files())
+    return StreamingResponse(
+        iter_archive(entries, format, root=name),
+        media_type=ARCHIVE_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={name}.{format}"}
+    )
+
+def check_json_array(text: str, field: str) -> None:
+    """400 for a form field that doesn't start like a JSON array, before any of the download is sent."""
+    try:
+        next(reports.iter_json_array(text), None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{field}: {e}")
+
+@app.post("/download-execution-results")
+async def download_execution_results(execution_data: str = Form(...), files_data: str = Form(...),
+                                     format: str = Form("md")):
+    """
+    Stream a Markdown report of the execution results (format=md), or a zip /
+    tar.gz bundle of the report and the generated files.
+    """
+    check_json_array(execution_data, "execution_data")
+    check_json_array(files_data, "files_data")
+    generated = datetime.now()
+    report = reports.execution_report(reports.iter_json_array(execution_data),
+                                      reports.iter_json_array(files_data),
+                                      generated.strftime("%Y-%m-%d %H:%M:%S"))
+    files = lambda: ((f.get("file_path"), f.get("content")) for f in reports.iter_json_array(files_data))
+    return report_download(report, f"execution_results_{generated.strftime('%Y-%m-%d_%H-%M-%S')}", format, files)
+
+async def stored_artifact(kind: str, artifact_id: str) -> str:
+    """JSON text of a scan summary or plan from the backend's artifact store."""
+    r = await call_backend("GET", f"/artifacts/{kind}/{artifact_id}")
+    if r.status_code != 200:
+        raise HTTPException(status_code=r.status_code, detail=f"{kind} {artifact_id}: {r.text}")
+    return r.text
 
 @app.post("/download-plan")
-async def download_plan(plan_data: str = Form(...), scan_data: str = Form(...)):
-    """Generate and serve a markdown file containing the execution plan"""
+async def download_plan(plan_id: str | None = Form(None), summary_id: str | None = Form(None),
+                        plan_data: str | None = Form(None), scan_data: str | None = Form(None),
+                        format: str = Form("md")):
+    """
+    Stream a Markdown report of the execution plan (format=md), or a zip /
+    tar.gz bundle of the report and the files the plan would write. The plan
+    and scan come from the backend by plan_id / summary_id, or as JSON fields.
+    """
+    if plan_id:
+        plan_data = await stored_artifact("plan", plan_id)
+    if summary_id:
+        scan_data = await stored_artifact("scan", summary_id)
+    check_json_array(plan_data or "", "plan_data")
     try:
-        plan = json.loads(plan_data)
-        scan = json.loads(scan_data)
-        
-        # Generate markdown content
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"execution_plan_{timestamp}.md"
-        
-        markdown_content = f"""# Execution Plan Report
-
-Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-
-## Project Information
-
-"""
-        
-        # Add scan information
-        if scan:
-            markdown_content += f"**Repository:** {scan.get('repo_url', 'Unknown')}\n"
-            markdown_content += f"**Branch:** {scan.get('branch', 'Unknown')}\n"
-            markdown_content += f"**Project Name:** {scan.get('project_name', 'Unknown')}\n\n"
-            
-            if scan.get('languages'):
-                markdown_content += f"**Languages:** {', '.join(scan.get('languages', []))}\n"
-            if scan.get('frameworks'):
-                markdown_content += f"**Frameworks:** {', '.join(scan.get('frameworks', []))}\n"
-            if scan.get('database'):
-                markdown_content += f"**Database:** {scan.get('database')}\n"
-            markdown_content += "\n"
-        
-        # Add plan steps
-        if plan:
-            markdown_content += "## Execution Plan Steps\n\n"
-            for i, step in enumerate(plan, 1):
-                markdown_content += f"### Step {i}: {step.get('tool', 'Unknown Tool')}\n\n"
-                markdown_content += f"**File Path:** `{step.get('args', {}).get('file_path', 'N/A')}`\n\n"
-                
-                if step.get('args', {}).get('content'):
-                    markdown_content += "**Generated Content:**\n\n"
-                    markdown_content += f"```\n{step.get('args', {}).get('content', '')}\n```\n\n"
-                
-                if step.get('success_check'):
-                    markdown_content += f"**Success Check:** {step.get('success_check')}\n\n"
-                
-                if step.get('on_fail'):
-                    markdown_content += f"**On Failure:** {step.get('on_fail')}\n\n"
-                
-                markdown_content += "---\n\n"
-        
-        # Return the markdown file as a download
-        return Response(
-            content=markdown_content,
-            media_type="text/markdown",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}",
-                "Content-Type": "text/markdown; charset=utf-8"
-            }
-        )
-        
-    except Exception as e:
-        return Response(
-            content=f"Error generating markdown: {str(e)}",
-            status_code=500,
-            media_type="text/plain"
-        )
\ No newline at end of file
+        scan = json.loads(scan_data) if scan_data else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"scan_data: {e}")
+    generated = datetime.now()
+    plan_data = plan_data or ""
+    report = reports.plan_report(reports.iter_json_array(plan_data), scan, generated.strftime("%Y-%m-%d %H:%M:%S"))
+    files = lambda: reports.plan_files(reports.iter_json_array(plan_data))
+    return report_download(report, f"execution_plan_{generated.strftime('%Y-%m-%d_%H-%M-%S')}", format, files)
@@ -0,0 +1,160 @@
+# ui/reports.py
+import json
+import posixpath
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from service.workspace import clean_path
+
+# text is sent in pieces of about this many characters
+CHUNK_CHARS = 64 * 1024
+# reports bigger than this are spooled to a temp file while a bundle is built
+SPOOL_BYTES = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_array(text: str) -> Iterator[Any]:
+    """
+    Elements of the JSON array in text, decoded one at a time, so a big plan
+    never exists as a decoded list next to its report. "null" or "" is an
+    empty array. Raises ValueError on anything else that isn't an array.
+    """
+    n = len(text)
+    i = _skip(text, 0)
+    if i == n or text.startswith("null", i):
+        return
+    if text[i] != "[":
+        raise ValueError("Expected a JSON array")
+    i = _skip(text, i + 1)
+    if i < n and text[i] == "]":
+        return
+    while True:
+        item, i = _decoder.raw_decode(text, i)
+        yield item
+        i = _skip(text, i)
+        if i < n and text[i] == ",":
+            i = _skip(text, i + 1)
+        elif i < n and text[i] == "]":
+            return
+        else:
+            raise ValueError(f"Expected ',' or ']' at offset {i}")
+
+
+def _skip(text: str, i: int) -> int:
+    while i < len(text) and text[i] in " \t\r\n":
+        i += 1
+    return i
+
+
+def batched(parts: Iterable[str], size: int = CHUNK_CHARS) -> Iterator[str]:
+    """Join small text parts into chunks of about size characters."""
+    buf: List[str] = []
+    held = 0
+    for part in parts:
+        buf.append(part)
+        held += len(part)
+        if held >= size:
+            yield "".join(buf)
+            buf, held = [], 0
+    if buf:
+        yield "".join(buf)
+
+
+def plan_report(plan: Iterable[Dict], scan: Optional[Dict], generated: str) -> Iterator[str]:
+    """The execution plan as Markdown, one piece at a time."""
+    yield f"""# Execution Plan Report
+
+Generated on: {generated}
+
+## Project Information
+
+"""
+    if scan:
+        yield f"**Repository:** {scan.get('repo_url', 'Unknown')}\n"
+        yield f"**Branch:** {scan.get('branch', 'Unknown')}\n"
+        yield f"**Project Name:** {scan.get('project_name', 'Unknown')}\n\n"
+        if scan.get('languages'):
+            yield f"**Languages:** {', '.join(scan.get('languages', []))}\n"
+        if scan.get('frameworks'):
+            yield f"**Frameworks:** {', '.join(scan.get('frameworks', []))}\n"
+        if scan.get('database'):
+            yield f"**Database:** {scan.get('database')}\n"
+        yield "\n"
+
+    for i, step in enumerate(plan, 1):
+        if i == 1:
+            yield "## Execution Plan Steps\n\n"
+        args = step.get('args', {})
+        yield f"### Step {i}: {step.get('tool', 'Unknown Tool')}\n\n"
+        yield f"**File Path:** `{args.get('file_path', 'N/A')}`\n\n"
+        if args.get('content'):
+            yield "**Generated Content:**\n\n"
+            yield f"```\n{args.get('content', '')}\n```\n\n"
+        if step.get('success_check'):
+            yield f"**Success Check:** {step.get('success_check')}\n\n"
+        if step.get('on_fail'):
+            yield f"**On Failure:** {step.get('on_fail')}\n\n"
+        yield "---\n\n"
+
+
+def execution_report(results: Iterable[Dict], files: Iterable[Dict], generated: str) -> Iterator[str]:
+    """The execution results and generated files as Markdown, one piece at a time."""
+    yield f"""# Execution Results Report
+
+Generated on: {generated}
+
+## Execution Summary
+
+"""
+    for i, result in enumerate(results):
+        if i == 0:
+            yield "### Execution Status\n\n"
+        status_emoji = "✅" if result.get("status") == "success" else "❌" if result.get("status") == "failed" else "⚠️"
+        yield f"- **{result.get('tool', 'Unknown')}**: {status_emoji} {result.get('status', 'unknown')}\n"
+        if result.get("details"):
+            yield f"  - Details: {result.get('details')}\n"
+        yield "\n"
+
+    for i, file in enumerate(files):
+        if i == 0:
+            yield "## Generated Files\n\n"
+        yield f"### {file.get('tool', 'Unknown Tool')} - {file.get('file_path', 'Unknown Path')}\n\n"
+        yield f"**File Path:** `{file.get('file_path', 'Unknown')}`\n\n"
+        yield "**Content:**\n\n"
+        yield f"```\n{file.get('content', '')}\n```\n\n"
+        yield "---\n\n"
+
+
+def plan_files(plan: Iterable[Dict]) -> Iterator[Tuple[str, str]]:
+    """(path, content) of the files a plan's steps would write; k8s steps may carry {name: content}."""
+    for step in plan:
+        args = step.get("args") or {}
+        content = args.get("content")
+        if isinstance(content, dict):
+            base = args.get("file_path") or "k8s"
+            yield from ((posixpath.join(base, name), text) for name, text in content.items())
+        elif content and args.get("file_path"):
+            yield args["file_path"], content
+
+
+def bundle_entries(report: Iterable[str], report_name: str,
+                   files: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+    """
+    Archive entries (see service.workspace.iter_archive): the files under
+    files/, then the report, spooled to a temp file past SPOOL_BYTES. Paths
+    that would escape the bundle, and repeats of a path, are left out.
+    """
+    seen = set()
+    for path, content in files:
+        try:
+            rel = clean_path(path)
+        except ValueError:
+            continue
+        if rel not in seen and isinstance(content, (str, bytes)):
+            seen.add(rel)
+            yield posixpath.join("files", rel), content
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+        for chunk in batched(report):
+            spool.write(chunk.encode())
+        yield report_name, spool